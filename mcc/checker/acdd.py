@@ -23,6 +23,7 @@ from .checkers import (CheckExistence,
                        CheckISODatestuff,
                        CheckISODuration,
                        CheckDeprecated)
+from .standard_names import STANDARD_NAME_TABLES
 
 
 class ACDD(CheckSuite):
@@ -39,15 +40,31 @@ class ACDD(CheckSuite):
 
     DEFAULT_VERSION = '1.1'
 
-    def setup(self, version):
+    METADATA_ONLY = True
+
+    CHECKS_STANDARD_NAMES = True
+
+    # The version of the standard name table to check against, if not the latest
+    standard_name_table = None
+
+    def setup(self, version, standard_name_table=None):
         if version not in ACDD.ABOUT['versions']:
             return abort(
                 400, 'Must specify valid version in the format "ACDD-version=x.x". '
                      f'Available versions are {ACDD.ABOUT["versions"]}'
             )
 
+        if standard_name_table is not None and standard_name_table not in STANDARD_NAME_TABLES:
+            return abort(
+                400, 'Must specify valid version of the standard name table in the format '
+                     f'"ACDD-standard-name-table=xx". Available versions are {tuple(STANDARD_NAME_TABLES)}'
+            )
+
         self.version = version
 
+        # Only the standard_name Blueprints need to know which table to use
+        standard_name_options = {'standard_name_table': standard_name_table} if standard_name_table else {}
+
         global_checks = self.add_group('Global Attributes', scope='globals')
 
         if version == '1.1':
@@ -306,6 +323,7 @@ class ACDD(CheckSuite):
                     'name': 'standard_name',
                     'description': 'A long descriptive name for the variable taken from a controlled vocabulary of '
                                    'variable names.',
+                    **standard_name_options,
                 }, CheckStandardName
             )
             highly_recommended_varattrs.add_blueprint(
@@ -818,6 +836,7 @@ class ACDD(CheckSuite):
                     'description': 'A long descriptive name for the variable taken from a controlled vocabulary of '
                                    'variable names. We recommend using the CF convention and the variable names from '
                                    'the CF standard name table. This attribute is recommended by the CF convention.',
+                    **standard_name_options,
                 }, CheckStandardName
             )
             highly_recommended_varattrs.add_blueprint(
@@ -847,4 +866,15 @@ class ACDD(CheckSuite):
                 }, CheckDeprecated
             )
 
+        # Set once the Groups are added, so that it isn't extended down to them
+        if standard_name_table:
+            self.standard_name_table = standard_name_table
+
         return self
+
+    @property
+    def cache_version(self):
+        if self.standard_name_table is None:
+            return super().cache_version
+
+        return f'{self.version} (standard names v{self.standard_name_table})'
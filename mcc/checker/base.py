@@ -26,12 +26,21 @@ So, to create a new test, we would...
    objects
 5. Interpret the results.
 
+Setting up a CheckSuite builds a tree of hundreds of Groups and Blueprints,
+which never changes once built. CheckSuite.compiled() builds (and freezes) the
+tree once per process for each version, and hands out that same instance to
+every request after, so it must never be modified by running it. Compiled
+suites are pickled by reference, to be compiled afresh by other processes.
+
 """
 
+import hashlib
 import logging
+import threading
 import time
 from collections import deque
-from random import randrange
+
+from .snapshot import DatasetSnapshot, take_snapshot
 
 MANUALLY_DEFINED = 0
 AUTO_FAIL = 1
@@ -43,6 +52,10 @@ RESULT_PASS = 5
 
 logger = logging.getLogger(__name__)
 
+# Compiled CheckSuites, keyed by their class and setup() arguments
+_compiled_suites = {}
+_compiled_suites_lock = threading.Lock()
+
 
 class Group(object):
     """
@@ -69,6 +82,10 @@ class Group(object):
         ]
     )
 
+    # Whether Blueprints of the varattrs scope within the same Group are run
+    # variable-major, i.e. each variable is visited once for all of them
+    VARIABLE_MAJOR = True
+
     @classmethod
     def group_results_scorer(cls, result_grouping):
         """
@@ -192,23 +209,48 @@ class Group(object):
 
         return new_group
 
-    def run(self, dataset):
+    def freeze(self):
+        """
+        Recursively replaces the checkers and blueprints of this Group (and its
+        subgroups and Blueprints) with tuples, so that no more may be added.
+
+        @return this Group
+        """
+        self.checkers = tuple(self.checkers)
+        self.blueprints = tuple(blueprint.freeze() for blueprint in self.blueprints)
+
+        return self
+
+    def run(self, dataset, path=None):
         """
         Recursively performs a depth-first traversal and execution of subgroups
         and Blueprints. Performs summary scoring and moving forward of failed
         tests as the recursion completes.
 
         @param dataset a netCDF4 dataset to give to the blueprint execution
+        @param path tuple that identifies this Group within its CheckSuite,
+                    from which the IDs of its results are derived (see
+                    get_result_id()), defaults to that of a CheckSuite
         @return a dict with non-blacklisted attributes of this group, summary
-                scoring, a probably unique signed integer, and a list of results
+                scoring, an ID that is unique within the report (and the same
+                for every report of the same suite) and a list of results
         """
+        if path is None:
+            path = (getattr(self, 'short_name', self.name), getattr(self, 'version', None))
+
         total_number_passed = 0
         total_number_results = 0
 
         group_results = []
+        varattrs_results = self._run_varattrs(dataset) if self.VARIABLE_MAJOR else {}
 
-        for blueprint in self.blueprints:
-            blueprint_results = blueprint.run(dataset)
+        for index, blueprint in enumerate(self.blueprints):
+            if index in varattrs_results:
+                blueprint_results = varattrs_results[index]
+            elif isinstance(blueprint, Group):
+                blueprint_results = blueprint.run(dataset, path + (index, blueprint.name))
+            else:
+                blueprint_results = blueprint.run(dataset)
 
             # This indicates that we are returning from a recursion.
             # That is, blueprint_results is a dict that is the result
@@ -238,15 +280,14 @@ class Group(object):
                     # Assertion: sorting algorithm is stable...
                     #            we want different checker results to maintain their adjacency...
                     # Python's default, mergesort, is stable
-                    individual_results.sort(key=lambda result: result.passed)
+                    individual_results.sort(key=lambda result: bool(result.passed))
 
                     results_bundle = {
                         'name': name,
                         'passed': number_passed,
                         'total': number_total,
                         'results': individual_results,
-                        # TODO: hack (see note below)
-                        'hash': hash(name) + randrange(1e5),
+                        'hash': get_result_id(path + (index, name)),
                         'automatic_grouping': True,
                         'priority': blueprint.priority if hasattr(blueprint, 'priority') else None,
                     }
@@ -267,13 +308,67 @@ class Group(object):
         ret['passed'] = total_number_passed
         ret['total'] = total_number_results
 
-        # Generate a pseudorandom hash for use in templates and unique naming
-        # where there is no good method for uniquely referring to groups.
-        # TODO: this is a hack and is only necessary for HTML
-        ret['hash'] = hash(ret['name']) + randrange(1e5)
+        # An ID for use in templates and unique naming, where there is no other
+        # method for uniquely referring to groups
+        ret['hash'] = get_result_id(path)
 
         return ret
 
+    def _run_varattrs(self, dataset):
+        """
+        Runs the Blueprints of this Group that check an attribute of every
+        variable (i.e. of the varattrs scope, without a list of variables)
+        variable-major: each variable is visited once, to look up the
+        attributes of every one of those Blueprints, which their Checkers are
+        then applied to in turn (see Checker.check_varattrs()).
+
+        The results of each Blueprint are in the same order as Blueprint.run()
+        would give them.
+
+        @param dataset a DatasetSnapshot to run the Blueprints against
+        @return a dict of the index of each Blueprint run within this Group's
+                blueprints to the list of its results
+        """
+        indices = [
+            index for index, blueprint in enumerate(self.blueprints)
+            if isinstance(blueprint, Blueprint) and blueprint.runs_variable_major
+        ]
+
+        if len(indices) < 2:
+            return {}
+
+        start = time.time()
+
+        blueprints = [self.blueprints[index] for index in indices]
+        variable_names = []
+        values = [[] for _ in blueprints]
+
+        for group in get_groups(dataset):
+            for variable_name, variable in group.variables.items():
+                variable_names.append(variable_name)
+
+                for blueprint, blueprint_values in zip(blueprints, values):
+                    blueprint_values.append(variable.attributes.get(blueprint.name))
+
+        blueprint_results = []
+
+        for blueprint, blueprint_values in zip(blueprints, values):
+            checker_results = []
+
+            for checker, prerequisites in zip(blueprint.checkers, blueprint.prerequisites):
+                checker_results.append(get_checker(checker, dataset).check_varattrs(
+                    blueprint, variable_names, blueprint_values,
+                    prerequisites=[checker_results[position] for position in prerequisites]
+                ))
+
+            blueprint_results.append([result for results in checker_results for result in results])
+
+        end = time.time()
+
+        logger.debug(f"Ran {len(indices)} blueprints of \"{self.name}\" variable-major in {end - start:.3f} seconds")
+
+        return dict(zip(indices, blueprint_results))
+
 
 class CheckSuite(Group):
     """
@@ -289,6 +384,14 @@ class CheckSuite(Group):
     REQUIRED_KEYS = ('name', 'short_name', 'description', 'url', 'versions')
     ABOUT = {}
 
+    # Whether the suite only reads the metadata (dimensions, attributes and
+    # variable types) of a dataset, never the values of its variables
+    METADATA_ONLY = False
+
+    # Whether the suite checks standard names, and so may be set up with the
+    # version of the standard name table to use (see standard_names.py)
+    CHECKS_STANDARD_NAMES = False
+
     def __init__(self):
         missing_keys = [
             key for key in CheckSuite.REQUIRED_KEYS
@@ -303,6 +406,67 @@ class CheckSuite(Group):
         # Initialize a Group with the validated attributes.
         super().__init__(None, **self.ABOUT)
 
+    def run(self, dataset):
+        """
+        Runs all the Blueprints of the suite against a snapshot of the metadata
+        of the dataset (see snapshot.py), which is only read once.
+
+        @param dataset a netCDF4 dataset, or a DatasetSnapshot of one
+        @return the results dict described by Group.run()
+        """
+        return super().run(take_snapshot(dataset))
+
+    @property
+    def cache_version(self):
+        """
+        The version that reports of the suite are cached under, which tells
+        apart the set ups of the suite that may give different results.
+        """
+        return str(self.version)
+
+    @classmethod
+    def compiled(cls, *args):
+        """
+        Gets a set up and frozen instance of this CheckSuite, which is only
+        built the first time it is asked for within a process.
+
+        The instance is shared between all the threads of the process, so must
+        only be run, never modified.
+
+        @param args arguments to pass to setup(), e.g. the version
+        @return the CheckSuite instance
+        """
+        key = (cls,) + args
+
+        with _compiled_suites_lock:
+            suite = _compiled_suites.get(key)
+
+            if suite is None:
+                start = time.time()
+                suite = cls().setup(*args).freeze()
+                end = time.time()
+
+                logger.debug(f"Compiled {cls.__name__} {args} in {end - start:.3f} seconds")
+                _compiled_suites[key] = suite
+
+        return suite
+
+    def __reduce_ex__(self, protocol):
+        # Compiled suites are pickled by reference, so they can be sent to
+        # other processes cheaply, where they are compiled (once) as needed
+        with _compiled_suites_lock:
+            keys = [key for key, suite in _compiled_suites.items() if suite is self]
+
+        if keys:
+            return _get_compiled, keys[0]
+
+        return super().__reduce_ex__(protocol)
+
+
+def _get_compiled(cls, *args):
+    """Unpickles a compiled CheckSuite (see CheckSuite.__reduce_ex__)."""
+    return cls.compiled(*args)
+
 
 class Blueprint(object):
     """
@@ -323,15 +487,25 @@ class Blueprint(object):
                         (can be None)
         @param kwargs additional attributes to assign to this Blueprint object
         """
-        if blueprint is None:
-            blueprint = {}
-
         self.checkers = checkers if checkers else tuple()
 
-        blueprint.update(kwargs)
-        for key, value in blueprint.items():
+        # Copy the blueprint, since the same dict may be used for many Blueprints
+        attributes = dict(blueprint) if blueprint else {}
+        attributes.update(kwargs)
+
+        for key, value in attributes.items():
             setattr(self, key, value)
 
+    def freeze(self):
+        """
+        Replaces the checkers of this Blueprint with a tuple.
+
+        @return this Blueprint
+        """
+        self.checkers = tuple(self.checkers)
+
+        return self
+
     @property
     def long_name(self):
         name_components = []
@@ -345,6 +519,31 @@ class Blueprint(object):
 
         return ".".join(reversed(name_components))
 
+    @property
+    def prerequisites(self):
+        """
+        For each of the checkers of this Blueprint, the positions of the
+        checkers before it that it depends on (see Checker.DEPENDS_ON).
+        """
+        return [
+            tuple(
+                position for position, other in enumerate(self.checkers)
+                if position < index and issubclass(other, checker.DEPENDS_ON)
+            )
+            for index, checker in enumerate(self.checkers)
+        ]
+
+    @property
+    def runs_variable_major(self):
+        """
+        Whether this Blueprint may be run by its Group variable-major, along
+        with the other Blueprints that check an attribute of every variable.
+        """
+        return (
+            getattr(self, 'scope', 'globals') == 'varattrs' and not hasattr(self, 'variables')
+            and all(checker.run is Checker.run for checker in self.checkers)
+        )
+
     def run(self, dataset, indent=0):
         """
         Linearly run all the Checker instances assigned to this Blueprint.
@@ -354,10 +553,15 @@ class Blueprint(object):
         """
         logger.debug(f"{'    ' * indent}Running blueprint \"{self.long_name}\" version {self.version}")
 
-        for checker in self.checkers:
-            checker_results_generator = checker(dataset).run(self, indent=indent+1)
+        checker_results = []
+
+        for checker, prerequisites in zip(self.checkers, self.prerequisites):
+            results = list(get_checker(checker, dataset).run(
+                self, indent=indent+1, prerequisites=[checker_results[position] for position in prerequisites]
+            ))
+            checker_results.append(results)
 
-            for result in checker_results_generator:
+            for result in results:
                 yield result
 
 
@@ -370,7 +574,12 @@ class Checker(object):
     # by inheritors of this class to override this value with a specific name.
     CHECKER_NAME = "base checker"
 
-    # The full netCDF4 dataset under investigation.
+    # Checker classes that this Checker depends on. When one of them comes
+    # before this Checker within a Blueprint and fails for a value, this
+    # Checker is skipped for that value (see Checker.skipped()).
+    DEPENDS_ON = ()
+
+    # A snapshot of the metadata of the dataset under investigation.
     dataset = None
 
     # [Optional] A piece of immutable data that can be pre-calculated.
@@ -389,7 +598,7 @@ class Checker(object):
         Each checker should call initialize() and do any other
         setup for instance variables it feels like.
 
-        @param dataset a complete netCDF4 dataset
+        @param dataset a DatasetSnapshot of a complete netCDF4 dataset
         """
         self.setup_dataset(dataset)
 
@@ -397,7 +606,7 @@ class Checker(object):
         if self.dataset is None:
             self.dataset = dataset
 
-    def run(self, blueprint, indent=0):
+    def run(self, blueprint, indent=0, prerequisites=()):
         """
         Execute the Checker.
 
@@ -408,6 +617,9 @@ class Checker(object):
 
         @param blueprint handle to the Blueprint object that invoked this Checker instance
         @param indent an integer value indiciating the indentation level for logging
+        @param prerequisites list of the results of the Checkers of the Blueprint
+                             that this Checker depends on, each in the same
+                             order as the results of this Checker
         @return three-tuple of ([Result | list of Results],
                                 number passed <int>,
                                 number tested <int>)
@@ -420,16 +632,20 @@ class Checker(object):
         start = time.time()
 
         scope = getattr(blueprint, 'scope', 'globals')
+        # Position of the current value amongst those checked
+        index = 0
 
         if scope == 'globals':
             name = getattr(blueprint, 'name')
-            value = getattr(self.dataset, name, None)
+            value = self.dataset.attributes.get(name)
             self.current_value = value
 
-            result = self.run_global(blueprint, value)
+            failed = get_failed_prerequisite(prerequisites, index)
+            result = self.skipped(failed) if failed else self.run_global(blueprint, value)
             yield result
         elif scope == 'varattrs':
-            attribute = getattr(blueprint, 'name')
+            variable_names = []
+            values = []
 
             for group in self.get_groups():
                 # Choose variables to check (default to all)
@@ -442,24 +658,21 @@ class Checker(object):
                     variables = group.variables
 
                 for variable_name, variable in variables.items():
-                    value = getattr(variable, attribute, None)
-                    self.current_value = value
+                    variable_names.append(variable_name)
+                    values.append(variable.attributes.get(blueprint.name) if variable is not None else None)
 
-                    result = self.run_varattr(blueprint, variable_name, value)
-                    yield result
+            yield from self.check_varattrs(blueprint, variable_names, values, prerequisites)
         elif scope == 'vars':
             variable = getattr(blueprint, 'name')
 
             for group in self.get_groups():
                 value = group.variables.get(variable)
+                self.current_value = value.description if value is not None else None
 
-                if value is not None:
-                    representation = (f'{k}: "{v}"' for k, v in value.__dict__.items())
-                    self.current_value = '; '.join(representation)
-                else:
-                    self.current_value = None
+                failed = get_failed_prerequisite(prerequisites, index)
+                index += 1
 
-                result = self.run_vars(blueprint, value)
+                result = self.skipped(failed) if failed else self.run_vars(blueprint, value)
                 yield result
         else:
             raise NotImplementedError(f'scope "{scope}" not implemented')
@@ -468,13 +681,53 @@ class Checker(object):
 
         logger.debug(f"{'  ' * indent}Checker \"{self.CHECKER_NAME}\" completed in {end - start:.3f} seconds")
 
-    def get_groups(self):
-        if self.dataset.groups:
-            groups = [group for key, group in self.dataset.groups.items()]
-        else:
-            groups = [self.dataset]
+    def check_varattrs(self, blueprint, variable_names, values, prerequisites=()):
+        """
+        Runs the test against the attribute (named by the blueprint) of each
+        of many variables.
+
+        Values are tested in one batch (see run_batch()), unless this Checker
+        overrides run_varattr() to test each variable on its own.
+
+        @param blueprint an initialized Blueprint object of the varattrs scope
+        @param variable_names list of the names of the variables
+        @param values list of the values of the attribute of each variable,
+                     None where either does not exist
+        @param prerequisites list of the results of the Checkers of the Blueprint
+                             that this Checker depends on, for each variable
+        @return a list of Result objects, one per variable
+        """
+        self.blueprint = blueprint
+
+        batched = type(self).run_varattr is Checker.run_varattr
+        results = []
+        # Positions of the values to test in one batch
+        batch = []
 
-        return groups
+        for index, (variable_name, value) in enumerate(zip(variable_names, values)):
+            failed = get_failed_prerequisite(prerequisites, index)
+            self.current_value = value
+
+            if failed:
+                result = self.skipped(failed)
+                setattr(result, 'variable', variable_name)
+            elif batched:
+                result = None
+                batch.append(index)
+            else:
+                result = self.run_varattr(blueprint, variable_name, value)
+
+            results.append(result)
+
+        if batch:
+            for index, result in zip(batch, self.run_batch(blueprint, [values[index] for index in batch])):
+                setattr(result, 'variable', variable_names[index])
+                results[index] = result
+
+        return results
+
+    def get_groups(self):
+        return get_groups(self.dataset)
 
     def run_global(self, blueprint, value):
         """
@@ -491,6 +744,29 @@ class Checker(object):
         """
         raise NotImplementedError('must implement a run_global() method')
 
+    def run_batch(self, blueprint, values):
+        """
+        Use this method to test many values of the same blueprint at once, i.e.
+        the attribute of every variable.
+
+        By default each value is tested in turn with run_global(), but Checkers
+        may override this method to test the values together, e.g. to only
+        test each distinct value once. The current_value must be set to each
+        value before its Result is created.
+
+        @param blueprint an initialized Blueprint object
+        @param values a list of the values being tested; None for those that
+                      might not exist
+        @return a list of Result objects, one for each value, in order
+        """
+        results = []
+
+        for value in values:
+            self.current_value = value
+            results.append(self.run_global(blueprint, value))
+
+        return results
+
     def run_varattr(self, blueprint, variable, value):
         """
         Use this method to test against an attribute of all variables.
@@ -533,15 +809,104 @@ class Checker(object):
                       checker_name=self.CHECKER_NAME, message=message,
                       **kwargs)
 
+    def skipped(self, failed, **kwargs):
+        """
+        Convenience method for creating the Result of a test that was not run,
+        because a Checker that this Checker depends on failed.
+
+        @param failed the failed Result of the Checker depended on
+        """
+        # A skipped Result passes on the reason that it was skipped
+        message = failed.message if failed.passed is None else f'failed the {failed.checker_name}'
+
+        return Result(None, self.current_value, self.blueprint,
+                      checker_name=self.CHECKER_NAME, message=message,
+                      **kwargs)
+
+
+def get_checker(checker, dataset):
+    """
+    Gets the instance of a Checker class for a dataset, which is shared by
+    every Blueprint checked against a DatasetSnapshot.
+
+    @param checker a Checker class
+    @param dataset a DatasetSnapshot, or netCDF4 dataset
+    @return an instance of checker for the dataset
+    """
+    if not isinstance(dataset, DatasetSnapshot):
+        return checker(dataset)
+
+    instance = dataset.checkers.get(checker)
+
+    if instance is None:
+        instance = dataset.checkers[checker] = checker(dataset)
+
+    return instance
+
+
+def get_failed_prerequisite(prerequisites, index):
+    """
+    Finds whether a Checker that another depends on failed for a value.
+
+    @param prerequisites list of the results of the Checkers depended on
+    @param index position of the value amongst those checked
+    @return the first failed Result for the value, or None if they all passed
+    """
+    for results in prerequisites:
+        if not results[index].passed:
+            return results[index]
+
+    return None
+
+
+def get_groups(dataset):
+    """
+    Gets the groups of a dataset whose variables are checked.
+
+    @param dataset a DatasetSnapshot
+    @return a list of the subgroups of the dataset, or of the dataset itself
+            if it has none
+    """
+    if dataset.groups:
+        groups = [group for key, group in dataset.groups.items()]
+    else:
+        groups = [dataset]
+
+    return groups
+
+
+def get_result_id(path):
+    """
+    Gets the ID of a group of results, which stays the same from one run (and
+    process) to the next, unlike hash() of a str.
+
+    @param path tuple of the short name and version of the CheckSuite, then
+                the position and name of each Group (or Blueprint) from the
+                CheckSuite down to the group of results
+    @return a non-negative integer, small enough to be represented exactly
+            by a JSON (i.e. double precision) number
+    """
+    digest = hashlib.blake2b(repr(path).encode('utf-8'), digest_size=6).digest()
+
+    return int.from_bytes(digest, 'big')
+
 
 class Result(object):
     """
     A Result object is basically a dumb repository of attributes that
     we then parse out.
+
+    A Result holds onto the Blueprint that it is the result of, rather than a
+    copy of its attributes, and looks those attributes (e.g. name, description,
+    priority) up from the Blueprint when they are asked for. Only the fields
+    that differ from one Result of a Blueprint to the next are stored on the
+    Result itself.
     """
     # Set of attribute names that are not carried over from a provided Blueprint.
     BLACKLIST = frozenset(['blueprints', 'checkers'])
 
+    __slots__ = ('passed', 'value', 'blueprint', 'checker_name', 'message', 'variable', 'extra')
+
     def __init__(self, passed, value, blueprint, **kwargs):
         """
         Create a new Result instance.
@@ -561,19 +926,78 @@ class Result(object):
         #   <type 'str'> -> Checker was run, but Result is in a special category
         self.passed = passed
         self.value = value
-
-        for attr, value in vars(blueprint).items():
-            if attr not in Result.BLACKLIST:
-                setattr(self, attr, value)
+        self.blueprint = blueprint
+        self.extra = None
 
         # These optional values represent material for constructing user
         # feedback about the tests.
         for key, value in kwargs.items():
             setattr(self, key, value)
 
+    def __setattr__(self, name, value):
+        if name in Result.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+
+            self.extra[name] = value
+
+    def __getattr__(self, name):
+        # Only called for names that are not set within the slots of the Result
+        if name.startswith('__') or name in Result.__slots__:
+            raise AttributeError(name)
+
+        if self.extra is not None and name in self.extra:
+            return self.extra[name]
+
+        if name not in Result.BLACKLIST:
+            try:
+                return vars(self.blueprint)[name]
+            except KeyError:
+                pass
+
+        raise AttributeError(name)
+
+    def fields(self):
+        """
+        Gets the attributes held by this Result itself, i.e. those that are not
+        looked up from its Blueprint.
+
+        @return a dict of the attributes of this Result
+        """
+        attributes = {'passed': self.passed, 'value': self.value}
+
+        for name in ('checker_name', 'message'):
+            if hasattr(self, name):
+                attributes[name] = getattr(self, name)
+
+        if self.extra is not None:
+            attributes.update(self.extra)
+
+        if hasattr(self, 'variable'):
+            attributes['variable'] = self.variable
+
+        return attributes
+
+    def as_dict(self):
+        """
+        Gets all the attributes of this Result, including those of its Blueprint.
+
+        @return a dict of the attributes of this Result
+        """
+        attributes = {'passed': self.passed, 'value': self.value}
+        attributes.update(
+            (key, value) for key, value in vars(self.blueprint).items()
+            if key not in Result.BLACKLIST
+        )
+        attributes.update(self.fields())
+
+        return attributes
+
     def __repr__(self):
         return '<{0}>'.format(
-            ', '.join(f'{k}: "{v}"' for k, v in vars(self).items())
+            ', '.join(f'{k}: "{v}"' for k, v in self.as_dict().items())
         )
 
     def __str__(self):
@@ -582,7 +1006,13 @@ class Result(object):
         else:
             name = self.name
 
-        if hasattr(self, 'priority') and self.priority == 'optional':
+        if self.passed is None:
+            return '{checker_name} was skipped because "{name}" {message}'.format(
+                checker_name=self.checker_name,
+                name=name,
+                message=self.message
+            ).rstrip()
+        elif hasattr(self, 'priority') and self.priority == 'optional':
             return '{checker_name} of variable {name} {pass_str} {message}'.format(
                 checker_name=self.checker_name,
                 pass_str='is' if self.passed else 'is not',
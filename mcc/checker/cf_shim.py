@@ -13,18 +13,18 @@ import inspect
 import logging
 import sys
 import time
-from random import randrange
 
 from compliance_checker import cfutil
 from compliance_checker.base import BaseCheck, Result, fix_return_value
-from compliance_checker.cf import util
+from compliance_checker.cf import cf_1_6, util
 from compliance_checker.cf.cf_1_6 import CF1_6Check
 from compliance_checker.cf.cf_1_7 import CF1_7Check
 from compliance_checker.cf.cf_base import CFNCCheck
 from compliance_checker.suite import CheckSuite as CCCheckSuite
 from flask import abort
 
-from .base import CheckSuite
+from .base import CheckSuite, get_result_id
+from .units import parse_unit
 
 logger = logging.getLogger(__name__)
 
@@ -193,6 +193,13 @@ def check_calendar_patch(self, ds):
     return ret_val
 
 
+# The compliance checker parses the units of each variable (and of the standard
+# names they use) many times over, through cf_units.Unit(), so have its modules
+# share the cache of parsed units instead (see units.py).
+for module in (cfutil, util, cf_1_6):
+    module.Unit = parse_unit
+
+
 # CF 1.6 Conventions
 class CF1_6Shim(CCCheckSuite):
     CF1_6Check.check_calendar = check_calendar_patch
@@ -228,7 +235,7 @@ class CF(CheckSuite):
 
     DEFAULT_VERSION = '1.6'
 
-    def _parse_node(self, parent):
+    def _parse_node(self, parent, path):
         ret = {
             'name': parent.name,
             'passed': parent.value[0],
@@ -236,15 +243,20 @@ class CF(CheckSuite):
         }
 
         if parent.msgs:
+            # The compliance checker gathers some messages by iterating over
+            # sets of variable names, so sort them to keep reports the same
+            # from one run to the next
             try:
-                ret['message'] = '\n'.join(parent.msgs)
+                ret['message'] = '\n'.join(sorted(parent.msgs))
             except TypeError:
                 ret['message'] = parent.msgs
 
         if parent.children:
-            ret['results'] = [self._parse_node(x) for x in parent.children]
+            ret['results'] = [
+                self._parse_node(x, path + (index, x.name)) for index, x in enumerate(parent.children)
+            ]
 
-        ret['hash'] = hash(ret['name']) + randrange(1e5)
+        ret['hash'] = get_result_id(path)
 
         return ret
 
@@ -267,7 +279,10 @@ class CF(CheckSuite):
         except KeyError as err:
             logger.warning(f"The key {str(err)} does not exist")
 
-        results = [self._parse_node(node) for node in results]
+        results = [
+            self._parse_node(node, (self.short_name, self.version, index, node.name))
+            for index, node in enumerate(results)
+        ]
         total_passed, total = self._reduce_score(results)
 
         ret = {k: v for k, v, in CF.ABOUT.items()}
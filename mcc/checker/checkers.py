@@ -11,17 +11,15 @@ need to be implemented and to what extent for new Checkers.
 
 """
 
-import json
 import logging
 import re
-from difflib import get_close_matches
-from os.path import dirname, join
 
 import numpy as np
-from cf_units import Unit
-from isodate import parse_date, parse_datetime, parse_duration
 
 from .base import Checker
+from .iso8601 import DATE, DATETIME, get_datetime_kind, is_duration
+from .standard_names import get_standard_name_table
+from .units import parse_unit
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +28,8 @@ class CheckExistence(Checker):
     """
     Checks if value is valid, which implies the existence of the value.
     This Checker is tightly coupled with the value passing in base.py
+    Most other Checkers depend on it (see Checker.DEPENDS_ON), so are skipped
+    for values that do not exist.
     """
     USELESS_VALUES = ('null', 'NULL', 'none', 'NONE', 'NIL', 'nil', '', 'n/a', 'N\A',)
     CHECKER_NAME = 'check for existence'
@@ -57,6 +57,7 @@ class CheckCommaSeparated(Checker):
     # note this character set is not unicode aware
     NON_ALPHANUMERIC = re.compile(r'[^A-z0-9 ,]')
     CHECKER_NAME = 'check for a comma separated value'
+    DEPENDS_ON = (CheckExistence,)
 
     @staticmethod
     def commas_dominant(value):
@@ -95,51 +96,52 @@ class CheckStandardName(Checker):
     """
     Determines whether a value is in a version of the standard name table.
 
-    The json file used is generated from xml files of standard names
-    (see mcc/utils/standard_names_converter.py).
+    The tables used are generated from xml files of standard names (see
+    mcc/utils/standard_names_converter.py). Blueprints may select the version
+    of the table with a 'standard_name_table' attribute, and otherwise the
+    latest is used (see standard_names.py).
 
     If we can't find an exact match of the standard name, then fail but provide
-    a suggestion if one is found. This process is very slow (relatively), so
-    use this with caution.
+    a suggestion if one is found. Each table is loaded once per process, and
+    suggestions are remembered for each distinct name.
     """
-    STANDARD_NAME_TABLE_FN = join(dirname(__file__), 'data', 'CF-Standard-Names-Table-77.json')
     CHECKER_NAME = 'check for standard name'
-
-    def __init__(self, dataset):
-        super().__init__(dataset)
-
-        if not self.cached_data:
-            with open(self.STANDARD_NAME_TABLE_FN) as infile:
-                self.cached_data = json.load(infile)
-                self.cached_keys = list(self.cached_data['data'].keys())
+    DEPENDS_ON = (CheckExistence,)
 
     def run_global(self, blueprint, value):
         if value is None:
             return self.error('does not exist')
 
-        name_in_table = value in self.cached_keys
+        table = get_standard_name_table(getattr(blueprint, 'standard_name_table', None))
 
-        if name_in_table:
+        if value in table:
             return self.success(f'has value in {value} standard name table')
 
-        best_guess_standard_name = get_close_matches(value, self.cached_keys, 1)
+        best_guess_standard_name = table.suggest(value)
 
         if best_guess_standard_name:
-            message = (f'has invalid standard name (v{self.cached_data["version"]}). '
-                       f'best guess: {best_guess_standard_name[0]}')
+            message = (f'has invalid standard name (v{table.version}). '
+                       f'best guess: {best_guess_standard_name}')
         else:
-            message = f'has invalid standard name (v{self.cached_data["version"]})'
+            message = f'has invalid standard name (v{table.version})'
 
         return self.error(message)
 
+    def run_batch(self, blueprint, values):
+        # Variables often share standard names (e.g. those of quality flags),
+        # so each distinct name is only looked up (and guessed at) once
+        return run_distinct(self, blueprint, values)
+
 
 class CheckUDUnits(Checker):
     """
     Determines if a value is a valid UD Unit.
 
-    The heavy lifting is done by udunitspy.
+    The heavy lifting is done by cf_units (and UDUNITS), whose parsed units
+    are cached for the whole process (see units.py).
     """
     CHECKER_NAME = 'check for valid UD Unit'
+    DEPENDS_ON = (CheckExistence,)
 
     def run_global(self, blueprint, value):
         if value is None:
@@ -149,14 +151,17 @@ class CheckUDUnits(Checker):
         unit_string = str(value)
 
         try:
-            # if type(unit_string) is unicode, this causes cf_units to fail...
-            unit = Unit(unit_string)
+            unit = parse_unit(unit_string)
 
             return self.success(message.format(u=str(unit), message='valid'))
-        except (ValueError, TypeError) as err:
-            logger.warning(f"UNKNOWN unit: %s not recognized by UDUNITS, reason: %s", unit_string, str(err))
+        except (ValueError, TypeError):
+            # The reason is logged by parse_unit(), the first time it fails
             return self.error(message.format(u=value, message='invalid'))
 
+    def run_batch(self, blueprint, values):
+        # Many variables share the same units, which only need parsing once
+        return run_distinct(self, blueprint, values)
+
 
 class CheckPossibleValues(Checker):
     """
@@ -164,6 +169,7 @@ class CheckPossibleValues(Checker):
     attribute of the check.
     """
     CHECKER_NAME = 'check for value in a set of possible values'
+    DEPENDS_ON = (CheckExistence,)
 
     def run_global(self, blueprint, value):
         if value is None:
@@ -183,48 +189,55 @@ class CheckPossibleValues(Checker):
 class CheckISODatestuff(Checker):
     """
     Validates ISO-8601 datetimes, falling back to dates if that doesn't work.
+
+    Common forms of datetimes and dates are validated without isodate, and
+    the results are remembered for each distinct string (see iso8601.py).
     """
     CHECKER_NAME = 'check for valid iso-8601 date(time)'
+    DEPENDS_ON = (CheckExistence,)
 
     def run_global(self, blueprint, value):
         if value is None:
             return self.error('does not exist')
 
-        # Try to parse out datetime
-        try:
-            parse_datetime(value)
+        kind = get_datetime_kind(value)
+
+        if kind == DATETIME:
             return self.success('has a valid ISO-8601 datetime')
-        except ValueError:
-            pass
 
-        # If that doesn't work, try to parse out a date
-        try:
-            parse_date(value)
+        if kind == DATE:
             return self.success('has a valid ISO-8601 date (but not datetime)')
-        except ValueError:
-            pass
 
         return self.error('is not a valid date or datetime')
 
+    def run_batch(self, blueprint, values):
+        # Variables often share the same dates, which only need validating once
+        return run_distinct(self, blueprint, values)
+
 
 class CheckISODuration(Checker):
     """
     Validates ISO-8601 durations.
+
+    Common forms of durations are validated without isodate, and the results
+    are remembered for each distinct string (see iso8601.py).
     """
     CHECKER_NAME = 'check for valid iso-8601 duration'
+    DEPENDS_ON = (CheckExistence,)
 
     def run_global(self, blueprint, value):
         if value is None:
             return self.error('does not exist')
 
-        try:
-            parse_duration(value)
+        if is_duration(value):
             return self.success('is a valid duration')
-        except (ValueError, TypeError):
-            pass
 
         return self.error('is not a valid duration')
 
+    def run_batch(self, blueprint, values):
+        # As for CheckISODatestuff
+        return run_distinct(self, blueprint, values)
+
 
 class CheckDeprecated(Checker):
     """
@@ -249,6 +262,11 @@ class CheckTypes(Checker):
     The valid type strings are {byte, short, int, lomg, string, float, double}.
     The mapping of these types to values is taken from the GDS2 manual,
     GDSR20r5.pdf, page 17.
+
+    Whether each type (of value, or datatype of a variable) is valid as each
+    type string is looked up in TYPE_TABLE, which is built at import for the
+    numpy and builtin types, rather than walking the numpy type hierarchy for
+    every value.
     """
     TYPE_MAP = {
         'byte': np.int8,
@@ -265,7 +283,12 @@ class CheckTypes(Checker):
         for (human_name, np_type) in TYPE_MAP.items()
     }
 
+    # Result of equal_types() for each type and type string, keyed by
+    # (type of the type, type, type string); see build_type_table()
+    TYPE_TABLE = {}
+
     CHECKER_NAME = 'check for valid numpy types'
+    DEPENDS_ON = (CheckExistence,)
 
     @classmethod
     def equal_types(cls, have_type, want_type):
@@ -287,6 +310,101 @@ class CheckTypes(Checker):
 
         return type_is_leq, have_type_name, want_type_name
 
+    @classmethod
+    def build_type_table(cls, have_types):
+        """
+        Adds the result of equal_types() for each of the given types against
+        every type string of TYPE_MAP to TYPE_TABLE.
+
+        @param have_types iterable of types (or numpy dtypes) that values may have
+        """
+        for have_type in have_types:
+            for type_string, want_type in cls.TYPE_MAP.items():
+                cls.TYPE_TABLE[(type(have_type), have_type, type_string)] = cls.equal_types(have_type, want_type)
+
+    @classmethod
+    def lookup_types(cls, have_type, type_string):
+        """
+        Looks up the result of equal_types() for a type and type string.
+
+        Types that are missing from TYPE_TABLE are compared with equal_types(),
+        and added to it if they are types or numpy dtypes (rather than e.g. the
+        user-defined types of a netCDF file, which are not kept).
+
+        @param have_type a type object that represents the current type we have
+        @param type_string a type string of TYPE_MAP to compare it with
+        @return the three-tuple of equal_types()
+        """
+        key = (type(have_type), have_type, type_string)
+
+        try:
+            return cls.TYPE_TABLE[key]
+        except KeyError:
+            equal = cls.equal_types(have_type, cls.TYPE_MAP[type_string])
+
+            if isinstance(have_type, (type, np.dtype)):
+                cls.TYPE_TABLE[key] = equal
+
+            return equal
+        except TypeError:
+            # Unhashable
+            return cls.equal_types(have_type, cls.TYPE_MAP[type_string])
+
+    @classmethod
+    def classify_types(cls, have_types, want):
+        """
+        Classifies many types against the same valid type string(s), looking
+        up each distinct type once.
+
+        @param have_types iterable of type objects (or numpy dtypes)
+        @param want a type string, or a tuple or list of type strings
+        @return a list of (passed <bool>, message <str>) tuples, one for each
+                type, in order
+        """
+        classified = {}
+        results = []
+
+        for have_type in have_types:
+            try:
+                key = (type(have_type), have_type)
+                result = classified.get(key)
+            except TypeError:
+                key = result = None
+
+            if result is None:
+                result = cls.classify_type(have_type, want)
+
+                if key is not None:
+                    classified[key] = result
+
+            results.append(result)
+
+        return results
+
+    @classmethod
+    def classify_type(cls, have_type, want):
+        """
+        @param have_type a type object that represents the current type we have
+        @param want a type string, or a tuple or list of type strings
+        @return a (passed <bool>, message <str>) tuple of whether have_type is
+                valid as (one of) want
+        """
+        if isinstance(want, (tuple, list)):
+            for type_string in want:
+                passed, have_type_name, want_type_name = cls.lookup_types(have_type, type_string)
+
+                if passed:
+                    return True, f'has type {have_type_name}'
+            else:
+                return False, f'has type {have_type_name} not in {", ".join(want)}'
+        else:
+            passed, have_type_name, want_type_name = cls.lookup_types(have_type, want)
+
+            if passed:
+                return True, f'has type {have_type_name}'
+
+            return False, f'has type {have_type_name} when we want type {want_type_name}'
+
     def run_global(self, blueprint, value, have_type=None):
         if value is None:
             return self.error('does not exist')
@@ -296,30 +414,82 @@ class CheckTypes(Checker):
         # Set to None so we can hide on display
         setattr(self, 'current_value', None)
 
-        if isinstance(blueprint.type, (tuple, list)):
-            for type_string in blueprint.type:
-                want_type = self.TYPE_MAP[type_string]
-                passed, have_type_name, want_type_name = self.equal_types(have_type, want_type)
+        passed, message = self.classify_type(have_type, blueprint.type)
 
-                if passed:
-                    return self.success(f'has type {have_type_name}')
-            else:
-                message = f'has type {have_type_name} not in {", ".join(blueprint.type)}'
-                return self.error(message)
-        else:
-            want_type = self.TYPE_MAP[blueprint.type]
-            passed, have_type_name, want_type_name = self.equal_types(have_type, want_type)
+        return self.success(message) if passed else self.error(message)
 
-            if passed:
-                return self.success(f'has type {have_type_name}')
+    def run_batch(self, blueprint, values):
+        # The values of an attribute across variables have a few types at most,
+        # which are each classified once
+        classified = iter(self.classify_types(
+            [type(value) for value in values if value is not None], blueprint.type
+        ))
+        results = []
+
+        # Set to None so we can hide on display
+        self.current_value = None
 
-            message = f'has type {have_type_name} when we want type {want_type_name}'
+        for value in values:
+            if value is None:
+                results.append(self.error('does not exist'))
+                continue
 
-            return self.error(message)
+            passed, message = next(classified)
+            results.append(self.success(message) if passed else self.error(message))
+
+        return results
 
     def run_vars(self, blueprint, value):
-        if not value:
+        # value is a VariableSnapshot (see snapshot.py), if the variable exists
+        if value is None:
             return self.error('does not exist')
 
         result = self.run_global(blueprint, value, have_type=value.datatype)
         return result
+
+
+# Every numpy scalar type and dtype, and the builtin types of attribute values
+CheckTypes.build_type_table(
+    list(set(np.sctypeDict.values()))
+    + [np.dtype(np_type) for np_type in set(np.sctypeDict.values())]
+    + [str, bytes, int, float, bool]
+)
+
+
+def run_distinct(checker, blueprint, values):
+    """
+    Tests a batch of values (see Checker.run_batch()) with run_global(), only
+    testing each distinct value once. Values that are equal are given Results
+    with the same pass/fail status and message.
+
+    @param checker the Checker instance to test the values with
+    @param blueprint an initialized Blueprint object
+    @param values a list of the values being tested
+    @return a list of Result objects, one for each value, in order
+    """
+    results = []
+    # Result of each distinct value, keyed by its type and value (so that
+    # e.g. 1 and 1.0 are tested separately)
+    distinct = {}
+
+    for value in values:
+        checker.current_value = value
+
+        try:
+            key = (type(value), value)
+            first = distinct.get(key)
+        except TypeError:
+            # Unhashable, e.g. an array
+            key = first = None
+
+        if first is None:
+            result = checker.run_global(blueprint, value)
+
+            if key is not None:
+                distinct[key] = result
+        else:
+            result = checker.success(first.message) if first.passed else checker.error(first.message)
+
+        results.append(result)
+
+    return results
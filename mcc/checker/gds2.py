@@ -33,6 +33,8 @@ class GDS2(CheckSuite):
 
     DEFAULT_VERSION = 'L2P'
 
+    METADATA_ONLY = True
+
     REQUIRED_GLOBALS_STRINGS = (
         'Conventions', 'title', 'summary', 'references', 'institution', 'history', 'comment', 'license', 'id',
         'naming_authority', 'product_version', 'uuid', 'gds_version_id', 'netcdf_version_id', 'date_created',
@@ -0,0 +1,141 @@
+"""
+==========
+iso8601.py
+==========
+
+Validation of ISO-8601 dates, datetimes and durations.
+
+isodate tries each of the forms of ISO-8601 in turn, raising an exception for
+each one that a string is not in, and doesn't remember the strings it has
+parsed before. Nearly all of the dates and durations within datasets are in
+one of a few common forms though (e.g. 2021-01-01T00:09:00Z, 20210101T000900Z,
+P1D or PT12H), and the same ones recur across the granules of a collection.
+
+get_datetime_kind() and is_duration() match strings against patterns of those
+common forms first, and only parse the strings that do not match them with
+isodate. A string that matches is always one that isodate accepts (as the same
+kind of date), so the result is the same either way. Results are remembered
+for the most recently validated strings.
+"""
+
+import re
+from datetime import date
+from functools import lru_cache
+
+from isodate import parse_date, parse_datetime, parse_duration
+
+# Kinds of date (see get_datetime_kind())
+DATETIME = 'datetime'
+DATE = 'date'
+
+# Number of distinct strings to remember the results of, per kind of check
+ISO8601_CACHE_SIZE = 4096
+
+# Complete dates, in either the extended (YYYY-MM-DD) or basic (YYYYMMDD) form
+DATE_PATTERN = (
+    r'(?P<year>[0-9]{4})(?P<date_separator>-?)(?P<month>0[1-9]|1[0-2])(?P=date_separator)'
+    r'(?P<day>0[1-9]|[12][0-9]|3[01])'
+)
+
+# Times of hours and minutes, with optional seconds (and fractions of them to
+# the microsecond), in either the extended (hh:mm:ss) or basic (hhmmss) form,
+# with an optional time zone
+TIME_PATTERN = (
+    r'(?:[01][0-9]|2[0-3])(?P<time_separator>:?)[0-5][0-9]'
+    r'(?:(?P=time_separator)[0-5][0-9](?:[.,][0-9]{1,6})?)?'
+    r'(?:Z|[+-](?:[01][0-9]|2[0-3])(?::?[0-5][0-9])?)?'
+)
+
+DATE_REGEX = re.compile(DATE_PATTERN)
+DATETIME_REGEX = re.compile(DATE_PATTERN + 'T' + TIME_PATTERN)
+
+# Durations of whole years, months, weeks, days, hours, minutes and seconds
+# (and fractions of seconds), with at least one of them
+DURATION_REGEX = re.compile(
+    r'P(?=[0-9]|T[0-9])(?:[0-9]{1,6}Y)?(?:[0-9]{1,6}M)?(?:[0-9]{1,6}W)?(?:[0-9]{1,6}D)?'
+    r'(?:T(?=[0-9])(?:[0-9]{1,6}H)?(?:[0-9]{1,6}M)?(?:[0-9]{1,6}(?:[.,][0-9]{1,6})?S)?)?'
+)
+
+
+def get_datetime_kind(value):
+    """
+    Validates an ISO-8601 datetime, or failing that, date.
+
+    @param value the string to validate
+    @return DATETIME if value is a valid datetime, DATE if it is a valid date
+            (but not datetime), or None if it is neither
+    """
+    if isinstance(value, str):
+        return _get_datetime_kind(value)
+
+    return parse_datetime_kind(value)
+
+
+@lru_cache(maxsize=ISO8601_CACHE_SIZE)
+def _get_datetime_kind(value):
+    for regex, kind in ((DATETIME_REGEX, DATETIME), (DATE_REGEX, DATE)):
+        match = regex.fullmatch(value)
+
+        if match:
+            try:
+                # The patterns don't know how many days are in each month
+                date(int(match.group('year')), int(match.group('month')), int(match.group('day')))
+                return kind
+            except ValueError:
+                break
+
+    return parse_datetime_kind(value)
+
+
+def parse_datetime_kind(value):
+    """
+    Validates an ISO-8601 datetime, or failing that, date, with isodate.
+
+    @param value the string to validate
+    @return the kind of date that value is, as for get_datetime_kind()
+    """
+    try:
+        parse_datetime(value)
+        return DATETIME
+    except ValueError:
+        pass
+
+    try:
+        parse_date(value)
+        return DATE
+    except ValueError:
+        pass
+
+    return None
+
+
+def is_duration(value):
+    """
+    Validates an ISO-8601 duration.
+
+    @param value the string to validate
+    @return whether value is a valid duration
+    """
+    if isinstance(value, str):
+        return _is_duration(value)
+
+    return parse_is_duration(value)
+
+
+@lru_cache(maxsize=ISO8601_CACHE_SIZE)
+def _is_duration(value):
+    return DURATION_REGEX.fullmatch(value) is not None or parse_is_duration(value)
+
+
+def parse_is_duration(value):
+    """
+    Validates an ISO-8601 duration with isodate.
+
+    @param value the string to validate
+    @return whether value is a valid duration
+    """
+    try:
+        parse_duration(value)
+        return True
+    except (ValueError, TypeError):
+        return False
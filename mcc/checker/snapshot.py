@@ -0,0 +1,107 @@
+"""
+===========
+snapshot.py
+===========
+
+A snapshot of the metadata of a netCDF4 Dataset.
+
+Every attribute of a netCDF4 Dataset, Group or Variable that a Checker looks
+up is read from the underlying netCDF-C/HDF5 library, and the same attributes
+are looked up again by every Blueprint that refers to them. A DatasetSnapshot
+reads all of the global and variable attributes, variable types, dimensions
+and groups of a Dataset in one pass instead, after which the Dataset may be
+closed.
+
+Snapshots mirror the parts of the netCDF4 API that Checkers use, so attributes
+can be looked up with getattr() just as they would be on a Dataset.
+"""
+
+from functools import cached_property
+
+
+class AttributeSnapshot(object):
+    """
+    The netCDF attributes of a Dataset, Group or Variable, which may be
+    looked up as Python attributes, or from the attributes dict.
+    """
+    def __init__(self, source):
+        """
+        @param source a netCDF4 Dataset, Group or Variable
+        """
+        # A Dataset/Group/Variable's __dict__ reads all of its attributes at once
+        self.attributes = dict(source.__dict__)
+
+    def ncattrs(self):
+        return list(self.attributes)
+
+    def getncattr(self, name):
+        return self.attributes[name]
+
+    def __getattr__(self, name):
+        # Only called for names that are not Python attributes of the snapshot
+        try:
+            return self.__dict__['attributes'][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+class VariableSnapshot(AttributeSnapshot):
+    """A snapshot of the attributes and type of a netCDF4 Variable."""
+    def __init__(self, variable):
+        """
+        @param variable a netCDF4 Variable
+        """
+        super().__init__(variable)
+
+        self.name = variable.name
+        self.datatype = variable.datatype
+        self.dtype = variable.dtype
+        self.dimensions = variable.dimensions
+        self.shape = variable.shape
+
+    @cached_property
+    def description(self):
+        """The attributes of the variable, as one human readable string."""
+        return '; '.join(f'{key}: "{value}"' for key, value in self.attributes.items())
+
+
+class GroupSnapshot(AttributeSnapshot):
+    """A snapshot of the attributes, dimensions, variables and subgroups of a netCDF4 Dataset or Group."""
+    def __init__(self, group):
+        """
+        @param group a netCDF4 Dataset or Group
+        """
+        super().__init__(group)
+
+        self.name = group.name
+        self.path = group.path
+        self.dimensions = {name: len(dimension) for name, dimension in group.dimensions.items()}
+        self.variables = {name: VariableSnapshot(variable) for name, variable in group.variables.items()}
+        self.groups = {name: GroupSnapshot(subgroup) for name, subgroup in group.groups.items()}
+
+
+class DatasetSnapshot(GroupSnapshot):
+    """A snapshot of all the metadata of a netCDF4 Dataset."""
+    def __init__(self, dataset):
+        """
+        @param dataset an open netCDF4 Dataset
+        """
+        super().__init__(dataset)
+
+        self.data_model = dataset.data_model
+        # The instance of each Checker class for this dataset, see base.get_checker().
+        # A snapshot should only be checked by one thread at a time.
+        self.checkers = {}
+
+
+def take_snapshot(dataset):
+    """
+    Gets a snapshot of a Dataset, unless it already is one.
+
+    @param dataset an open netCDF4 Dataset, or a DatasetSnapshot
+    @return a DatasetSnapshot of dataset
+    """
+    if isinstance(dataset, DatasetSnapshot):
+        return dataset
+
+    return DatasetSnapshot(dataset)
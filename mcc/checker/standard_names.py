@@ -0,0 +1,331 @@
+"""
+=================
+standard_names.py
+=================
+
+The CF standard name tables, indexed for checking many names against them.
+
+The versions of the table that are available are those within the data
+directory (see STANDARD_NAME_TABLES), as generated by
+mcc/utils/standard_names_converter.py. Each is loaded once per process (see
+get_standard_name_table()), and shared by every CheckStandardName. Names are
+looked up in a set, and the suggestions for names that are not in the table
+are given by suggest().
+
+Suggestions are the same as difflib.get_close_matches(name, names, 1) would
+give, without comparing the name with every name in the table: the number of
+characters a name has in common with each name of the table bounds how
+similar they can be (as SequenceMatcher.quick_ratio() does), and is counted
+against all of the names at once from a matrix of their character counts.
+Only the names whose bound beats the best match so far are then compared.
+
+Besides the JSON of each table, the converter writes a compact binary file of
+just what is needed to check names against it (the sorted names, aliases,
+canonical units and character counts), which is memory-mapped rather than
+parsed, so that it loads in a few milliseconds and its pages are shared by all
+the processes that load it. The binary file has the layout:
+
+    BINARY_MAGIC
+    length of the header (little-endian uint32)
+    JSON header of the version and last_modified date of the table, its
+        alphabet, and the dtype, shape and offset of each array
+    arrays, each aligned to BINARY_ALIGNMENT bytes
+
+where lists of strings are stored as newline-separated UTF-8.
+"""
+
+import json
+import mmap
+from difflib import SequenceMatcher
+from functools import lru_cache
+from glob import glob
+from os.path import basename, dirname, exists, join, splitext
+
+import numpy as np
+
+# Directory of the standard name tables, and the pattern of their file names
+# (without an extension)
+DATA_DIR = join(dirname(__file__), 'data')
+TABLE_FN = 'CF-Standard-Names-Table-{version}'
+
+# Extensions of the JSON and binary files of a table
+JSON_EXT = '.json'
+BINARY_EXT = '.bin'
+
+# Identifies the binary format of a table, including its version
+BINARY_MAGIC = b'MCCSNT\x00\x01'
+BINARY_ALIGNMENT = 8
+
+# Cutoff of difflib.get_close_matches(), below which names are not suggested
+SUGGESTION_CUTOFF = 0.6
+
+# Number of distinct names whose suggestions are remembered, per table
+SUGGESTION_CACHE_SIZE = 4096
+
+
+class StandardNameTable(object):
+    """
+    A version of the CF standard name table.
+    """
+    def __init__(self, version, names, last_modified=None, aliases=None, canonical_units=None, index=None):
+        """
+        @param version version number of the table, e.g. '77'
+        @param names iterable of the standard names within the table
+        @param last_modified date that the table was last modified
+        @param aliases dict of the aliases of standard names to the standard
+                       names they stand for
+        @param canonical_units dict of standard names to their canonical units
+        @param index (alphabet, char_counts) tuple of a previously built index
+                     (see self.alphabet and self.char_counts), in which case
+                     names must already be sorted
+        """
+        self.version = version
+        self.last_modified = last_modified
+        self.names = list(names) if index is not None else sorted(names)
+        self.name_set = frozenset(self.names)
+        self.aliases = aliases or {}
+        self.canonical_units = canonical_units or {}
+        self.lengths = np.array([len(name) for name in self.names], dtype=np.int32)
+
+        # Matrix of the number of times each character (of the alphabet of
+        # the table) occurs in each name
+        if index is None:
+            index = build_index(self.names)
+
+        alphabet, self.char_counts = index
+        self.alphabet = {char: column for column, char in enumerate(alphabet)}
+
+        self.suggest = lru_cache(maxsize=SUGGESTION_CACHE_SIZE)(self._suggest)
+
+    @classmethod
+    def from_json(cls, filename):
+        """
+        Loads a table from the JSON generated by
+        mcc/utils/standard_names_converter.py.
+
+        @param filename path of the JSON file
+        @return a StandardNameTable
+        """
+        with open(filename) as infile:
+            data = json.load(infile)
+
+        return cls.from_dict(data)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        @param data dict of the JSON of a table
+        @return a StandardNameTable
+        """
+        aliases = {
+            alias: name
+            for name, entry in data['data'].items()
+            for alias in entry.get('aliases') or ()
+        }
+        canonical_units = {name: entry.get('canonical_units') for name, entry in data['data'].items()}
+
+        return cls(data['version'], data['data'].keys(), data.get('last_modified'), aliases, canonical_units)
+
+    @classmethod
+    def from_binary(cls, filename):
+        """
+        Loads a table from its binary file (see write()), whose arrays are
+        memory-mapped.
+
+        @param filename path of the binary file
+        @return a StandardNameTable
+        """
+        with open(filename, 'rb') as infile:
+            buffer = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if buffer[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+            raise ValueError(f'{filename} is not a binary standard name table of this version of MCC')
+
+        start = len(BINARY_MAGIC) + 4
+        length = int.from_bytes(buffer[len(BINARY_MAGIC):start], 'little')
+        header = json.loads(buffer[start:start + length])
+
+        arrays = {
+            key: np.frombuffer(
+                buffer, dtype=spec['dtype'], count=int(np.prod(spec['shape'])), offset=spec['offset']
+            ).reshape(spec['shape'])
+            for key, spec in header['arrays'].items()
+        }
+
+        names = decode_strings(arrays['names'])
+        aliases = dict(zip(decode_strings(arrays['aliases']), (names[index] for index in arrays['alias_targets'])))
+        canonical_units = dict(zip(names, (units or None for units in decode_strings(arrays['canonical_units']))))
+
+        return cls(
+            header['version'], names, header['last_modified'], aliases, canonical_units,
+            index=(header['alphabet'], arrays['char_counts'])
+        )
+
+    def write(self, filename):
+        """
+        Writes the binary file of the table (see from_binary()).
+
+        @param filename path of the file to write
+        """
+        positions = {name: index for index, name in enumerate(self.names)}
+        aliases = sorted(self.aliases)
+
+        arrays = {
+            'names': encode_strings(self.names),
+            'aliases': encode_strings(aliases),
+            'alias_targets': np.array([positions[self.aliases[alias]] for alias in aliases], dtype=np.int32),
+            'canonical_units': encode_strings(self.canonical_units.get(name) or '' for name in self.names),
+            'char_counts': np.ascontiguousarray(self.char_counts),
+        }
+
+        header = {
+            'version': self.version,
+            'last_modified': self.last_modified,
+            'alphabet': ''.join(sorted(self.alphabet, key=self.alphabet.get)),
+            'arrays': {},
+        }
+
+        # The offsets of the arrays depend on the length of the header, which
+        # depends on the offsets, so lay them out from an upper bound of it
+        length = len(json.dumps(header)) + len(arrays) * 100
+        offset = align(len(BINARY_MAGIC) + 4 + length)
+
+        for key, array in arrays.items():
+            header['arrays'][key] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset = align(offset + array.nbytes)
+
+        encoded_header = json.dumps(header).encode().ljust(length)
+
+        with open(filename, 'wb') as outfile:
+            outfile.write(BINARY_MAGIC)
+            outfile.write(len(encoded_header).to_bytes(4, 'little'))
+            outfile.write(encoded_header)
+
+            for key, array in arrays.items():
+                outfile.write(b'\0' * (header['arrays'][key]['offset'] - outfile.tell()))
+                outfile.write(array.tobytes())
+
+    def __contains__(self, name):
+        return name in self.name_set
+
+    def __len__(self):
+        return len(self.names)
+
+    def _suggest(self, name):
+        """
+        Finds the name of the table most like a name that is not within it.
+        Suggestions are remembered for each distinct name (see self.suggest()).
+
+        @param name the name to find a match for
+        @return the closest name in the table, or None when no name is close
+                enough (see SUGGESTION_CUTOFF)
+        """
+        counts = np.zeros(len(self.alphabet), dtype=np.int32)
+
+        for char in name:
+            if char in self.alphabet:
+                counts[self.alphabet[char]] += 1
+
+        # The highest ratio each name of the table could have
+        common = np.minimum(self.char_counts, counts).sum(axis=1)
+        bounds = 2.0 * common / (self.lengths + len(name))
+        candidates = np.flatnonzero(bounds >= SUGGESTION_CUTOFF)
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(name)
+        best = (SUGGESTION_CUTOFF, None)
+
+        # Highest bounds first, so that the rest can be skipped once they could
+        # not beat the best match. Ties go to the greater name, as in difflib.
+        for index in candidates[np.argsort(-bounds[candidates], kind='stable')]:
+            if bounds[index] < best[0]:
+                break
+
+            matcher.set_seq1(self.names[index])
+            match = (matcher.ratio(), self.names[index])
+
+            if match[0] >= SUGGESTION_CUTOFF and (best[1] is None or match > best):
+                best = match
+
+        return best[1]
+
+
+def build_index(names):
+    """
+    Counts the characters of each of a list of names.
+
+    @param names list of names
+    @return (alphabet, char_counts) tuple of the string of all the characters
+            within the names, and a (names x alphabet) matrix of the number of
+            times each character occurs in each name
+    """
+    alphabet = ''.join(sorted(set(''.join(names))))
+    columns = {char: column for column, char in enumerate(alphabet)}
+    char_counts = np.zeros((len(names), len(alphabet)), dtype=np.uint8)
+
+    for row, name in enumerate(names):
+        for char in name:
+            char_counts[row, columns[char]] += 1
+
+    return alphabet, char_counts
+
+
+def encode_strings(strings):
+    return np.frombuffer('\n'.join(strings).encode(), dtype=np.uint8)
+
+
+def decode_strings(array):
+    return array.tobytes().decode().split('\n') if len(array) else []
+
+
+def align(offset):
+    return -(-offset // BINARY_ALIGNMENT) * BINARY_ALIGNMENT
+
+
+def find_standard_name_tables(directory=DATA_DIR):
+    """
+    Finds the versions of the standard name table within a directory.
+
+    @param directory the directory to look within
+    @return dict of the version numbers of the tables to the paths of their
+            files (without an extension), in order of version
+    """
+    pattern = join(directory, TABLE_FN.format(version='*'))
+    prefix = TABLE_FN.format(version='')
+    paths = {splitext(path)[0] for path in glob(pattern + JSON_EXT) + glob(pattern + BINARY_EXT)}
+    versions = {basename(path)[len(prefix):]: path for path in paths}
+
+    return {version: versions[version] for version in sorted(versions, key=lambda version: int(version))}
+
+
+# Registry of the versions of the standard name table that may be checked
+# against. The default is the latest of them.
+STANDARD_NAME_TABLES = find_standard_name_tables()
+DEFAULT_STANDARD_NAME_TABLE = list(STANDARD_NAME_TABLES)[-1]
+
+
+def get_standard_name_table(version=None):
+    """
+    Gets a version of the standard name table, which is loaded once per
+    process.
+
+    @param version version number of the table (see STANDARD_NAME_TABLES),
+                   or None for DEFAULT_STANDARD_NAME_TABLE
+    @return the StandardNameTable
+    """
+    return load_standard_name_table(STANDARD_NAME_TABLES[version or DEFAULT_STANDARD_NAME_TABLE])
+
+
+@lru_cache(maxsize=None)
+def load_standard_name_table(path):
+    """
+    Loads the standard name table at a path (without an extension), from its
+    binary file if there is one, or otherwise its JSON.
+
+    @param path the path of the table
+    @return the StandardNameTable
+    """
+    if exists(path + BINARY_EXT):
+        return StandardNameTable.from_binary(path + BINARY_EXT)
+
+    return StandardNameTable.from_json(path + JSON_EXT)
@@ -0,0 +1,76 @@
+"""
+========
+units.py
+========
+
+A process-wide cache of parsed UDUNITS unit strings.
+
+Datasets repeat the same handful of units ("K", "degrees_north", "seconds
+since 1981-01-01", ...) across their variables, and so do the successive
+granules of a collection, yet each cf_units.Unit() parses its string with the
+UDUNITS library again. parse_unit() keeps the most recently used units (and
+the unit strings that failed to parse) instead. Units are immutable, so the
+same instance can be shared by every checker, including the compliance-checker
+modules that the CF suite runs (see cf_shim.py).
+
+The hits and misses of the cache are given by get_unit_cache_info().
+"""
+
+import logging
+from functools import lru_cache
+
+from cf_units import Unit
+
+logger = logging.getLogger(__name__)
+
+# Number of distinct (unit, calendar) pairs to keep the parsed Units of
+UNIT_CACHE_SIZE = 4096
+
+
+def parse_unit(unit, calendar=None):
+    """
+    Parses a unit string, as cf_units.Unit() would, or looks it up should it
+    already have been parsed.
+
+    @param unit the unit string
+    @param calendar the calendar of the unit, if a time reference
+    @return the Unit
+    @raise ValueError or TypeError if the unit is not recognized by UDUNITS
+    """
+    try:
+        unit, error = _parse_unit(unit, calendar)
+    except TypeError:
+        # Unhashable, so can't be looked up
+        return Unit(unit, calendar=calendar)
+
+    if error is not None:
+        # A new exception each time, rather than raising (and so adding to the
+        # traceback of) the same one from every thread
+        error_type, args = error
+        raise error_type(*args)
+
+    return unit
+
+
+@lru_cache(maxsize=UNIT_CACHE_SIZE)
+def _parse_unit(unit, calendar):
+    """
+    @return a (Unit, None) tuple of the parsed unit, or (None, (exception
+            type, exception args)) if it is not recognized by UDUNITS
+    """
+    try:
+        return Unit(unit, calendar=calendar), None
+    except (ValueError, TypeError) as err:
+        # Only logged the first time that a unit fails to parse
+        logger.warning("UNKNOWN unit: %s not recognized by UDUNITS, reason: %s", unit, str(err))
+        return None, (type(err), err.args)
+
+
+def get_unit_cache_info():
+    """
+    @return the statistics of the cache of parsed units, as a dict of its
+            'hits', 'misses', 'size' and 'max_size'
+    """
+    info = _parse_unit.cache_info()
+
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}
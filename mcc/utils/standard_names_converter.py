@@ -5,69 +5,86 @@
 standard_names_converter.py
 ===========================
 
-Generate standard name JSON based on an xml file.
+Generate standard name JSON based on an xml file, along with the compact
+binary table that the checker loads (see mcc/checker/standard_names.py).
+
+The xml file is parsed as a stream, one entry at a time. The JSON of a table
+may be given instead, to generate just its binary table.
 
 """
 
+import json
+import sys
 from collections import defaultdict
-from json import dump
-from sys import argv
-
-from bs4 import BeautifulSoup
-
-TABLE_FN = 'cf-standard-name-table-26.xml'
+from os.path import abspath, dirname, splitext
+from xml.etree.ElementTree import iterparse
 
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
 
-def parse_aliases(alias_generator):
-    aliases = defaultdict(list)
-
-    for alias in alias_generator:
-        alias_name = alias.get('id')
-        real_name = alias.entry_id.text
-        aliases[real_name].append(alias_name)
+from checker.standard_names import BINARY_EXT, JSON_EXT, TABLE_FN, StandardNameTable  # noqa: E402
 
-    return aliases
+TABLE_FN_XML = 'cf-standard-name-table-26.xml'
 
 
-def parse_entries(soup):
-    aliases = parse_aliases(soup.findAll('alias'))
+def parse_table(fn):
+    """
+    Streams the entries and aliases out of a standard name table.
 
-    for entry in soup.findAll('entry'):
-        name = entry.get('id')
+    @param fn path of the xml file
+    @return (version, last_modified, entries, aliases) tuple, where entries is
+            a dict of the elements of each standard name, and aliases a dict
+            of each standard name to the list of its aliases
+    """
+    version = last_modified = None
+    entries = {}
+    aliases = defaultdict(list)
 
-        # `or` statements lets us set '' -> None
-        yield name, {
-            'aliases': aliases.get(name, None),
-            'description': entry.description.text or None,
-            'canonical_units': entry.canonical_units.text or None,
-            'amip': entry.amip.text or None,
-            'grib': entry.grib.text or None,
-        }
+    for _, element in iterparse(fn):
+        if element.tag == 'version_number':
+            version = element.text
+        elif element.tag == 'last_modified':
+            last_modified = element.text
+        elif element.tag == 'entry':
+            # `or` statements lets us set '' -> None
+            entries[element.get('id')] = {
+                key: element.findtext(key) or None
+                for key in ('description', 'canonical_units', 'amip', 'grib')
+            }
+            element.clear()
+        elif element.tag == 'alias':
+            aliases[element.findtext('entry_id')].append(element.get('id'))
+            element.clear()
+
+    return version, last_modified, entries, aliases
 
 
 def main(fn):
-    # BE VERY VAREFUL WITH THE PARSER
-    # 'xml' will truncate files and mess everything up
-    soup = BeautifulSoup(open(fn).read(), 'lxml')
-    data = {standard_name: data for standard_name, data in parse_entries(soup)}
+    if splitext(fn)[1] == JSON_EXT:
+        with open(fn) as f:
+            j = json.load(f)
+    else:
+        version, last_modified, entries, aliases = parse_table(fn)
+        data = {
+            standard_name: dict(entry, aliases=aliases.get(standard_name, None))
+            for standard_name, entry in entries.items()
+        }
 
-    j = {
-        'title': 'CF Standard Names Table',
-        'version': soup.find('version_number').text,
-        'last_modified': soup.find('last_modified').text,
-        'data': data,
-        'count': len(data),
-    }
+        j = {
+            'title': 'CF Standard Names Table',
+            'version': version,
+            'last_modified': last_modified,
+            'data': data,
+            'count': len(data),
+        }
 
-    fn = j['title'].split(' ')
-    fn.append(j['version'])
+        with open(TABLE_FN.format(version=j['version']) + JSON_EXT, 'w') as f:
+            json.dump(j, f, indent=4, sort_keys=True)
 
-    with open('-'.join(fn) + '.json', 'w') as f:
-        dump(j, f, indent=4, sort_keys=True)
+    StandardNameTable.from_dict(j).write(TABLE_FN.format(version=j['version']) + BINARY_EXT)
 
 
 if __name__ == '__main__':
-    if len(argv) > 1:
-        main(argv[1])
+    if len(sys.argv) > 1:
+        main(sys.argv[1])
     else:
-        main(TABLE_FN)
+        main(TABLE_FN_XML)
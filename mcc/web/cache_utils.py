@@ -0,0 +1,171 @@
+"""
+==============
+cache_utils.py
+==============
+
+A content-addressed cache of checker reports.
+
+Reports are keyed by the MD5 hash of the uploaded file, along with the short
+name and version (or parameter, see CheckSuite.cache_version) of the checker
+suite and the MCC version that produced them, so the same file never has to be
+opened and checked twice. Entries are pickled into a SQLite database, which
+all of the processes serving MCC share, and the least recently used entries are
+evicted once the database grows beyond its configured size.
+"""
+
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStore(object):
+    """
+    Base class for state that is kept within a SQLite database, so that it is
+    shared between all of the processes serving MCC.
+
+    Implementations provide the SCHEMA statements to set up their tables.
+    """
+    SCHEMA = ()
+
+    # Seconds to wait on another process that holds a lock on the database
+    TIMEOUT = 10
+
+    def __init__(self, path):
+        """
+        @param path location of the SQLite database file (created if need be)
+        """
+        self.path = path
+        # SQLite connections cannot be shared between threads
+        self.local = threading.local()
+
+    def _connect(self):
+        """Gets the database connection for the current thread, creating the database if need be."""
+        connection = getattr(self.local, 'connection', None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.TIMEOUT, isolation_level=None)
+            # Write-ahead logging allows readers to carry on while another process writes
+            connection.execute('PRAGMA journal_mode=WAL')
+
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+
+            self.local.connection = connection
+
+        return connection
+
+
+class ReportCache(SQLiteStore):
+    """
+    Cache of CheckSuite results for previously checked files, backed by a
+    SQLite database.
+
+    Each cache entry is a dict containing the 'results' of running a single
+    CheckSuite, along with the details of the file it was run against
+    ('filename', 'size' and 'model') that are needed to present a report.
+
+    Failures to read from or write to the database are logged and otherwise
+    ignored, since the cache is purely an optimization.
+    """
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS reports ('
+        '    file_hash TEXT NOT NULL,'
+        '    suite TEXT NOT NULL,'
+        '    version TEXT NOT NULL,'
+        '    mcc_version TEXT NOT NULL,'
+        '    entry BLOB NOT NULL,'
+        '    size INTEGER NOT NULL,'
+        '    accessed REAL NOT NULL,'
+        '    PRIMARY KEY (file_hash, suite, version, mcc_version)'
+        ')',
+        'CREATE INDEX IF NOT EXISTS reports_accessed ON reports (accessed)',
+    )
+
+    def __init__(self, path, max_size, mcc_version):
+        """
+        @param path location of the SQLite database file (created if need be)
+        @param max_size maximum total size (in bytes) of the cached entries
+        @param mcc_version version of MCC that produced the cached reports
+        """
+        super().__init__(path)
+
+        self.max_size = max_size
+        self.mcc_version = mcc_version
+
+    def _key(self, file_hash, checker):
+        return file_hash.lower(), checker.short_name, checker.cache_version, self.mcc_version
+
+    def get(self, file_hash, checker):
+        """
+        Looks up the cached report for a file and CheckSuite.
+
+        @param file_hash MD5 hex digest of the (compressed) file upload
+        @param checker an initialized CheckSuite (i.e. after its setup() method)
+        @return the cached entry dict, or None if there isn't one
+        """
+        key = self._key(file_hash, checker)
+
+        try:
+            connection = self._connect()
+            row = connection.execute(
+                'SELECT entry FROM reports '
+                'WHERE file_hash = ? AND suite = ? AND version = ? AND mcc_version = ?', key
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            connection.execute(
+                'UPDATE reports SET accessed = ? '
+                'WHERE file_hash = ? AND suite = ? AND version = ? AND mcc_version = ?', (time.time(),) + key
+            )
+
+            return pickle.loads(row[0])
+        except (sqlite3.Error, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as err:
+            logger.warning("Failed to read report for %s from cache, reason: %s", key, str(err))
+            return None
+
+    def put(self, file_hash, checker, entry):
+        """
+        Stores the report for a file and CheckSuite, evicting the least recently
+        used entries should the cache become too large.
+
+        @param file_hash MD5 hex digest of the (compressed) file upload
+        @param checker an initialized CheckSuite (i.e. after its setup() method)
+        @param entry dict of the 'results' of the CheckSuite and file details
+        """
+        key = self._key(file_hash, checker)
+
+        try:
+            data = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, AttributeError, TypeError) as err:
+            logger.warning("Failed to cache report for %s, reason: %s", key, str(err))
+            return
+
+        if len(data) > self.max_size:
+            return
+
+        try:
+            connection = self._connect()
+            connection.execute(
+                'INSERT OR REPLACE INTO reports '
+                '(file_hash, suite, version, mcc_version, entry, size, accessed) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', key + (data, len(data), time.time())
+            )
+            self.evict()
+        except sqlite3.Error as err:
+            logger.warning("Failed to cache report for %s, reason: %s", key, str(err))
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is no larger than max_size."""
+        self._connect().execute(
+            'DELETE FROM reports WHERE rowid IN ('
+            '    SELECT rowid FROM ('
+            '        SELECT rowid, SUM(size) OVER (ORDER BY accessed DESC, rowid DESC) AS total FROM reports'
+            '    ) WHERE total > ?'
+            ')', (self.max_size,)
+        )
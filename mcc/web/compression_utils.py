@@ -0,0 +1,1108 @@
+"""
+====================
+compression_utils.py
+====================
+
+Streaming decompressors for compressed file uploads.
+
+Each decompressor is fed compressed data incrementally, as it is received,
+and produces the decompressed data in bounded pieces. The total decompressed
+size is tallied as it goes, so a 'zip bomb' is rejected as soon as it exceeds
+the size limit, without ever holding more than a single piece in memory.
+
+The running expansion ratio (decompressed bytes per compressed byte) is
+tracked too, so bombs are usually caught long before they reach the size
+limit: once enough has been decompressed to go by, decompression is aborted
+should the ratio exceed a configured limit, or should the projected size of
+the whole stream exceed the size limit.
+"""
+
+import bz2
+import lzma
+import multiprocessing
+import struct
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import zstandard
+
+# Largest piece of decompressed data to produce at a time
+OUTPUT_CHUNK_SIZE = 1024 * 1024
+
+
+class DecompressionError(ValueError):
+    """Raised when compressed data is invalid or otherwise cannot be decompressed."""
+
+
+class DecompressedSizeError(DecompressionError):
+    """Raised when the decompressed data exceeds (or is projected to exceed) the maximum allowed size."""
+
+
+class CompressionRatioError(DecompressedSizeError):
+    """Raised when the data expands by more than the maximum allowed compression ratio."""
+
+
+class StreamDecompressor(object):
+    """
+    Base class for incremental decompression of a (possibly multi-member)
+    compressed stream.
+
+    Implementations need to provide new_decompressor(), which returns a
+    decompressor object in the style of the zlib/bz2 modules.
+    """
+    # Short name of the compression format, used in error messages
+    FORMAT = None
+
+    # Number of decompressed bytes to produce before the compression ratio
+    # is representative enough of the whole stream to act upon
+    RATIO_CHECK_SIZE = 64 * 1024 * 1024
+
+    # Fraction of the expected compressed size to have decompressed before
+    # projecting the decompressed size of the whole stream from it
+    PROJECTION_FRACTION = 1 / 8
+
+    def __init__(self, max_size, max_ratio=None, expected_input_size=None):
+        """
+        @param max_size maximum number of decompressed bytes to allow (None for no limit)
+        @param max_ratio maximum number of decompressed bytes to allow per
+                         compressed byte (None for no limit)
+        @param expected_input_size size of the whole compressed stream, if
+                                   known, to project the decompressed size from
+        """
+        self.max_size = max_size
+        self.max_ratio = max_ratio
+        self.expected_input_size = expected_input_size
+        self.decompressed_size = 0
+        # Number of compressed bytes processed so far
+        self.compressed_size = 0
+        self.decompressor = self.new_decompressor()
+        # Number of complete members/streams decompressed so far
+        self.members_complete = 0
+        # Whether trailing data after the final member is being ignored
+        self.ignoring_trailer = False
+
+    def new_decompressor(self):
+        raise NotImplementedError('must implement a new_decompressor() method')
+
+    def decompress(self, data):
+        """
+        Decompresses the next piece of the compressed stream.
+
+        @param data bytes of compressed data
+        @return a generator of decompressed byte strings, each no larger than
+                OUTPUT_CHUNK_SIZE
+        @raises DecompressedSizeError if the decompressed data exceeds max_size
+        @raises DecompressionError if the compressed data is invalid
+        """
+        output_pending = False
+        self.compressed_size += len(data)
+
+        while (data or output_pending) and not self.ignoring_trailer:
+            if self.decompressor is None:
+                # Members may be padded with null bytes between them
+                data = data.lstrip(b'\0')
+
+                if not data:
+                    break
+
+                self.decompressor = self.new_decompressor()
+
+            try:
+                buf = self.decompressor.decompress(data, OUTPUT_CHUNK_SIZE)
+            except (OSError, EOFError, ValueError, zlib.error, lzma.LZMAError) as err:
+                if self.members_complete > 0:
+                    # Trailing garbage after a complete stream, ignore it
+                    # (this matches the behavior of the gzip and bz2 modules)
+                    self.ignoring_trailer = True
+                    self.decompressor = None
+                    break
+
+                raise DecompressionError(f'Invalid {self.FORMAT} data, reason: {str(err)}')
+
+            if self.decompressor.eof:
+                data = self.decompressor.unused_data
+                output_pending = False
+
+                self.decompressor = None
+                self.members_complete += 1
+            else:
+                # Output was truncated at OUTPUT_CHUNK_SIZE, so there may be
+                # more to come even if all the input has been consumed.
+                data = getattr(self.decompressor, 'unconsumed_tail', b'')
+                output_pending = len(buf) == OUTPUT_CHUNK_SIZE
+
+            if buf:
+                yield self._tally(buf)
+
+    def _tally(self, buf):
+        """Adds a piece of decompressed data to the running total, enforcing max_size and max_ratio."""
+        self.decompressed_size += len(buf)
+
+        if self.max_size is not None and self.decompressed_size > self.max_size:
+            raise self._size_error()
+
+        if self.decompressed_size >= self.RATIO_CHECK_SIZE and self.compressed_size > 0:
+            ratio = self.decompressed_size / self.compressed_size
+
+            if self.max_ratio is not None and ratio > self.max_ratio:
+                raise CompressionRatioError(
+                    f'Decompressed data expands by more than the maximum compression ratio of {self.max_ratio}:1 '
+                    f'({self._progress()})'
+                )
+
+            if self.max_size is not None and self.expected_input_size and \
+                    self.compressed_size >= self.PROJECTION_FRACTION * self.expected_input_size and \
+                    ratio * self.expected_input_size > self.max_size:
+                raise DecompressedSizeError(
+                    f'Decompressed data is projected to exceed the maximum size of {self.max_size} bytes, '
+                    f'at a compression ratio of {ratio:.0f}:1 ({self._progress()})'
+                )
+
+        return buf
+
+    def _progress(self):
+        return (
+            f'stopped after processing {self.compressed_size} of '
+            f'{self.expected_input_size or "an unknown number of"} compressed bytes, '
+            f'which decompressed to {self.decompressed_size} bytes'
+        )
+
+    def _size_error(self):
+        return DecompressedSizeError(
+            f'Decompressed data exceeds the maximum size of {self.max_size} bytes ({self._progress()})'
+        )
+
+    def flush(self):
+        """
+        Signal the end of the compressed stream.
+
+        @return a generator of any remaining decompressed byte strings
+        @raises DecompressionError if the stream ended prematurely
+        """
+        if self.decompressor is not None:
+            raise DecompressionError(
+                f'Compressed {self.FORMAT} data ended before the end-of-stream marker was reached'
+            )
+
+        # This is a generator, although serial decompression never has any
+        # output left over by the time it is flushed.
+        yield from ()
+
+
+class GzipDecompressor(StreamDecompressor):
+    """Incremental decompressor for (multi-member) gzip data."""
+    FORMAT = 'gzip'
+    EXTENSIONS = ('.gz',)
+
+    def new_decompressor(self):
+        # wbits of 16 + MAX_WBITS selects the gzip header and trailer format
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+class Bz2Decompressor(StreamDecompressor):
+    """Incremental decompressor for (multi-stream) bzip2 data."""
+    FORMAT = 'bzip2'
+    EXTENSIONS = ('.bz2',)
+
+    def new_decompressor(self):
+        return bz2.BZ2Decompressor()
+
+
+class XzDecompressor(StreamDecompressor):
+    """Incremental decompressor for (multi-stream) xz data."""
+    FORMAT = 'xz'
+    EXTENSIONS = ('.xz',)
+
+    def new_decompressor(self):
+        return lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+
+
+class ZstdFrameDecompressor(object):
+    """
+    Decompressor for a single zstd frame, with the interface (including the
+    max_length argument) of bz2.BZ2Decompressor.
+
+    zstandard's own decompressobj() returns all of the output for whatever
+    input it is given, so the input is instead fed to it in slices small
+    enough to bound the output of any one slice, however extreme its
+    compression ratio.
+    """
+    # Largest number of compressed bytes to decompress at a time. A zstd block
+    # of 128 KiB can be encoded in as little as 4 bytes, so no slice produces
+    # more than 128 MiB.
+    INPUT_SLICE_SIZE = 4096
+
+    def __init__(self):
+        self.decompressor = zstandard.ZstdDecompressor().decompressobj()
+        self.input = b''
+        self.input_position = 0
+        self.output = bytearray()
+
+    @property
+    def eof(self):
+        return self.decompressor.eof and not self.output
+
+    @property
+    def unused_data(self):
+        return self.decompressor.unused_data + self.input[self.input_position:]
+
+    def decompress(self, data, max_length=-1):
+        if data:
+            self.input = self.input[self.input_position:] + data
+            self.input_position = 0
+
+        while (max_length < 0 or len(self.output) < max_length) and not self.decompressor.eof and \
+                self.input_position < len(self.input):
+            end = self.input_position + self.INPUT_SLICE_SIZE
+
+            try:
+                self.output += self.decompressor.decompress(self.input[self.input_position:end])
+            except zstandard.ZstdError as err:
+                raise ValueError(str(err))
+
+            self.input_position = end
+
+        if max_length < 0:
+            max_length = len(self.output)
+
+        buf = bytes(self.output[:max_length])
+        del self.output[:max_length]
+
+        return buf
+
+
+class ZstdDecompressor(StreamDecompressor):
+    """Incremental decompressor for (multi-frame) zstd data."""
+    FORMAT = 'zstd'
+    EXTENSIONS = ('.zst', '.zstd')
+
+    def new_decompressor(self):
+        return ZstdFrameDecompressor()
+
+
+class ZipMemberDecompressor(object):
+    """
+    Decompressor for the first member of a zip archive, with the interface
+    (including the max_length argument) of bz2.BZ2Decompressor.
+
+    Only the local file header of the member is read, so the archive can be
+    decompressed as it streams in. Once the member is complete, anything that
+    follows it (its data descriptor and the central directory) is consumed
+    without output, and checked by verify() once the archive has ended.
+    """
+    LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+    LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+    DATA_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+
+    # Number of bytes following the member to keep for verify(), enough for
+    # the largest (Zip64) data descriptor and the next signature
+    TRAILER_SIZE = 28
+
+    ENCRYPTED = 0x1
+    HAS_DATA_DESCRIPTOR = 0x8
+
+    STORED = 0
+    DEFLATED = 8
+
+    def __init__(self):
+        self.header = b''
+        self.decompressor = None
+        # Remaining size of stored (uncompressed) member data
+        self.stored_size = None
+        # CRC-32 of the member from its header, None if in a data descriptor
+        self.expected_crc = None
+        self.crc = 0
+        self.trailer = b''
+        self.member_complete = False
+        # Everything following the member is consumed here, so this is never
+        # at the end of the stream as far as the StreamDecompressor can tell
+        self.eof = False
+        self.unused_data = b''
+        self.unconsumed_tail = b''
+
+    def decompress(self, data, max_length=-1):
+        if self.member_complete:
+            self.unconsumed_tail = b''
+            self._add_trailer(data)
+            return b''
+
+        if self.decompressor is None and self.stored_size is None:
+            self.header += data
+            data = self._read_header()
+
+            if data is None:
+                return b''
+
+        if self.stored_size is not None:
+            buf = data[:self.stored_size if max_length < 0 else min(self.stored_size, max_length)]
+            self.stored_size -= len(buf)
+            # Hold back what could not be output yet, which the
+            # StreamDecompressor passes back in again
+            self.unconsumed_tail = data[len(buf):] if self.stored_size > 0 else b''
+
+            if self.stored_size == 0:
+                self.member_complete = True
+                self._add_trailer(data[len(buf):])
+        else:
+            buf = self.decompressor.decompress(data, max(max_length, 0))
+            self.unconsumed_tail = self.decompressor.unconsumed_tail
+
+            if self.decompressor.eof:
+                self.member_complete = True
+                self._add_trailer(self.decompressor.unused_data)
+
+        self.crc = zlib.crc32(buf, self.crc)
+
+        return buf
+
+    def _read_header(self):
+        """Reads the local file header, returning the data following it, or None if more is needed."""
+        if len(self.header) < self.LOCAL_HEADER.size:
+            return None
+
+        (signature, _, flags, method, _, _, crc, compressed_size, _, name_length, extra_length) = \
+            self.LOCAL_HEADER.unpack_from(self.header)
+
+        if signature != self.LOCAL_HEADER_SIGNATURE:
+            raise ValueError('not a zip archive')
+
+        header_size = self.LOCAL_HEADER.size + name_length + extra_length
+
+        if len(self.header) < header_size:
+            return None
+
+        if flags & self.ENCRYPTED:
+            raise ValueError('encrypted zip archives are not supported')
+
+        if method == self.DEFLATED:
+            self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        elif method == self.STORED and not flags & self.HAS_DATA_DESCRIPTOR:
+            if compressed_size == 0xFFFFFFFF:
+                compressed_size = self._zip64_size(self.header[header_size - extra_length:header_size])
+
+            self.stored_size = compressed_size
+        else:
+            raise ValueError(f'zip compression method {method} is not supported')
+
+        if not flags & self.HAS_DATA_DESCRIPTOR:
+            self.expected_crc = crc
+
+        data, self.header = self.header[header_size:], None
+
+        return data
+
+    @staticmethod
+    def _zip64_size(extra):
+        """Gets the compressed size from the Zip64 extended information of a local file header."""
+        position = 0
+
+        while position + 4 <= len(extra):
+            header_id, size = struct.unpack_from('<HH', extra, position)
+
+            if header_id == 0x0001 and size >= 16:
+                return struct.unpack_from('<Q', extra, position + 12)[0]
+
+            position += 4 + size
+
+        raise ValueError('missing Zip64 extended information')
+
+    def _add_trailer(self, data):
+        if len(self.trailer) < self.TRAILER_SIZE:
+            self.trailer += data[:self.TRAILER_SIZE - len(self.trailer)]
+
+    def verify(self):
+        """
+        Checks the CRC-32 of the completed member, and that it is the only
+        member of the archive.
+
+        @raises ValueError if the member is corrupt or is followed by another
+        """
+        expected_crc = self.expected_crc
+        trailer = self.trailer
+
+        if expected_crc is None:
+            if trailer.startswith(self.DATA_DESCRIPTOR_SIGNATURE):
+                trailer = trailer[len(self.DATA_DESCRIPTOR_SIGNATURE):]
+
+            if len(trailer) < 4:
+                raise ValueError('missing data descriptor')
+
+            expected_crc = struct.unpack_from('<I', trailer)[0]
+
+        if self.crc != expected_crc:
+            raise ValueError('CRC-32 check failed')
+
+        if self.LOCAL_HEADER_SIGNATURE in self.trailer:
+            raise ValueError('zip archives with more than one member are not supported')
+
+
+class ZipDecompressor(StreamDecompressor):
+    """Incremental decompressor for zip archives of a single member."""
+    FORMAT = 'zip'
+    EXTENSIONS = ('.zip',)
+
+    def new_decompressor(self):
+        return ZipMemberDecompressor()
+
+    def flush(self):
+        # The member is followed by the rest of the archive rather than an
+        # end-of-stream marker, so it is only known to be complete here
+        if self.decompressor is not None and self.decompressor.member_complete:
+            try:
+                self.decompressor.verify()
+            except ValueError as err:
+                raise DecompressionError(f'Invalid {self.FORMAT} data, reason: {str(err)}')
+
+            self.decompressor = None
+            self.members_complete += 1
+
+        yield from super().flush()
+
+
+def _read_bits(data, bit_offset, n_bits):
+    """
+    Reads an unsigned big-endian integer that is n_bits long and starts
+    bit_offset bits into data.
+
+    @return the integer, or None if data is not long enough
+    """
+    first_byte = bit_offset // 8
+    end_byte = (bit_offset + n_bits + 7) // 8
+
+    if end_byte > len(data):
+        return None
+
+    value = int.from_bytes(data[first_byte:end_byte], 'big')
+    value >>= end_byte * 8 - bit_offset - n_bits
+
+    return value & ((1 << n_bits) - 1)
+
+
+def _find_bit_pattern(data, pattern, n_bits, start_bit=0):
+    """
+    Finds every (possibly unaligned) occurrence of an n_bits long pattern
+    within data.
+
+    For each of the 8 possible bit alignments, the bytes that the pattern
+    completely covers are searched for as a byte string, and the partially
+    covered bytes on either side are then verified.
+
+    @return a sorted list of the bit offsets of the pattern within data
+    """
+    positions = []
+
+    for shift in range(8):
+        n_bytes = (shift + n_bits + 7) // 8
+        window = (pattern << (n_bytes * 8 - shift - n_bits)).to_bytes(n_bytes, 'big')
+        # Only the bytes of the window that are entirely made up of pattern bits
+        first_full = 0 if shift == 0 else 1
+        last_full = n_bytes if (shift + n_bits) % 8 == 0 else n_bytes - 1
+        needle = window[first_full:last_full]
+
+        index = data.find(needle, start_bit // 8 + first_full)
+
+        while index != -1:
+            bit_offset = (index - first_full) * 8 + shift
+
+            if bit_offset >= start_bit and _read_bits(data, bit_offset, n_bits) == pattern:
+                positions.append(bit_offset)
+
+            index = data.find(needle, index + 1)
+
+    return sorted(positions)
+
+
+def _decompress_piece(format_name, data, max_length, allow_trailer):
+    """
+    Decompresses a single, complete compressed stream (one bzip2 block or gzip
+    member). Runs within a worker process of a ParallelDecompressor.
+
+    @param format_name FORMAT of the data, either 'bzip2' or 'gzip'
+    @param data the complete compressed stream
+    @param max_length maximum number of decompressed bytes to produce
+    @param allow_trailer whether to ignore any data following the end of the stream
+    @return the decompressed data, or None if it would exceed max_length
+    @raises DecompressionError if data is not exactly one valid stream
+    """
+    if format_name == Bz2Decompressor.FORMAT:
+        decompressor = bz2.BZ2Decompressor()
+    else:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    try:
+        output = decompressor.decompress(data, max_length + 1)
+    except (OSError, EOFError, ValueError, zlib.error) as err:
+        raise DecompressionError(f'Invalid {format_name} data, reason: {str(err)}')
+
+    if len(output) > max_length:
+        return None
+
+    if not decompressor.eof:
+        raise DecompressionError(f'Compressed {format_name} data ended before the end-of-stream marker was reached')
+
+    # Streams may be padded with null bytes
+    if decompressor.unused_data.strip(b'\0') and not allow_trailer:
+        raise DecompressionError(f'Unexpected data following the end of a {format_name} stream')
+
+    return output
+
+
+class Piece(object):
+    """A part of a compressed stream that can be decompressed independently of the others."""
+    def __init__(self, start, end, data, state, final=False):
+        """
+        @param start position of the piece within the compressed stream
+        @param end position of the end of the piece within the compressed stream
+        @param data standalone compressed stream for the piece
+        @param state parsing state as of the start of the piece
+        @param final whether this is the final piece of the compressed stream
+        """
+        self.start = start
+        self.end = end
+        self.data = data
+        self.state = state
+        self.final = final
+        self.max_length = None
+        self.future = None
+
+
+class ParallelDecompressor(StreamDecompressor):
+    """
+    Base class for decompressing a stream by splitting it into pieces that are
+    decompressed concurrently within a process pool.
+
+    Compressed data is buffered until another BATCH_SIZE bytes are available,
+    then split at the boundaries found by _split(). The resulting pieces are
+    decompressed by the executor, and their output is produced in the original
+    order. No piece may produce more than PIECE_MAX_SIZE bytes or more than
+    what remains of max_size, so a 'zip bomb' is caught by the first piece
+    that takes it over the limit, and memory use is bounded by the number of
+    pieces in flight.
+
+    Boundaries are found by searching for byte patterns, which could also
+    (rarely) occur within the compressed data. Should a piece fail to
+    decompress, the boundary at its end is assumed to be a false one, and the
+    stream is split again from the start of that piece without it.
+    """
+    # Number of newly received compressed bytes that triggers splitting
+    BATCH_SIZE = 8 * 1024 * 1024
+
+    # Maximum number of decompressed bytes that a single piece may produce
+    PIECE_MAX_SIZE = 256 * 1024 * 1024
+
+    def __init__(self, max_size, executor, max_pending, max_ratio=None, expected_input_size=None):
+        """
+        @param max_size maximum number of decompressed bytes to allow (None for no limit)
+        @param executor concurrent.futures.Executor to decompress pieces within
+        @param max_pending number of pieces to have in flight before waiting on them
+        @param max_ratio maximum number of decompressed bytes to allow per
+                         compressed byte (None for no limit)
+        @param expected_input_size size of the whole compressed stream, if known
+        """
+        super().__init__(max_size, max_ratio=max_ratio, expected_input_size=expected_input_size)
+
+        self.executor = executor
+        self.max_pending = max_pending
+        # Compressed data that has not yet been successfully decompressed,
+        # and the offset of its first byte within the compressed stream
+        self.buffer = bytearray()
+        self.buffer_offset = 0
+        # Size of the compressed stream received as of the last split
+        self.split_size = 0
+        # Parsing state as of the position that the next piece will start at
+        self.state = self.initial_state()
+        # Boundaries that turned out not to be boundaries at all
+        self.false_boundaries = set()
+        self.pending = deque()
+        self.input_complete = False
+        # Set once the data turns out not to be splittable, decompression
+        # then carries on with a serial decompressor instead
+        self.unsplittable = False
+        self.serial = None
+        # Position within the compressed stream that serial decompression started from
+        self.serial_position = None
+
+    def new_decompressor(self):
+        # Decompression takes place within _decompress_piece() instead
+        return None
+
+    def initial_state(self):
+        """Returns the parsing state for the start of the compressed stream, including its 'position'."""
+        return {'position': 0}
+
+    def serial_class(self):
+        """Returns the StreamDecompressor class to fall back to should the data not split, if any."""
+        return None
+
+    def _split(self, data, state, final):
+        """
+        Splits buffered data into as many complete pieces as possible.
+
+        @param data the buffered compressed data, starting at buffer_offset
+        @param state parsing state as of the position to start splitting from,
+                     which is updated in place as pieces are found
+        @param final whether data contains the remainder of the compressed stream
+        @return a list of Piece objects, or None if the data cannot be split
+        """
+        raise NotImplementedError('must implement a _split() method')
+
+    def _position_bytes(self, position):
+        """Converts a position within the compressed stream to an index into the buffer."""
+        return position - self.buffer_offset
+
+    def _compressed_bytes(self, position):
+        """Converts a position within the compressed stream to the number of compressed bytes before it."""
+        return position
+
+    def decompress(self, data):
+        if self.serial is not None:
+            yield from self._serial_decompress(data)
+            return
+
+        self.buffer += data
+
+        if self.buffer_offset + len(self.buffer) - self.split_size >= self.BATCH_SIZE:
+            self._dispatch()
+
+        yield from self._collect(wait=self.unsplittable or len(self.pending) > self.max_pending)
+
+    def flush(self):
+        self.input_complete = True
+
+        # Pieces that fail to decompress, or the stream CRC checks, may leave
+        # parts of the stream to be split again once those in flight are done
+        while self.serial is None:
+            self._dispatch()
+
+            if not self.pending and not self.unsplittable:
+                break
+
+            yield from self._collect(wait=True)
+
+        if self.serial is not None:
+            yield from self._serial_decompress(b'', flush=True)
+
+    def _dispatch(self):
+        """Splits the buffered data into pieces, and submits them to the executor."""
+        self.split_size = self.buffer_offset + len(self.buffer)
+        pieces = self._split(self.buffer, self.state, self.input_complete)
+
+        if pieces is None:
+            self.unsplittable = True
+            return
+
+        for piece in pieces:
+            piece.max_length = self.PIECE_MAX_SIZE
+
+            if self.max_size is not None:
+                piece.max_length = max(min(piece.max_length, self.max_size - self.decompressed_size), 0)
+
+            piece.future = self.executor.submit(
+                _decompress_piece, self.FORMAT, piece.data, piece.max_length, piece.final
+            )
+            # No need to hold onto the data once it has been sent off
+            piece.data = None
+            self.pending.append(piece)
+
+    def _collect(self, wait):
+        """
+        Produces the output of completed pieces, in order.
+
+        @param wait whether to wait on every piece in flight to complete
+        """
+        while self.pending and (wait or self.pending[0].future.done()):
+            piece = self.pending[0]
+
+            try:
+                output = piece.future.result()
+            except DecompressionError:
+                if piece.final:
+                    raise
+
+                self._resplit(piece)
+                continue
+
+            self.pending.popleft()
+            # The output of the piece came from everything up to its end
+            self.compressed_size = self._compressed_bytes(piece.end)
+
+            if output is None:
+                if piece.max_length < self.PIECE_MAX_SIZE:
+                    raise self._size_error()
+
+                # The piece is too large to decompress all at once
+                yield from self._switch_to_serial(piece.start)
+                return
+
+            for start in range(0, len(output), OUTPUT_CHUNK_SIZE):
+                yield self._tally(output[start:start + OUTPUT_CHUNK_SIZE])
+
+            # The compressed data for the piece is no longer needed
+            self._discard_before(self.pending[0].start if self.pending else self.state['position'])
+
+        if self.unsplittable and not self.pending:
+            yield from self._switch_to_serial(self.state['position'])
+
+    def _cancel_pending(self):
+        for piece in self.pending:
+            piece.future.cancel()
+
+        self.pending.clear()
+
+    def _resplit(self, piece):
+        """Splits the stream again from the start of piece, without the boundary at its end."""
+        self._cancel_pending()
+        self.false_boundaries.add(piece.end)
+        self.state = piece.state
+        self._dispatch()
+
+    def _discard_before(self, position):
+        index = self._position_bytes(position)
+
+        if index > 0:
+            del self.buffer[:index]
+            self.buffer_offset += index
+
+    def _switch_to_serial(self, position):
+        """Decompresses the remainder of the stream, starting from position, serially."""
+        self._cancel_pending()
+        serial_class = self.serial_class()
+
+        if serial_class is None:
+            raise DecompressionError(f'Invalid {self.FORMAT} data, reason: piece exceeds its maximum size')
+
+        self.serial = serial_class(None)
+        self.serial_position = self._compressed_bytes(position)
+        data = bytes(self.buffer[self._position_bytes(position):])
+        self.buffer = bytearray()
+
+        yield from self._serial_decompress(data)
+
+    def _serial_decompress(self, data, flush=False):
+        for buf in self.serial.decompress(data):
+            self.compressed_size = self.serial_position + self.serial.compressed_size
+            yield self._tally(buf)
+
+        if flush:
+            for buf in self.serial.flush():
+                yield self._tally(buf)
+
+
+class ParallelBz2Decompressor(ParallelDecompressor):
+    """
+    Parallel decompressor for (multi-stream) bzip2 data.
+
+    The compressed blocks of a bzip2 stream are independent of one another,
+    but are not byte aligned. Each block is found by its 48-bit magic number,
+    and repackaged as a standalone single-block bzip2 stream (with its own
+    header, end-of-stream marker and CRC) for decompression. The combined CRC
+    of the blocks is verified as the end-of-stream marker is reached.
+
+    Positions within the compressed stream are measured in bits.
+    """
+    FORMAT = 'bzip2'
+
+    BLOCK_MAGIC = 0x314159265359
+    END_OF_STREAM_MAGIC = 0x177245385090
+    MAGIC_BITS = 48
+    CRC_BITS = 32
+    HEADER_SIZE = 4
+
+    # A block holds at most 900 kB of run-length encoded data, and each
+    # 5 byte run decodes to at most 255 bytes.
+    PIECE_MAX_SIZE = 900000 * 51
+
+    def initial_state(self):
+        return {
+            'position': 0,
+            'level': None,
+            'combined_crc': 0,
+            'streams_complete': 0,
+            'trailer': False,
+        }
+
+    def _position_bytes(self, position):
+        return position // 8 - self.buffer_offset
+
+    def _compressed_bytes(self, position):
+        return position // 8
+
+    def _discard_before(self, position):
+        # Whole bytes only
+        super()._discard_before(position - position % 8)
+
+    def _find_markers(self, data, start_bit):
+        base_bit = self.buffer_offset * 8
+        markers = [
+            (offset, magic)
+            for magic in (self.BLOCK_MAGIC, self.END_OF_STREAM_MAGIC)
+            for offset in _find_bit_pattern(data, magic, self.MAGIC_BITS, start_bit)
+            if offset + base_bit not in self.false_boundaries
+        ]
+
+        return sorted(markers)
+
+    def _split(self, data, state, final):
+        pieces = []
+        base_bit = self.buffer_offset * 8
+        position = state['position'] - base_bit
+        markers = deque(self._find_markers(data, position))
+
+        while not state['trailer']:
+            if state['level'] is None:
+                # Expecting the (byte aligned) header of a new stream, which
+                # may be preceded by null padding
+                index = position // 8
+
+                if state['streams_complete']:
+                    while index < len(data) and data[index] == 0:
+                        index += 1
+
+                header = bytes(data[index:index + self.HEADER_SIZE])
+
+                if len(header) < self.HEADER_SIZE and not final:
+                    break
+
+                if not header and state['streams_complete']:
+                    # End of the final stream
+                    break
+
+                if header[:3] != b'BZh' or not header[3:].isdigit() or header[3:] == b'0':
+                    if state['streams_complete']:
+                        # Trailing garbage after a complete stream, ignore it
+                        # (this matches the behavior of the bz2 module)
+                        state['trailer'] = True
+                        break
+
+                    raise DecompressionError('Invalid bzip2 data, reason: Invalid data stream')
+
+                state['level'] = int(header[3:])
+                state['combined_crc'] = 0
+                position = (index + self.HEADER_SIZE) * 8
+                state['position'] = position + base_bit
+                continue
+
+            while markers and markers[0][0] < position:
+                markers.popleft()
+
+            if not markers:
+                if final:
+                    raise DecompressionError('Compressed bzip2 data ended before the end-of-stream marker was reached')
+
+                break
+
+            if markers[0][0] != position:
+                raise DecompressionError('Invalid bzip2 data, reason: Invalid data stream')
+
+            if markers[0][1] == self.END_OF_STREAM_MAGIC:
+                stream_crc = _read_bits(data, position + self.MAGIC_BITS, self.CRC_BITS)
+
+                if stream_crc is None:
+                    if final:
+                        raise DecompressionError('Compressed bzip2 data ended before the end-of-stream marker was reached')
+
+                    break
+
+                if stream_crc != state['combined_crc']:
+                    if pieces or self.pending:
+                        # One of the blocks in flight may have a false
+                        # boundary, check again once they are done
+                        break
+
+                    raise DecompressionError('Invalid bzip2 data, reason: Invalid data stream')
+
+                # Streams are padded out to a whole byte
+                position = (position + self.MAGIC_BITS + self.CRC_BITS + 7) // 8 * 8
+                state['position'] = position + base_bit
+                state['level'] = None
+                state['streams_complete'] += 1
+                continue
+
+            if len(markers) < 2:
+                if final:
+                    raise DecompressionError('Compressed bzip2 data ended before the end-of-stream marker was reached')
+
+                break
+
+            start, end = position, markers[1][0]
+            pieces.append(Piece(start + base_bit, end + base_bit, self._block_stream(data, start, end, state), dict(state)))
+
+            block_crc = _read_bits(data, start + self.MAGIC_BITS, self.CRC_BITS)
+            combined_crc = state['combined_crc']
+            state['combined_crc'] = (((combined_crc << 1) | (combined_crc >> 31)) & 0xFFFFFFFF) ^ block_crc
+            position = end
+            state['position'] = position + base_bit
+
+        return pieces
+
+    def _block_stream(self, data, start, end, state):
+        """Repackages the block between the start and end bit offsets as a standalone bzip2 stream."""
+        block_crc = _read_bits(data, start + self.MAGIC_BITS, self.CRC_BITS)
+        n_bits = end - start + self.MAGIC_BITS + self.CRC_BITS
+
+        stream = _read_bits(data, start, end - start)
+        stream = (stream << self.MAGIC_BITS) | self.END_OF_STREAM_MAGIC
+        stream = (stream << self.CRC_BITS) | block_crc
+        # Padded out to a whole byte
+        stream <<= -n_bits % 8
+
+        return b'BZh' + str(state['level']).encode() + stream.to_bytes((n_bits + 7) // 8, 'big')
+
+
+class ParallelGzipDecompressor(ParallelDecompressor):
+    """
+    Parallel decompressor for multi-member gzip data (such as that produced by
+    pigz or bgzip).
+
+    Each member of a gzip file is a complete deflate stream, so members can be
+    decompressed independently. Members are found by the gzip magic number and
+    compression method at the start of their header.
+
+    Most gzip files are a single member, in which case no boundaries will be
+    found, and decompression carries on with a GzipDecompressor instead once
+    more than MAX_UNSPLIT_SIZE compressed bytes have built up.
+
+    Positions within the compressed stream are measured in bytes.
+    """
+    FORMAT = 'gzip'
+
+    MEMBER_MAGIC = b'\x1f\x8b\x08'
+
+    # Most compressed data to buffer without finding a member boundary
+    MAX_UNSPLIT_SIZE = 16 * 1024 * 1024
+
+    def serial_class(self):
+        return GzipDecompressor
+
+    def _find_member(self, data, start):
+        index = data.find(self.MEMBER_MAGIC, start)
+
+        while index != -1:
+            if index + len(self.MEMBER_MAGIC) >= len(data):
+                # The header flags have not been received yet
+                return -1
+
+            # The top 3 bits of the header flags are reserved, and must be zero
+            if not data[index + len(self.MEMBER_MAGIC)] & 0xE0 and \
+                    index + self.buffer_offset not in self.false_boundaries:
+                return index
+
+            index = data.find(self.MEMBER_MAGIC, index + 1)
+
+        return -1
+
+    def _split(self, data, state, final):
+        pieces = []
+        position = self._position_bytes(state['position'])
+
+        if state['position'] == 0 and not self.MEMBER_MAGIC[:2].startswith(bytes(data[:2])):
+            raise DecompressionError('Invalid gzip data, reason: Not a gzipped file')
+
+        while position < len(data):
+            end = self._find_member(data, position + 1)
+
+            if end == -1:
+                if final:
+                    end = len(data)
+                elif len(data) - position > self.MAX_UNSPLIT_SIZE and not pieces:
+                    return None
+                else:
+                    break
+
+            pieces.append(Piece(
+                position + self.buffer_offset,
+                end + self.buffer_offset,
+                bytes(data[position:end]),
+                dict(state),
+                final=final and end == len(data)
+            ))
+
+            position = end
+            state['position'] = position + self.buffer_offset
+
+        return pieces
+
+
+# Registry of the supported compression formats, mapping the FORMAT of each
+# to its decompressor
+CODECS = {
+    decompressor_class.FORMAT: decompressor_class
+    for decompressor_class in (GzipDecompressor, Bz2Decompressor, ZstdDecompressor, XzDecompressor, ZipDecompressor)
+}
+
+# Mapping of (lower case) file extensions to the decompressor for that format
+DECOMPRESSORS = {
+    extension: decompressor_class
+    for decompressor_class in CODECS.values()
+    for extension in decompressor_class.EXTENSIONS
+}
+
+# Mapping of decompressors to their multi-process equivalents
+PARALLEL_DECOMPRESSORS = {
+    GzipDecompressor: ParallelGzipDecompressor,
+    Bz2Decompressor: ParallelBz2Decompressor,
+}
+
+# Process pool shared by all parallel decompressors, created when first needed.
+# It is created from a request thread of a threaded process, so its workers
+# are started by a forkserver (or spawned) rather than forked from that process,
+# which could deadlock should another thread hold a lock at the time.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(processes):
+    """
+    Gets the process pool used for parallel decompression, creating it if need be.
+
+    @param processes number of worker processes in the pool
+    @return a ProcessPoolExecutor
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context(start_method))
+
+    return _executor
+
+
+def get_decompressor(filename, max_size, processes=1, format_name=None, max_ratio=None, expected_input_size=None):
+    """
+    Gets a new StreamDecompressor suitable for the provided file name.
+
+    @param filename name of the (possibly) compressed file
+    @param max_size maximum number of decompressed bytes to allow (None for no limit)
+    @param processes number of processes to decompress with, a value greater
+                     than 1 selects a ParallelDecompressor (for the formats
+                     that have one)
+    @param format_name compression format of the data (i.e. a FORMAT), if
+                       known from its content, which takes precedence over
+                       the file name
+    @param max_ratio maximum number of decompressed bytes to allow per
+                     compressed byte (None for no limit)
+    @param expected_input_size size of the compressed data, if known
+    @return a StreamDecompressor instance, or None if the file name (or
+            format) does not indicate a supported compression format
+    """
+    if format_name is not None:
+        decompressor_class = CODECS.get(format_name)
+    else:
+        decompressor_class = next(
+            (cls for extension, cls in DECOMPRESSORS.items() if filename and filename.lower().endswith(extension)),
+            None
+        )
+
+    if decompressor_class is None:
+        return None
+
+    if processes > 1 and decompressor_class in PARALLEL_DECOMPRESSORS:
+        return PARALLEL_DECOMPRESSORS[decompressor_class](
+            max_size, get_executor(processes), max_pending=processes,
+            max_ratio=max_ratio, expected_input_size=expected_input_size
+        )
+
+    return decompressor_class(max_size, max_ratio=max_ratio, expected_input_size=expected_input_size)
@@ -6,22 +6,511 @@ file_utils.py
 Utility functions for the web interface to use when dealing with files.
 """
 
-import gzip
+import io
 import logging
-import os.path
+import os
 import tempfile
-from gzip import BadGzipFile
 from hashlib import md5
-from os.path import getsize
 
-import bz2file as bz2
-from flask import abort, current_app
+from flask import Request, abort, current_app
 from netCDF4 import Dataset
 
+from .compression_utils import (CODECS, DECOMPRESSORS, DecompressedSizeError, DecompressionError, ParallelDecompressor,
+                                get_decompressor)
+from .format_utils import (COMPRESSION_FORMATS, DATASET_FORMATS, MAX_USER_BLOCK_SIZE, NETCDF3, SIGNATURE_SIZE,
+                           UnknownFormatError, classic_header_size, sniff_format)
+
 app = current_app
 
 logger = logging.getLogger(__name__)
 
+# Number of bytes to move at a time when copying upload data around
+CHUNK_SIZE = 1024 * 1024
+
+# File extensions of the accepted uploads, including those of each of the
+# supported compression formats
+ACCEPTED_EXTENSIONS = tuple(DECOMPRESSORS) + ('.nc', '.h5', '.nc4', '.hdf')
+
+# Suffix of on-disk temporary files. The CF suite checks that the path of a
+# file ends with "nc", which the random name of a temporary file otherwise
+# would once in a while, changing its report.
+TEMP_FILE_SUFFIX = '.tmp'
+
+
+class TemporaryStorage(object):
+    """
+    A temporary file that is kept in memory until it grows beyond a configured
+    size, at which point it is rolled over to a named temporary file on disk.
+
+    Small files therefore never touch the disk, and may be opened directly from
+    their in-memory buffer.
+    """
+    def __init__(self, directory=None, max_memory_size=0, expected_size=None):
+        """
+        @param directory location to create an on-disk temporary file within,
+                         defaults to the tempfile module default if None
+        @param max_memory_size largest number of bytes to hold in memory before
+                               rolling over to disk (0 to always use disk)
+        @param expected_size expected number of bytes to be written (if known),
+                             used to go straight to disk for large files
+        """
+        self.directory = directory
+        self.max_memory_size = max_memory_size
+
+        if max_memory_size > 0 and (expected_size is None or expected_size <= max_memory_size):
+            self.file = io.BytesIO()
+        else:
+            self.file = tempfile.NamedTemporaryFile(dir=directory, suffix=TEMP_FILE_SUFFIX)
+
+    @property
+    def in_memory(self):
+        return isinstance(self.file, io.BytesIO)
+
+    @property
+    def name(self):
+        """Location of the file on disk, or None if held in memory."""
+        return None if self.in_memory else self.file.name
+
+    def write(self, data):
+        if self.in_memory and self.file.tell() + len(data) > self.max_memory_size:
+            self._rollover()
+
+        return self.file.write(data)
+
+    def _rollover(self):
+        disk_file = tempfile.NamedTemporaryFile(dir=self.directory, suffix=TEMP_FILE_SUFFIX)
+        disk_file.write(self.file.getbuffer())
+        disk_file.seek(self.file.tell())
+
+        self.file.close()
+        self.file = disk_file
+
+    def detach(self):
+        """
+        Moves the underlying file into a new object, leaving this one empty.
+        This allows the file to outlive whatever would otherwise close it, such
+        as the request that it was uploaded with.
+
+        @return a new object (of the same type) that owns the file
+        """
+        storage = object.__new__(type(self))
+        storage.__dict__.update(vars(self))
+        self.file = io.BytesIO()
+
+        return storage
+
+    def getbuffer(self):
+        """Returns a (zero-copy) view of the in-memory file contents."""
+        return self.file.getbuffer()
+
+    def close(self):
+        try:
+            self.file.close()
+        except BufferError:
+            # The in-memory buffer is still exported to an open Dataset, it
+            # will be released once that Dataset is closed.
+            pass
+
+    def __getattr__(self, name):
+        # Defer everything else (read, seek, flush, etc.) to the underlying file
+        return getattr(self.file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class UploadSpool(TemporaryStorage):
+    """
+    Temporary storage that incoming upload data is written to exactly once.
+
+    The MD5 hash and byte count of the upload are updated from the same chunks
+    as they are written, so the data never needs to be read back (or held in
+    memory) just to describe it in the report.
+
+    The format of the upload is sniffed from its first few bytes (see
+    format_utils.sniff_format()), regardless of its file name. Compressed
+    uploads are fed through a decompressor as they arrive, and only the
+    decompressed data is stored. Uploads that are not a dataset (or a dataset
+    within a supported compression format) are rejected as soon as that is
+    apparent, after which the rest of the upload is counted but never stored.
+    The hash and byte count always describe the data as uploaded.
+
+    With metadata_only set, decompression stops as soon as the stored data
+    holds the complete header of a netCDF classic format file, which is all
+    that checkers that only read metadata need. The rest of the compressed
+    upload is set aside, and is only decompressed should resume() be called.
+    """
+    # Number of bytes beyond the end of a classic format header to store, as
+    # netCDF reads slightly past the header when opening files from memory
+    HEADER_MARGIN = 1024
+
+    # Largest classic format header to look for before decompressing in full
+    MAX_HEADER_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, directory=None, max_memory_size=0, expected_size=None, new_decompressor=None,
+                 metadata_only=False):
+        """
+        @param directory location to create an on-disk temporary file within
+        @param max_memory_size largest number of bytes to hold in memory
+        @param expected_size expected number of bytes to be uploaded (if known)
+        @param new_decompressor function that takes the name of a compression
+                                format and returns a StreamDecompressor for it,
+                                or None if the format is not supported
+        @param metadata_only whether to stop decompressing after the header of
+                             a classic format file
+        """
+        # Compressed uploads only grow once decompressed, so the expected size
+        # is still a lower bound for deciding on in-memory or on-disk storage
+        super().__init__(directory, max_memory_size, expected_size)
+
+        self.hasher = md5()
+        self.size = 0
+        self.new_decompressor = new_decompressor
+        self.metadata_only = metadata_only
+        self.decompressor = None
+        self.finished = False
+        # The error (DecompressionError or UnknownFormatError) that the upload
+        # was rejected with, if any
+        self.error = None
+        # Start of the upload, held until its format can be told
+        self.head = bytearray()
+        # Formats of the upload, and of the stored (decompressed) data
+        self.upload_format = None
+        self.format = None
+        # Whether to look for the end of a classic format header
+        self.find_header = False
+        self.header_checked_size = 0
+        # Compressed data set aside once the header has been found
+        self.remainder = None
+
+    @property
+    def header_only(self):
+        """Whether only the header of the upload has been decompressed (see resume())."""
+        return self.remainder is not None
+
+    def write(self, data):
+        n_bytes = len(data)
+        self.hasher.update(data)
+        self.size += n_bytes
+
+        if self.error is not None:
+            return n_bytes
+
+        if self.upload_format is None:
+            self.head += data
+
+            if not self._sniff_upload(complete=False):
+                return n_bytes
+
+            data, self.head = self.head, None
+
+        self._store(data)
+
+        return n_bytes
+
+    def reject(self, err):
+        """
+        Rejects the upload, discarding anything stored so far. The rest of the
+        upload is only hashed and counted.
+
+        @param err the exception describing why the upload was rejected
+        """
+        self.error = err
+        self.head = None
+
+        # Discard any partially decompressed data, the rest of the upload
+        # is only needed for its hash and size from here on.
+        self.seek(0)
+        self.truncate()
+
+    def _sniff_upload(self, complete):
+        """Picks how to store the upload once its format can be told, returning whether it could be."""
+        try:
+            self.upload_format = sniff_format(self.head, complete=complete)
+        except UnknownFormatError as err:
+            self.reject(err)
+            return False
+
+        if self.upload_format is None:
+            return False
+
+        if self.upload_format in COMPRESSION_FORMATS:
+            if self.new_decompressor is not None:
+                self.decompressor = self.new_decompressor(self.upload_format)
+
+            if self.decompressor is None:
+                self.reject(UnknownFormatError(f'{self.upload_format} compressed files are not supported'))
+                return False
+
+            self.find_header = self.metadata_only
+        else:
+            self.format = self.upload_format
+
+        return True
+
+    def _store(self, data):
+        if self.decompressor is None:
+            super().write(data)
+        elif self.remainder is not None:
+            self.remainder.write(data)
+        else:
+            try:
+                for buf in self.decompressor.decompress(data):
+                    super().write(buf)
+            except DecompressionError as err:
+                self.reject(err)
+                return
+
+            self._sniff_stored(complete=False)
+
+            if self.find_header and self.error is None:
+                self._check_header()
+
+    def _sniff_stored(self, complete):
+        """Checks that the decompressed data is a dataset, once enough of it has been stored."""
+        if self.format is not None or self.error is not None:
+            return
+
+        stored_size = self.file.tell()
+
+        if stored_size == 0 and not complete:
+            return
+
+        sniffed = self._stored_data(min(stored_size, MAX_USER_BLOCK_SIZE + SIGNATURE_SIZE))
+
+        try:
+            self.format = sniff_format(sniffed, complete=complete, formats=DATASET_FORMATS)
+        except UnknownFormatError as err:
+            self.reject(UnknownFormatError(f'decompressed {err}'))
+
+    def _check_header(self):
+        """Sets aside the rest of the upload once a complete classic format header has been stored."""
+        if self.format is None:
+            return
+
+        if self.format != NETCDF3:
+            self.find_header = False
+            return
+
+        stored_size = self.file.tell()
+
+        # Only look again once the stored data has doubled in size, so large
+        # headers are not read over and over
+        if stored_size < 2 * self.header_checked_size:
+            return
+
+        self.header_checked_size = stored_size
+
+        try:
+            header_size = classic_header_size(self._stored_data(min(stored_size, self.MAX_HEADER_SIZE)))
+        except ValueError:
+            # Leave invalid headers for netCDF to report on
+            self.find_header = False
+            return
+
+        if header_size is None:
+            # Give up on headers that are too large to bother with
+            if stored_size >= self.MAX_HEADER_SIZE:
+                self.find_header = False
+
+            return
+
+        if stored_size >= header_size + self.HEADER_MARGIN:
+            self.find_header = False
+            self.remainder = TemporaryStorage(self.directory, self.max_memory_size)
+
+    def _stored_data(self, n_bytes):
+        if self.in_memory:
+            return self.file.getvalue()[:n_bytes]
+
+        return os.pread(self.file.fileno(), n_bytes, 0)
+
+    def finish(self):
+        """
+        Completes the spooling of the upload once all data has been written,
+        and rewinds to the start of the stored data.
+        """
+        if not self.finished:
+            # Werkzeug rewinds its container after the last chunk, so anything
+            # still to be stored goes after what has been stored already
+            self.seek(0, os.SEEK_END)
+
+            # Uploads too small to sniff until now
+            if self.upload_format is None and self.error is None and self._sniff_upload(complete=True):
+                head, self.head = self.head, None
+                self._store(head)
+
+            if self.decompressor is not None and self.error is None and self.remainder is None:
+                self._flush()
+
+            self._sniff_stored(complete=True)
+
+        self.finished = True
+        self.seek(0)
+
+    def resume(self):
+        """
+        Decompresses the rest of an upload that was set aside after its
+        header was found (see header_only), so the whole file is stored.
+        """
+        if self.remainder is None:
+            return
+
+        remainder = self.remainder
+        self.remainder = None
+        self.seek(0, os.SEEK_END)
+        remainder.seek(0)
+
+        try:
+            buf = remainder.read(CHUNK_SIZE)
+
+            while len(buf) > 0 and self.error is None:
+                for output in self.decompressor.decompress(buf):
+                    super().write(output)
+
+                buf = remainder.read(CHUNK_SIZE)
+        except DecompressionError as err:
+            self.reject(err)
+        finally:
+            remainder.close()
+
+        if self.error is None:
+            self._flush()
+
+        self.seek(0)
+
+    def _flush(self):
+        try:
+            for buf in self.decompressor.flush():
+                super().write(buf)
+        except DecompressionError as err:
+            self.reject(err)
+
+    def detach(self):
+        spool = super().detach()
+        # The set aside remainder moves along with the file
+        self.remainder = None
+
+        return spool
+
+    def close(self):
+        if self.remainder is not None:
+            self.remainder.close()
+
+        super().close()
+
+    def hexdigest(self):
+        """Returns the hex digest of the MD5 hash of all data written so far."""
+        return self.hasher.hexdigest()
+
+
+class UploadRequest(Request):
+    """
+    Flask Request class that streams file uploads directly into an UploadSpool
+    within the configured TempFileLocation, rather than Werkzeug's default
+    (in-memory or temporary file) container. Compressed uploads are
+    decompressed as they are received (up to the end of the header of classic
+    format files, if MetadataOnlyIngest is enabled).
+
+    Uploads with a file name that is not accepted are never stored at all.
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        expected_size = content_length or total_content_length
+        spool = UploadSpool(
+            directory=current_app.config.get('TempFileLocation'),
+            max_memory_size=current_app.config.get('InMemoryFileSize', 0),
+            expected_size=expected_size,
+            new_decompressor=lambda format_name: new_decompressor(filename, expected_size, format_name),
+            metadata_only=current_app.config.get('MetadataOnlyIngest', False)
+        )
+
+        if not is_valid_filename(filename):
+            spool.reject(UnknownFormatError(f'{filename} is not an accepted file name'))
+
+        return spool
+
+
+def new_decompressor(filename, expected_size=None, format_name=None):
+    """
+    Gets a new decompressor for the provided file name, limited to the maximum
+    upload size and MaxCompressionRatio. Compressed data larger than a single
+    batch is decompressed by the configured number of DecompressProcesses.
+
+    @param filename name of the (possibly) compressed file
+    @param expected_size size of the compressed data, if known
+    @param format_name compression format sniffed from the data, which takes
+                       precedence over the file name
+    @return a StreamDecompressor instance, or None if the file is not compressed
+    """
+    processes = app.config.get('DecompressProcesses', 1)
+
+    if expected_size is not None and expected_size < ParallelDecompressor.BATCH_SIZE:
+        processes = 1
+
+    return get_decompressor(
+        filename, app.config['MAX_CONTENT_LENGTH'], processes=processes, format_name=format_name,
+        max_ratio=app.config.get('MaxCompressionRatio'), expected_input_size=expected_size
+    )
+
+
+def spool_upload(uploaded_file):
+    """
+    Gets the UploadSpool containing the data of the provided file upload.
+
+    Uploads received via UploadRequest are already spooled and are returned
+    as-is. Any other file-like object is copied into a new UploadSpool in
+    fixed-size chunks (decompressing it along the way if its content is
+    compressed), so memory usage does not grow with the size of the file.
+    Copying stops as soon as the upload is rejected.
+
+    @param uploaded_file werkzeug.FileStorage or file-like object to spool
+    @return a finished UploadSpool positioned at the start of the stored data
+    """
+    stream = getattr(uploaded_file, 'stream', uploaded_file)
+
+    if isinstance(stream, UploadSpool):
+        stream.finish()
+        return stream
+
+    expected_size = get_file_size(uploaded_file)
+    spool = UploadSpool(
+        directory=app.config.get('TempFileLocation'),
+        max_memory_size=app.config.get('InMemoryFileSize', 0),
+        expected_size=expected_size,
+        new_decompressor=lambda format_name: new_decompressor(uploaded_file.filename, expected_size, format_name),
+        metadata_only=app.config.get('MetadataOnlyIngest', False)
+    )
+
+    try:
+        buf = uploaded_file.read(CHUNK_SIZE)
+
+        while len(buf) > 0 and spool.error is None:
+            spool.write(buf)
+            buf = uploaded_file.read(CHUNK_SIZE)
+    except BaseException:
+        spool.close()
+        raise
+
+    spool.finish()
+
+    return spool
+
+
+def get_file_size(infile):
+    """
+    Gets the size of an open file, without reading it.
+
+    @param infile a python file-like object
+    @return the size of the file in bytes, or None if it cannot be told
+    """
+    try:
+        return os.fstat(infile.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        return None
+
 
 def hash_file(infile, hasher=None, blocksize=65536):
     """
@@ -66,73 +555,47 @@ def format_byte_size(n_bytes):
 
 def decompress_file(infile, upload_filename):
     """
-    Opens gzip and bz2 files and returns the uncompressed data.
-    Uncompresses in pieces andand cuts off when limit is reached in order to
-    avoid 'zip bombs'.
-
-    Solution suggested by Mark Adler:
-    http://stackoverflow.com/questions/13622706/how-to-protect-myself-from-a-gzip-or-bzip2-bomb
-
-    The gist is that we decompress the file in chunks, counting the uncompressed
-    size of each and adding it to the total. If the filesize is OK, then
-    decompress the file and return data. This seems a little redundant, but
-    uncompressing the actual file in chunks and storing the data creates
-    crashing issues in the Docker container.
+    Decompresses a compressed file in pieces, cutting off when the size limit
+    is reached in order to avoid 'zip bombs'.
 
-    TODO: Bz2 doesn't have the same ability as zlib to read in chunks, so a bomb is
-          just going to cause a memory error. So, given the extra time it takes to
-          decompress a bz2, I'm just assembling the chunks on the fly instead of
-          unzipping a second time. Investigate a workaround for this at some point.
+    Uploads are normally decompressed as they are received (see UploadSpool),
+    this function is for compressed data that is already stored in a file.
 
     @param infile file object containing the data to decompress
     @param upload_filename name of the file to decompress
-    @return a temporary file object containing the decompressed data
+    @return a TemporaryStorage object containing the decompressed data
     """
     app.logger.info("Decompressing file %s", upload_filename)
 
-    decompressed_file = tempfile.NamedTemporaryFile()
-    extension = os.path.splitext(upload_filename)[-1]
+    decompressor = new_decompressor(upload_filename, expected_size=get_file_size(infile))
 
-    # Determine the correct open function based on the type of decompression
-    if extension == ".gz":
-        open_fn = gzip.open
-    elif extension == ".bz2":
-        open_fn = bz2.open
-    else:
+    if decompressor is None:
+        extension = os.path.splitext(upload_filename)[-1]
         raise ValueError(f"Unknown file extension ({extension}) for decompression")
 
+    decompressed_file = TemporaryStorage(
+        directory=app.config.get('TempFileLocation'),
+        max_memory_size=app.config.get('InMemoryFileSize', 0)
+    )
+
     try:
-        data_length = 0
-        reader = open_fn(infile)
+        buf = infile.read(CHUNK_SIZE)
 
-        while data_length < app.config['MAX_CONTENT_LENGTH']:
-            buf = reader.read(1024)
+        while len(buf) > 0:
+            for data in decompressor.decompress(buf):
+                decompressed_file.write(data)
 
-            if len(buf) == 0:
-                break
+            buf = infile.read(CHUNK_SIZE)
 
-            data_length += len(buf)
-            decompressed_file.write(buf)
-        else:
-            decompressed_file.close()
-            return abort(
-                400, f"The decompressed file size is too large. "
-                     f"Max decompressed file size is: {format_byte_size(app.config['MAX_CONTENT_LENGTH'])}. "
-                     f"Filename: {upload_filename}"
-            )
-    except (BadGzipFile, OSError, ValueError, TypeError, IOError, EOFError) as err:
+        for data in decompressor.flush():
+            decompressed_file.write(data)
+    except DecompressedSizeError as err:
         decompressed_file.close()
-        raise ValueError(
-            f'Failed to decompress {extension} file {upload_filename}, reason: {str(err)}.'
-        )
-    except MemoryError:
-        # Noticed that some bzip bombs cause memory errors. There doesn't
-        # seem to be a ton of great ways around this.
+        return abort_decompressed_size(upload_filename, err)
+    except DecompressionError as err:
         decompressed_file.close()
-        return abort(
-            400, f"The decompressed file size is too large. "
-                 f"Max decompressed file size is: {format_byte_size(app.config['MAX_CONTENT_LENGTH'])}. "
-                 f"Filename: {upload_filename}"
+        raise ValueError(
+            f'Failed to decompress {decompressor.FORMAT} file {upload_filename}, reason: {str(err)}.'
         )
 
     # Roll file pointer back to beginning of buffer now that decompression is complete
@@ -141,67 +604,169 @@ def decompress_file(infile, upload_filename):
     return decompressed_file
 
 
+def abort_decompressed_size(upload_filename, err=None):
+    """
+    Aborts the current request due to a decompressed file being too large.
+
+    @param upload_filename name of the uploaded file
+    @param err the DecompressedSizeError raised, which details how much of
+               the file was processed before decompression was stopped
+    """
+    reason = f"Reason: {str(err)}. " if err is not None else ""
+
+    return abort(
+        400, f"The decompressed file size is too large. "
+             f"Max decompressed file size is: {format_byte_size(app.config['MAX_CONTENT_LENGTH'])}. "
+             f"{reason}Filename: {upload_filename}"
+    )
+
+
 def get_dataset_from_file(uploaded_file):
     """
     Derives a netcdf4.Dataset object from the provided file upload dictionary.
 
     @param uploaded_file open file handle to the data to convert.
     """
+    upload = get_upload_from_file(uploaded_file)
+
+    return {
+        'dataset': open_upload_dataset(upload),
+        'hash': upload['hash'],
+        'size': upload['size'],
+        'filename': upload['filename']
+    }
+
+
+def get_upload_from_file(uploaded_file):
+    """
+    Spools the provided file upload into temporary storage, without opening it.
+
+    The hash and file size are tallied as the upload is spooled, so the hash
+    is available (e.g. for cache lookups) before the file is ever opened.
+
+    @param uploaded_file open file handle to the uploaded data
+    @return a dict with the spooled 'datafile', and the 'hash', 'size' and
+            'filename' of the upload
+    """
     app.logger.info("Attempting to get dataset from uploaded file %s", uploaded_file)
 
     datafile_name = uploaded_file.filename
     check_valid_filename(datafile_name)
 
-    # uploaded_file is an instance of werkzeug.FileStorage, which only allows us
-    # to read the file contents but not reference a location on disk.
-    # Copy the uploaded file to a named temporary file, so we can provide a disk
-    # location when initializing the netCDF.Dataset object below.
-    datafile = tempfile.NamedTemporaryFile()
-    datafile.write(uploaded_file.read())
-    datafile.seek(0)
+    # Make sure the upload lives in temporary storage that the netCDF.Dataset
+    # object can be opened from, either a named temporary file or (for
+    # small files) an in-memory buffer. The hash and file size are tallied as
+    # the upload is spooled, prior to any decompression of the upload, which
+    # also takes place as the upload is spooled.
+    datafile = spool_upload(uploaded_file)
+    check_upload_error(datafile, datafile_name)
 
-    # Calculate hash and file size now, prior to any potential file decompression
-    file_hash = hash_file(datafile)
-    file_size = format_byte_size(getsize(datafile.name))
+    return {
+        'datafile': datafile,
+        'hash': datafile.hexdigest(),
+        'size': format_byte_size(datafile.size),
+        'filename': datafile_name
+    }
 
-    # Send compressed files to decompressor
-    if datafile_name.lower().endswith(('.gz', '.bz2')):
-        try:
-            decompressed_file = decompress_file(datafile, datafile_name)
-        except ValueError as err:
-            return abort(
-                500, f'Failed to decompress file {datafile_name}, reason: {str(err)}.'
-            )
-        finally:
-            # Should no longer need the compressed version of file
-            datafile.close()
 
-        datafile = decompressed_file
+def check_upload_error(datafile, filename):
+    """
+    Aborts the request (closing the upload) if the upload was rejected, either
+    for not being in an accepted format or for failing to decompress.
+
+    @param datafile UploadSpool of the upload
+    @param filename name of the uploaded file
+    """
+    if datafile.error is None:
+        return
+
+    datafile.close()
+
+    if isinstance(datafile.error, DecompressedSizeError):
+        return abort_decompressed_size(filename, datafile.error)
+
+    if isinstance(datafile.error, UnknownFormatError):
+        return abort(
+            500, f'File {filename} is not in an accepted data format, reason: {str(datafile.error)}. '
+                 f'Must be a netCDF or HDF file, optionally compressed with {", ".join(list(CODECS)[:-1])} '
+                 f'or {list(CODECS)[-1]}.'
+        )
+
+    return abort(
+        500, f'Failed to decompress file {filename}, reason: {str(datafile.error)}.'
+    )
+
+
+def open_upload_dataset(upload, metadata_only=False, close=True):
+    """
+    Opens the netCDF4.Dataset for an upload from get_upload_from_file().
+    The temporary storage of the upload is closed once the Dataset is open,
+    unless close is False.
+
+    @param upload dict returned by get_upload_from_file()
+    @param metadata_only whether only the metadata of the file will be read,
+                         in which case the Dataset may be opened from just the
+                         header of the file, should that be all that was
+                         decompressed
+    @param close whether to close the temporary storage once the Dataset is
+                 open, else it is left to the caller, e.g. so that the file
+                 may be opened again by another process
+    @return an open netCDF4.Dataset
+    """
+    datafile = upload['datafile']
+
+    if not metadata_only and datafile.header_only:
+        app.logger.info("Decompressing the remainder of file %s", upload['filename'])
+        datafile.resume()
+        check_upload_error(datafile, upload['filename'])
 
     try:
-        return {
-            'dataset': Dataset(datafile.name, 'r'),
-            'hash': file_hash,
-            'size': file_size,
-            'filename': datafile_name
-        }
+        return open_dataset(datafile, upload['filename'])
     except Exception as err:
         return abort(
-            500, f"Error processing file {datafile_name}, reason: {str(err)}. "
+            500, f"Error processing file {upload['filename']}, reason: {str(err)}. "
                  f"Please make sure it's a valid NetCDF file."
         )
     finally:
-        datafile.close()
+        if close:
+            upload['datafile'].close()
+
+
+def open_dataset(datafile, filename):
+    """
+    Opens a netCDF4.Dataset from temporary storage. Files held in memory are
+    opened directly from their buffer, without ever being written to disk.
+
+    @param datafile TemporaryStorage object containing the file data
+    @param filename name of the file the data came from
+    @return an open netCDF4.Dataset
+    """
+    if datafile.in_memory:
+        return Dataset(filename, 'r', memory=datafile.getbuffer())
+
+    return Dataset(datafile.name, 'r')
+
+
+def is_valid_filename(filename):
+    """
+    Checks if the provided file name has one of the expected extensions.
+
+    @param filename Name of the file to check
+    @return True if the file name is accepted
+    """
+    return bool(filename) and filename.lower().endswith(ACCEPTED_EXTENSIONS)
 
 
 def check_valid_filename(filename):
     """
     Checks if the provided file name conforms to one of the expected input types.
 
+    The format of the file is then told from its content, as it is spooled.
+
     @param filename Name of the file to check
     """
-    if not filename.lower().endswith(('.gz', '.bz2', '.nc', '.hdf', '.h5', '.nc4')):
+    if not is_valid_filename(filename):
         return abort(
             500, f'File {filename} is not in an accepted data format. '
-                 f'Must be one of .gz, .bz2, .nc, .h5, .nc4 or .hdf.'
+                 f'Must be one of {", ".join(ACCEPTED_EXTENSIONS[:-1])} or {ACCEPTED_EXTENSIONS[-1]}.'
         )
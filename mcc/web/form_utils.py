@@ -6,8 +6,13 @@ form_utils.py
 A set of utility functions for parsing GET and POST requests to run checkers.
 """
 
+import re
+
 from flask import abort
 
+# Pattern that valid (hex digest) MD5 hashes match
+MD5_PATTERN = re.compile(r'^[0-9a-fA-F]{32}$')
+
 
 def get_tests(form_dict, checker_map):
     """
@@ -18,8 +23,9 @@ def get_tests(form_dict, checker_map):
                      form_dict = ImmutableMultiDict([
                         ('GDS2-parameter', u'L2P'),
                         ('GDS2', u'on')])
-    @param checker_map a dict of checker short names to initialized checkers
-    @return a list of setup checkers that the user has selected
+    @param checker_map a dict of checker short names to CheckSuite classes
+    @return a list of setup checkers that the user has selected, which are
+            shared with other requests so must not be modified
     """
     tests = []
 
@@ -27,19 +33,26 @@ def get_tests(form_dict, checker_map):
         if short_name in form_dict:
             potential_parameter = form_dict.get(short_name + '-parameter')
             version_selection = form_dict.get(short_name + '-version')
+            table_selection = form_dict.get(short_name + '-standard-name-table')
 
-            # Get an instance of the Checker
-            checker = checker_map[short_name]()
+            checker = checker_map[short_name]
 
-            # Set up the tests with parameter if necessary
+            # Get the compiled instance of the Checker, set up with the
+            # parameter if necessary
             if potential_parameter is not None and version_selection is not None:
-                tests.append(checker.setup(potential_parameter, version_selection))
+                args = (potential_parameter, version_selection)
             elif potential_parameter is not None:
-                tests.append(checker.setup(potential_parameter))
+                args = (potential_parameter,)
             elif version_selection is not None:
-                tests.append(checker.setup(version_selection))
+                args = (version_selection,)
             else:
-                tests.append(checker.setup(None))
+                args = (None,)
+
+            # and the version of the standard name table, if it checks them
+            if checker.CHECKS_STANDARD_NAMES and table_selection:
+                args += (table_selection,)
+
+            tests.append(checker.compiled(*args))
 
     return tests
 
@@ -56,7 +69,8 @@ def parse_post_arguments(form_dict, files, checker_map):
                         ('GDS2', u'on')])
     @param files a dict with a flask file-like object
     @param checker_map a dict of checker short names to initialized checkers
-    @return a dict with 'file', 'checkers', 'response' or abort()
+    @return a dict with 'file', 'md5', 'checkers', 'response' or abort()
+            'file' is None when only the MD5 hash of a file is provided
     # TODO determine if this is an additional place to verify upload size constraint
     """
     ret = {}
@@ -68,12 +82,20 @@ def parse_post_arguments(form_dict, files, checker_map):
             400, "You need to choose at least one metadata convention to test your file against."
         )
 
+    file_hash = form_dict.get('md5')
+
+    if file_hash is not None and not MD5_PATTERN.match(file_hash):
+        return abort(400, f'Invalid value for "md5" ({file_hash}), it must be a hex digest of an MD5 hash.')
+
     if 'file-upload' not in files:
-        return abort(400, "Your request was empty. Please make sure you've specified a file.")
+        # A previously checked file can be referred to by its hash alone
+        if file_hash is None:
+            return abort(400, "Your request was empty. Please make sure you've specified a file.")
     elif not files['file-upload']:
         return abort(400, "There was a problem uploading your file. Please try again.")
 
-    ret['file'] = files['file-upload']
+    ret['file'] = files.get('file-upload')
+    ret['md5'] = file_hash.lower() if file_hash else None
     ret['checkers'] = checkers
     ret['response'] = form_dict.get('response', 'html').lower()
 
@@ -0,0 +1,268 @@
+"""
+===============
+format_utils.py
+===============
+
+Utilities for recognizing the format of uploaded files from their content.
+
+The format of an upload is sniffed from the magic number its first few bytes
+hold, rather than trusted from its file name, so compressed files are
+decompressed whatever they are called and anything that is neither a dataset
+nor a supported compression format is turned away before it is stored.
+
+netCDF-3 "classic" format files (including the 64-bit offset and 64-bit data
+variants) hold all of their metadata in a header at the very start of the file,
+followed by the data of each variable. Checkers that only need metadata can be
+run against a file that is cut off right after that header.
+"""
+
+# Names of the formats that can be sniffed
+NETCDF3 = 'netCDF-3'
+HDF5 = 'HDF5'
+HDF4 = 'HDF4'
+GZIP = 'gzip'
+BZIP2 = 'bzip2'
+ZSTD = 'zstd'
+XZ = 'xz'
+ZIP = 'zip'
+
+# Formats that netCDF4.Dataset can open (HDF4 depending on how netCDF was built)
+DATASET_FORMATS = (NETCDF3, HDF5, HDF4)
+
+# Compression formats, which should contain one of the DATASET_FORMATS
+COMPRESSION_FORMATS = (GZIP, BZIP2, ZSTD, XZ, ZIP)
+
+# Magic numbers that files of each format start with
+SIGNATURES = (
+    (b'\x89HDF\r\n\x1a\n', HDF5),
+    (b'\x0e\x03\x13\x01', HDF4),
+    (b'\x1f\x8b', GZIP),
+    (b'BZh', BZIP2),
+    (b'\x28\xb5\x2f\xfd', ZSTD),
+    (b'\xfd7zXZ\x00', XZ),
+    (b'PK\x03\x04', ZIP),
+)
+
+# Number of bytes needed to recognize any of the SIGNATURES
+SIGNATURE_SIZE = max(len(signature) for signature, _ in SIGNATURES)
+
+# The HDF5 signature may instead follow a user block of 512 bytes, or any
+# larger power of two. User blocks of up to this size are looked past.
+MAX_USER_BLOCK_SIZE = 64 * 1024
+
+# Magic number at the start of classic format files, followed by a version byte
+CLASSIC_MAGIC = b'CDF'
+
+# Version bytes of the classic format variants
+CLASSIC_VERSIONS = {
+    1: 'NETCDF3_CLASSIC',
+    2: 'NETCDF3_64BIT_OFFSET',
+    5: 'NETCDF3_64BIT_DATA',
+}
+
+# Tags of the lists within a classic format header
+NC_DIMENSION = 0x0A
+NC_VARIABLE = 0x0B
+NC_ATTRIBUTE = 0x0C
+
+# Size (in bytes) of each of the classic format nc_type values
+NC_TYPE_SIZES = {
+    1: 1,   # NC_BYTE
+    2: 1,   # NC_CHAR
+    3: 2,   # NC_SHORT
+    4: 4,   # NC_INT
+    5: 4,   # NC_FLOAT
+    6: 8,   # NC_DOUBLE
+    7: 1,   # NC_UBYTE
+    8: 2,   # NC_USHORT
+    9: 4,   # NC_UINT
+    10: 8,  # NC_INT64
+    11: 8,  # NC_UINT64
+}
+
+
+class UnknownFormatError(ValueError):
+    """Raised when data is not in any of the supported formats."""
+
+
+class IncompleteHeader(Exception):
+    """Raised when more data is needed to read a complete header."""
+
+
+class ClassicHeaderReader(object):
+    """
+    Reads through the header of a classic format file, as laid out in
+    https://docs.unidata.ucar.edu/netcdf-c/current/file_format_specifications.html
+    """
+    def __init__(self, data):
+        """
+        @param data bytes-like object of (at least) the start of the file
+        @raises ValueError if data is not the start of a classic format file
+        """
+        if len(data) >= 4 and (bytes(data[:3]) != CLASSIC_MAGIC or data[3] not in CLASSIC_VERSIONS):
+            raise ValueError('Not a netCDF classic format file')
+
+        self.data = data
+        self.position = 4
+        version = data[3] if len(data) >= 4 else None
+        # Counts and lengths are 64-bit in the 64-bit data variant
+        self.non_neg_size = 8 if version == 5 else 4
+        # As are file offsets, in both 64-bit variants
+        self.offset_size = 4 if version == 1 else 8
+
+    def read_int(self, size):
+        end = self.position + size
+
+        if end > len(self.data):
+            raise IncompleteHeader()
+
+        value = int.from_bytes(self.data[self.position:end], 'big')
+        self.position = end
+
+        return value
+
+    def read_non_neg(self):
+        return self.read_int(self.non_neg_size)
+
+    def skip(self, size):
+        # Values are padded to a multiple of 4 bytes
+        self.position += size + (-size % 4)
+
+        if self.position > len(self.data):
+            raise IncompleteHeader()
+
+    def read_list(self, expected_tag, read_element):
+        tag = self.read_int(4)
+        count = self.read_non_neg()
+
+        if tag == 0 and count == 0:
+            # ABSENT
+            return
+
+        if tag != expected_tag:
+            raise ValueError(f'Invalid netCDF classic format header, unexpected tag {tag}')
+
+        for _ in range(count):
+            read_element()
+
+    def read_name(self):
+        self.skip(self.read_non_neg())
+
+    def read_dimension(self):
+        self.read_name()
+        self.read_non_neg()
+
+    def read_attribute(self):
+        self.read_name()
+        nc_type = self.read_int(4)
+
+        if nc_type not in NC_TYPE_SIZES:
+            raise ValueError(f'Invalid netCDF classic format header, unknown type {nc_type}')
+
+        self.skip(self.read_non_neg() * NC_TYPE_SIZES[nc_type])
+
+    def read_variable(self):
+        self.read_name()
+
+        for _ in range(self.read_non_neg()):
+            # dimension IDs
+            self.read_non_neg()
+
+        self.read_list(NC_ATTRIBUTE, self.read_attribute)
+        self.read_int(4)  # nc_type
+        self.read_non_neg()  # vsize
+        self.read_int(self.offset_size)  # begin
+
+    def read_header(self):
+        """
+        Reads through the whole header.
+
+        @return the size of the header in bytes
+        @raises IncompleteHeader if data ends before the header does
+        @raises ValueError if the header is invalid
+        """
+        if len(self.data) < 4:
+            raise IncompleteHeader()
+
+        self.read_non_neg()  # numrecs
+        self.read_list(NC_DIMENSION, self.read_dimension)
+        self.read_list(NC_ATTRIBUTE, self.read_attribute)
+        self.read_list(NC_VARIABLE, self.read_variable)
+
+        return self.position
+
+
+def is_classic_format(data):
+    """
+    Checks whether data is the start of a netCDF classic format file.
+
+    @param data at least the first 4 bytes of a file
+    @return True if data starts with the magic number of a classic format file
+    """
+    return bytes(data[:3]) == CLASSIC_MAGIC and len(data) >= 4 and data[3] in CLASSIC_VERSIONS
+
+
+def classic_header_size(data):
+    """
+    Gets the size of the header of a netCDF classic format file.
+
+    @param data bytes-like object of (at least) the start of the file
+    @return the size of the header in bytes, or None if data ends before the
+            header does
+    @raises ValueError if data is not a valid classic format file
+    """
+    try:
+        return ClassicHeaderReader(data).read_header()
+    except IncompleteHeader:
+        return None
+
+
+def sniff_format(data, complete=False, formats=DATASET_FORMATS + COMPRESSION_FORMATS):
+    """
+    Recognizes the format of a file from its magic number.
+
+    HDF5 files are recognized after a user block of up to MAX_USER_BLOCK_SIZE
+    bytes, so up to that much data may be needed to rule them out.
+
+    @param data bytes-like object of (at least) the start of the file
+    @param complete whether data is the whole file, rather than just its start
+    @param formats formats to recognize, anything else is rejected
+    @return the name of the format (one of formats), or None if more data is
+            needed to tell
+    @raises UnknownFormatError if data is not in any of the formats
+    """
+    head = bytes(data[:SIGNATURE_SIZE])
+    format_name = None
+
+    if is_classic_format(head):
+        format_name = NETCDF3
+    else:
+        for signature, name in SIGNATURES:
+            if head.startswith(signature):
+                format_name = name
+                break
+
+    if format_name is None and HDF5 in formats:
+        user_block_size = 512
+
+        while format_name is None and user_block_size <= MAX_USER_BLOCK_SIZE:
+            if len(data) < user_block_size + SIGNATURE_SIZE:
+                if not complete:
+                    return None
+                break
+
+            if bytes(data[user_block_size:user_block_size + SIGNATURE_SIZE]) == SIGNATURES[0][0]:
+                format_name = HDF5
+
+            user_block_size *= 2
+
+    if format_name is None and len(data) < SIGNATURE_SIZE and not complete:
+        return None
+
+    if format_name not in formats:
+        if format_name is not None:
+            raise UnknownFormatError(f'{format_name} files are not supported')
+
+        raise UnknownFormatError('contents are not recognized as netCDF, HDF or compressed data')
+
+    return format_name
@@ -0,0 +1,196 @@
+"""
+============
+job_utils.py
+============
+
+Background jobs for running checkers asynchronously (see the /jobs endpoints).
+
+Each MCC process runs the jobs submitted to it on a bounded pool of worker
+threads, so long-running checks do not tie up the threads serving requests.
+The status and report of every job are kept within a SQLite database, so
+that any of the MCC processes can report on any job.
+"""
+
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import abort
+from werkzeug.exceptions import HTTPException
+
+from .cache_utils import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue(SQLiteStore):
+    """
+    Queue of jobs to run on a pool of worker threads, with their status and
+    results tracked in a SQLite database shared by all MCC processes.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETE = 'complete'
+    FAILED = 'failed'
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS jobs ('
+        '    id TEXT PRIMARY KEY,'
+        '    status TEXT NOT NULL,'
+        '    pid INTEGER NOT NULL,'
+        '    selected_checkers TEXT NOT NULL,'
+        '    error TEXT,'
+        '    report BLOB,'
+        '    created REAL NOT NULL,'
+        '    updated REAL NOT NULL'
+        ')',
+        'CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated)',
+    )
+
+    def __init__(self, path, workers, queue_size, retention):
+        """
+        @param path location of the SQLite database file (created if need be)
+        @param workers number of jobs to run at once within this process
+        @param queue_size number of jobs that may wait to run within this
+                          process before new jobs are turned away
+        @param retention number of seconds to keep finished jobs for
+        """
+        super().__init__(path)
+
+        self.workers = workers
+        self.queue_size = queue_size
+        self.retention = retention
+        self.executor = None
+        self.unfinished = 0
+        self.lock = threading.Lock()
+
+    def submit(self, function, *args, selected_checkers=None):
+        """
+        Queues a new job.
+
+        @param function the function to run, which returns the report of the job
+        @param args arguments to call function with
+        @param selected_checkers dict of the checker versions/parameters selected
+                                 for the job, kept for presenting its report
+        @return the ID of the new job
+        """
+        with self.lock:
+            if self.unfinished >= self.workers + self.queue_size:
+                return abort(503, 'Too many jobs are waiting to run, please try again later.')
+
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='mcc-job')
+
+            self.unfinished += 1
+
+        self.purge()
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        self._connect().execute(
+            'INSERT INTO jobs (id, status, pid, selected_checkers, created, updated) VALUES (?, ?, ?, ?, ?, ?)',
+            (job_id, self.QUEUED, os.getpid(), json.dumps(selected_checkers or {}), now, now)
+        )
+
+        self.executor.submit(self._run, job_id, function, args)
+
+        return job_id
+
+    def _run(self, job_id, function, args):
+        self._update(job_id, self.RUNNING)
+
+        try:
+            report = function(*args)
+            self._update(job_id, self.COMPLETE, report=pickle.dumps(report, pickle.HIGHEST_PROTOCOL))
+        except HTTPException as err:
+            self._update(job_id, self.FAILED, error=err.description)
+        except Exception as err:
+            logger.exception("Job %s failed", job_id)
+            self._update(job_id, self.FAILED, error=str(err))
+        finally:
+            with self.lock:
+                self.unfinished -= 1
+
+    def _update(self, job_id, status, error=None, report=None):
+        self._connect().execute(
+            'UPDATE jobs SET status = ?, error = ?, report = ?, updated = ? WHERE id = ?',
+            (status, error, report, time.time(), job_id)
+        )
+
+    def get(self, job_id):
+        """
+        Gets the details of a job.
+
+        Jobs that were left unfinished by an MCC process that has since exited
+        (e.g. when it was restarted) are reported as failed.
+
+        @param job_id ID of the job
+        @return dict of the job 'id', 'status', 'error' (if failed),
+                'selected_checkers', and 'created'/'updated' times,
+                or None if there is no such job
+        """
+        row = self._connect().execute(
+            'SELECT id, status, pid, selected_checkers, error, created, updated FROM jobs WHERE id = ?', (job_id,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        job = dict(zip(('id', 'status', 'pid', 'selected_checkers', 'error', 'created', 'updated'), row))
+        job['selected_checkers'] = json.loads(job['selected_checkers'])
+        pid = job.pop('pid')
+
+        if job['status'] in (self.QUEUED, self.RUNNING) and not process_exists(pid):
+            job['status'] = self.FAILED
+            job['error'] = 'The job was interrupted, please submit it again.'
+            self._update(job_id, job['status'], error=job['error'])
+
+        return job
+
+    def get_report(self, job_id):
+        """
+        Gets the report of a completed job.
+
+        @param job_id ID of the job
+        @return the report returned by the function of the job, or None if the
+                job has not completed
+        """
+        row = self._connect().execute(
+            'SELECT report FROM jobs WHERE id = ? AND status = ?', (job_id, self.COMPLETE)
+        ).fetchone()
+
+        return pickle.loads(row[0]) if row is not None else None
+
+    def purge(self):
+        """Removes the jobs that finished more than retention seconds ago."""
+        self._connect().execute(
+            'DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?',
+            (self.COMPLETE, self.FAILED, time.time() - self.retention)
+        )
+
+
+def process_exists(pid):
+    """
+    Checks whether a process is still running.
+
+    @param pid ID of the process
+    @return True if the process exists
+    """
+    if pid == os.getpid():
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists, it just belongs to someone else
+        pass
+
+    return True
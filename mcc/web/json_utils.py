@@ -3,16 +3,31 @@
 json_utils.py
 =============
 
-Contains a custom JSON encoding function for non-primitive Python types.
+Contains a custom JSON encoding function for non-primitive Python types, and
+the normalization of check results for the compact JSON report format.
 
 """
 
+import hashlib
+import json
 from collections import deque
 
 import numpy as np
 from flask.json import JSONEncoder
 
-from checker.base import Result
+from checker.base import Group, Result
+
+# Version of the compact JSON report format, given as its "format_version"
+COMPACT_FORMAT_VERSION = 2
+
+# Keys of a group of results that are given with each group, rather than
+# within its attributes
+GROUP_FIELDS = ('passed', 'total', 'message')
+
+# Keys of a group of results that are left out of the compact format altogether
+# ('parent' is only the repr of the parent Group, and 'hash' is replaced by the
+# group's id)
+GROUP_BLACKLIST = frozenset(['results', 'parent', 'hash']).union(GROUP_FIELDS)
 
 
 class CustomJSONEncoder(JSONEncoder):
@@ -22,7 +37,10 @@ class CustomJSONEncoder(JSONEncoder):
     """
     def default(self, obj):
         if isinstance(obj, Result):
-            return vars(obj)
+            return obj.as_dict()
+        if isinstance(obj, Group):
+            # i.e. the parent of a group of results
+            return obj.name
         if isinstance(obj, deque):
             return [x for x in obj]
         if isinstance(obj, np.integer):
@@ -40,3 +58,72 @@ class CustomJSONEncoder(JSONEncoder):
             return JSONEncoder.default(self, obj)
         except TypeError:
             return str(obj)
+
+
+def get_content_id(attributes):
+    """
+    Gets an ID for a dict of attributes, that is the same for the same
+    attributes in every report.
+
+    @param attributes dict of JSON-encodable attributes
+    @return a str of 12 hex digits
+    """
+    data = json.dumps(attributes, sort_keys=True, cls=CustomJSONEncoder)
+
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=6).hexdigest()
+
+
+def compact_results(results):
+    """
+    Normalizes the results of CheckSuites, so that the attributes of each
+    Blueprint and group of results are given once, rather than repeated within
+    every result.
+
+    Groups are replaced by a dict of their 'group' ID, scores and 'results',
+    and Results by a dict of their 'blueprint' ID and the attributes held by
+    the Result itself. IDs are derived from the attributes they stand for (see
+    get_content_id()), so are the same from one report to the next, and
+    groups or Blueprints with the same attributes share the same ID.
+
+    @param results list of the results of each CheckSuite
+    @return a dict of the compacted 'results', and the attributes of the
+            'blueprints' and 'groups' they refer to, keyed by ID
+    """
+    blueprints = {}
+    blueprint_ids = {}
+    groups = {}
+
+    def compact(result):
+        if isinstance(result, Result):
+            blueprint_id = blueprint_ids.get(id(result.blueprint))
+
+            if blueprint_id is None:
+                attributes = {
+                    key: value for key, value in vars(result.blueprint).items()
+                    if key not in Result.BLACKLIST and key != 'parent'
+                }
+                blueprint_id = blueprint_ids[id(result.blueprint)] = get_content_id(attributes)
+                blueprints[blueprint_id] = attributes
+
+            ret = {'blueprint': blueprint_id}
+            ret.update(result.fields())
+
+            return ret
+
+        attributes = {key: value for key, value in result.items() if key not in GROUP_BLACKLIST}
+        group_id = get_content_id(attributes)
+        groups[group_id] = attributes
+
+        ret = {'group': group_id}
+        ret.update((key, result[key]) for key in GROUP_FIELDS if key in result)
+
+        if 'results' in result:
+            ret['results'] = [compact(item) for item in result['results']]
+
+        return ret
+
+    return {
+        'results': [compact(suite_results) for suite_results in results],
+        'blueprints': blueprints,
+        'groups': groups,
+    }
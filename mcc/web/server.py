@@ -10,16 +10,23 @@ Flask server front end for the MCC service.
 import time
 from os import environ
 from os.path import join
+from tempfile import gettempdir
 
 import pdfkit
-from flask import Flask, render_template, request, abort, jsonify, make_response
+from flask import Flask, render_template, request, abort, jsonify, make_response, url_for
 
 from checker.acdd import ACDD
 from checker.cf_shim import CF
 from checker.gds2 import GDS2
-from .file_utils import format_byte_size, get_dataset_from_file
+from checker.snapshot import DatasetSnapshot
+from checker.standard_names import STANDARD_NAME_TABLES
+from checker.units import get_unit_cache_info
+from .cache_utils import ReportCache
+from .file_utils import UploadRequest, format_byte_size, get_upload_from_file, open_upload_dataset
 from .form_utils import parse_post_arguments
-from .json_utils import CustomJSONEncoder
+from .job_utils import JobQueue
+from .suite_utils import WorkerCrashedError, get_pool, get_source
+from .json_utils import COMPACT_FORMAT_VERSION, CustomJSONEncoder, compact_results
 
 app = Flask(__name__)
 
@@ -30,15 +37,76 @@ app.jinja_env.lstrip_blocks = True
 # The JSON encoder in use when we call flask.jsonify()
 app.json_encoder = CustomJSONEncoder
 
+# Stream file uploads straight to disk, hashing them as they arrive
+app.request_class = UploadRequest
+
 # Maximum allowed file size. Typically defaults to 2-4GB.
 app.config['MAX_CONTENT_LENGTH'] = int(environ['MaxFileSize'])
 
+# Location to write temporary (uploaded and decompressed) files to.
+# Defaults to the system temp directory if not configured.
+app.config['TempFileLocation'] = environ.get('TempFileLocation') or None
+
+# Uploaded (or decompressed) files up to this size are kept in memory and
+# opened directly from their buffer rather than from a temporary file on disk.
+# Set to 0 to always use temporary files.
+app.config['InMemoryFileSize'] = int(environ.get('InMemoryFileSize') or 100000000)
+
+# Number of processes to decompress large bzip2 (and multi-member gzip) uploads
+# with. Defaults to 1, which decompresses them serially.
+app.config['DecompressProcesses'] = int(environ.get('DecompressProcesses') or 1)
+
+# Number of checker worker processes (per MCC process) to run the suites that
+# read variable data (CF) in, alongside the other selected suites. Defaults to
+# 1, which runs all of the selected suites one after another within the MCC
+# process.
+app.config['SuiteProcesses'] = int(environ.get('SuiteProcesses') or 1)
+
+# Number of suites each checker worker process runs, and the memory usage (its
+# resident set size, in bytes) it may grow to, before it is replaced by a new
+# process. Set to 0 for no limit.
+app.config['SuiteWorkerTasks'] = int(environ.get('SuiteWorkerTasks') or 100) or None
+app.config['SuiteWorkerMemory'] = int(environ.get('SuiteWorkerMemory') or 2000000000) or None
+
+# Number of seconds a checker worker process may take to run a suite, after
+# which it is killed (and replaced), and the suite fails. Set to 0 for no limit.
+app.config['SuiteWorkerTimeout'] = int(environ.get('SuiteWorkerTimeout') or 3600) or None
+
+# Largest number of decompressed bytes to allow per compressed byte of an
+# upload, beyond which it is rejected as a 'zip bomb'. Set to 0 for no limit.
+app.config['MaxCompressionRatio'] = int(environ.get('MaxCompressionRatio') or 1000) or None
+
+# Whether to only decompress the header of compressed netCDF classic format
+# uploads until a checker needs the rest of the file. Set to 0 to always
+# decompress the whole file as it is received.
+app.config['MetadataOnlyIngest'] = bool(int(environ.get('MetadataOnlyIngest') or 1))
+
 # URL to use for MCC homepage.
 app.config['HomepageURL'] = environ['HomepageURL']
 
 # Venue that MCC is deployed to (SIT, UAT, or OPS)
 app.config['Venue'] = str(environ['Venue'])
 
+# Location of the SQLite database that caches reports of previously checked
+# files, shared by all MCC processes. Caching is disabled if not configured.
+app.config['ReportCacheLocation'] = environ.get('ReportCacheLocation') or None
+
+# Maximum total size (in bytes) of the cached reports, beyond which the least
+# recently used reports are evicted.
+app.config['ReportCacheSize'] = int(environ.get('ReportCacheSize') or 1000000000)
+
+# Location of the SQLite database that tracks jobs submitted to /jobs (and
+# holds their reports), shared by all MCC processes.
+app.config['JobLocation'] = environ.get('JobLocation') or join(gettempdir(), 'mcc_jobs.sqlite')
+
+# Number of jobs each MCC process runs at once, and the number of jobs each
+# may have waiting to run before new jobs are turned away.
+app.config['JobWorkers'] = int(environ.get('JobWorkers') or 2)
+app.config['JobQueueSize'] = int(environ.get('JobQueueSize') or 20)
+
+# Number of seconds that jobs (and their reports) are kept for once finished.
+app.config['JobRetention'] = int(environ.get('JobRetention') or 86400)
+
 # Mapping of checker short names to CheckSuite implementations.
 # This could be easily kept up-to-date by inspection of a module, but
 # prefer the explicit writing of current checkers.
@@ -53,6 +121,17 @@ with open('/var/www/html/mcc/web/VERSION', 'r') as f:
     version_file = f.read().rstrip()
     mcc_version = version_file
 
+# Cache of reports, keyed by the MD5 hash of the checked file
+if app.config['ReportCacheLocation']:
+    report_cache = ReportCache(app.config['ReportCacheLocation'], app.config['ReportCacheSize'], mcc_version)
+else:
+    report_cache = None
+
+# Queue of jobs submitted to /jobs, which are run in the background
+job_queue = JobQueue(
+    app.config['JobLocation'], app.config['JobWorkers'], app.config['JobQueueSize'], app.config['JobRetention']
+)
+
 
 # Error handlers for select HTTP Response Codes.
 # The rest are the default. Note, these may be overridden if an error occurs in
@@ -60,7 +139,7 @@ with open('/var/www/html/mcc/web/VERSION', 'r') as f:
 # Apache will instead, meaning the page will not be styled or templated.
 @app.errorhandler(413)
 def req_entity_too_large(err):
-    if request.form.get('response') in ('html', 'pdf'):
+    if request.values.get('response') in ('html', 'pdf'):
         ret = render_template(
             'error.html',
             error='File upload too large',
@@ -81,7 +160,7 @@ def req_entity_too_large(err):
 
 @app.errorhandler(500)
 def internal_server_error(err):
-    if request.form.get('response') in ('html', 'pdf'):
+    if request.values.get('response') in ('html', 'pdf'):
         ret = render_template(
             'error.html',
             error='Unable to read file',
@@ -102,7 +181,7 @@ def internal_server_error(err):
 
 @app.errorhandler(404)
 def page_not_found(err):
-    if request.form.get('response') in ('html', 'pdf'):
+    if request.values.get('response') in ('html', 'pdf'):
         ret = render_template(
             'error.html',
             error='404 Page Not Found',
@@ -123,7 +202,7 @@ def page_not_found(err):
 
 @app.errorhandler(400)
 def bad_request(err):
-    if request.form.get('response') in ('html', 'pdf'):
+    if request.values.get('response') in ('html', 'pdf'):
         ret = render_template(
             'error.html',
             error='There was a problem with your request',
@@ -151,6 +230,118 @@ def check():
     @return rendered template of results or an error page if not form properly
             filled out with values / proper datasets
     """
+    info = parse_check_request()
+    entries = get_cached_entries(info)
+    report = run_checks(info, entries)
+
+    return render_report(info['response'], info['selected_checkers'], report)
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Takes a request with the same form as /check, and queues the requested
+    tests to run in the background.
+
+    @return JSON description of the new job, including the URLs to poll for
+            its status and to get its report from
+    """
+    info = parse_check_request()
+
+    try:
+        entries = get_cached_entries(info)
+
+        if info['upload'] is not None:
+            # The upload needs to outlive this request, which closes its files
+            info['upload']['datafile'] = info['upload']['datafile'].detach()
+
+        job_id = job_queue.submit(run_job, info, entries, selected_checkers=info['selected_checkers'])
+    except BaseException:
+        if info['upload'] is not None:
+            info['upload']['datafile'].close()
+        raise
+
+    response = jsonify(describe_job(job_queue.get(job_id)))
+    response.status_code = 202
+    response.headers['Location'] = url_for('job_status', job_id=job_id)
+
+    return response
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """
+    Reports the status of a job submitted to /jobs.
+
+    @param job_id ID of the job
+    @return JSON description of the job
+    """
+    job = job_queue.get(job_id)
+
+    if job is None:
+        return abort(404, f'No job with ID {job_id} was found, it may have expired.')
+
+    return jsonify(describe_job(job))
+
+
+@app.route('/jobs/<job_id>/report')
+def job_report(job_id):
+    """
+    Returns the report of a completed job, in the format given by the "response"
+    query parameter (html, json, json-compact or pdf, defaults to json).
+
+    @param job_id ID of the job
+    @return rendered report, or the JSON description of the job (with a 202
+            status code) if it has not completed yet
+    """
+    job = job_queue.get(job_id)
+
+    if job is None:
+        return abort(404, f'No job with ID {job_id} was found, it may have expired.')
+
+    if job['status'] == JobQueue.FAILED:
+        return abort(500, job['error'])
+
+    if job['status'] != JobQueue.COMPLETE:
+        response = jsonify(describe_job(job))
+        response.status_code = 202
+        return response
+
+    return render_report(
+        request.args.get('response', 'json').lower(), job['selected_checkers'], job_queue.get_report(job_id)
+    )
+
+
+def describe_job(job):
+    """
+    Gets the publicly visible details of a job.
+
+    @param job dict of job details from JobQueue.get()
+    @return dict of the job 'id', 'status', 'error' (if failed), and the URLs
+            of its 'status_url' and 'report_url'
+    """
+    return {
+        'id': job['id'],
+        'status': job['status'],
+        'error': job['error'],
+        'selected_checkers': job['selected_checkers'],
+        'created': job['created'],
+        'updated': job['updated'],
+        'status_url': url_for('job_status', job_id=job['id']),
+        'report_url': url_for('job_report', job_id=job['id']),
+    }
+
+
+def parse_check_request():
+    """
+    Parses and validates the form of a /check (or /jobs) request, and spools
+    its file upload.
+
+    @return a dict of the parsed POST arguments (see parse_post_arguments),
+            plus the 'selected_checkers' versions/parameters, the spooled
+            'upload' (None if only an MD5 hash was provided), and the 'hash'
+            of the file
+    """
     request_dict = request.form
 
     app.logger.info("UPLOAD REQUEST: %s", request.form)
@@ -159,7 +350,7 @@ def check():
     if 'response' not in request_dict:
         return abort(
             400, 'You need to include "response" in the request body and '
-                 'assign the desired response type ("html", "json", or "pdf").'
+                 'assign the desired response type ("html", "json", "json-compact", or "pdf").'
         )
 
     selected_checkers = {}
@@ -167,6 +358,9 @@ def check():
     if request_dict.get('ACDD') == 'on':
         selected_checkers['ACDD-version'] = request_dict.get('ACDD-version') or ACDD.DEFAULT_VERSION
 
+        if request_dict.get('ACDD-standard-name-table'):
+            selected_checkers['ACDD-standard-name-table'] = request_dict.get('ACDD-standard-name-table')
+
     if request_dict.get('CF') == 'on':
         selected_checkers['CF-version'] = request_dict.get('CF-version') or CF.DEFAULT_VERSION
 
@@ -176,89 +370,257 @@ def check():
     info = parse_post_arguments(request.form, request.files, CHECKERS)
     app.logger.info("PARSED POST ARGUMENTS: %s", info)
 
-    # read data in from the open file handle
-    ds = get_dataset_from_file(info['file'])
+    if info['response'] not in ('json', 'json-compact', 'html', 'pdf'):
+        return abort(
+            400, 'Invalid value for "response". Accepted response types are "html", "json", "json-compact", and "pdf".'
+        )
+
+    # Spool the upload (if any), which hashes it without opening it, so that
+    # previously generated reports can be taken from the cache instead
+    info['selected_checkers'] = selected_checkers
+    info['upload'] = get_upload_from_file(info['file']) if info['file'] is not None else None
+    info['hash'] = info['upload']['hash'] if info['upload'] is not None else info['md5']
+
+    return info
 
-    # this is only used for the output report
-    ds_data_model = ds['dataset'].data_model
 
-    # For all the selected checker objects, run their run() method on the dataset,
-    # as processed by NETCDF4
-    checkers = info['checkers']
-    results = []
+def get_cached_entries(info):
+    """
+    Looks up the cached reports for each of the selected checkers.
 
-    for checker in checkers:
-        app.logger.info("Running Checker %s (%s)", checker.name, checker.version)
+    @param info dict returned by parse_check_request()
+    @return a list of the cached report entries (or None where there isn't
+            one) of each of info['checkers']
+    """
+    entries = [report_cache.get(info['hash'], checker) if report_cache else None for checker in info['checkers']]
 
-        start = time.time()
-        results.append(checker.run(ds['dataset']))
-        end = time.time()
+    if info['upload'] is None and None in entries:
+        return abort(
+            404, f'No report is available for the file with MD5 hash {info["hash"]} and the selected '
+                 f'checkers. Please include the file with your request.'
+        )
+
+    return entries
+
+
+def run_checks(info, entries):
+    """
+    Runs each of the selected checkers that does not have a cached report
+    against the uploaded file. The upload (and its Dataset) are closed once done.
+
+    Suites that only read metadata run against a snapshot of it, which is read
+    once for all of them. If no other suite needs the file, it is closed as
+    soon as the snapshot has been taken. Otherwise, when SuiteProcesses allows,
+    the suites that read the file itself run in checker worker processes (at
+    the same time as the others), which open the file for themselves.
+
+    @param info dict returned by parse_check_request()
+    @param entries list returned by get_cached_entries()
+    @return dict of the 'filename', 'hash', 'size' and data 'model' of the
+            checked file, and the 'results' of each CheckSuite
+    """
+    upload = info['upload']
+    dataset = None
+    snapshot = None
+    futures = {}
+    uncached_checkers = [checker for index, checker in enumerate(info['checkers']) if entries[index] is None]
+    # Suites that only read metadata can run against just the header of the file
+    metadata_only = all(checker.METADATA_ONLY for checker in uncached_checkers)
+    # Suites that read the file run in checker worker processes, if enabled
+    parallel = app.config['SuiteProcesses'] > 1 and not metadata_only
+    check_start = time.time()
+
+    def add_entry(index, checker, results, start, end):
+        entries[index] = {
+            'results': results,
+            'filename': upload['filename'],
+            'size': upload['size'],
+            # this is only used for the output report
+            'model': model,
+        }
 
         app.logger.info(
-            "Checker %s (%s) completed in %.3f seconds", checker.name, checker.version, end - start
+            "Checker %s (%s) completed in %.3f seconds (%.3f to %.3f seconds into the check)",
+            checker.name, checker.version, end - start, start - check_start, end - check_start
         )
 
-    # Formulate the response payload
-    with ds['dataset']:  # ensure the NetCDF4 Dataset is closed once we're done here
-        if info['response'] == 'json':
-            response = jsonify(
-                {
-                    'mcc_version': mcc_version,
-                    'selected_checkers': selected_checkers,
-                    'fn': ds['filename'],
-                    'md5': ds['hash'],
-                    'size': ds['size'],
-                    'model': ds_data_model,
-                    'results': results,
-                }
-            )
-        elif info['response'] == 'html':
-            response = render_template(
-                'results.html',
-                selected_checkers=selected_checkers,
-                results=results,
-                fn=ds['filename'],
-                hash=ds['hash'],
-                size=ds['size'],
-                model=ds_data_model,
-                homepage_url=app.config['HomepageURL'],
-                mcc_version=str(mcc_version)
-            )
-        elif info['response'] == 'pdf':
-            print_styles_css_path = join('static', 'css', 'print-styles.css')
-
-            html = render_template(
-                'results_pdf.html',
-                selected_checkers=selected_checkers,
-                results=results,
-                fn=ds['filename'],
-                hash=ds['hash'],
-                size=ds['size'],
-                model=ds_data_model,
-                mcc_version=str(mcc_version),
-                homepage_url=app.config['HomepageURL'],
-                print_styles_css_path=print_styles_css_path
+        if report_cache:
+            report_cache.put(info['hash'], checker, entries[index])
+
+    try:
+        if uncached_checkers:
+            # The upload is kept for the worker processes to open themselves
+            dataset = open_upload_dataset(upload, metadata_only=metadata_only, close=not parallel)
+            model = dataset.data_model
+
+            if any(checker.METADATA_ONLY for checker in uncached_checkers):
+                snapshot = DatasetSnapshot(dataset)
+
+            if parallel:
+                source = get_source(upload['datafile'])
+                pool = get_pool(
+                    app.config['SuiteProcesses'], app.config['SuiteWorkerTasks'], app.config['SuiteWorkerMemory'],
+                    app.config['SuiteWorkerTimeout']
+                )
+
+                for index, checker in enumerate(info['checkers']):
+                    if entries[index] is None and not checker.METADATA_ONLY:
+                        app.logger.info("Running Checker %s (%s) in a worker process", checker.name, checker.version)
+                        futures[index] = pool.submit(checker, source, upload['filename'])
+
+            if metadata_only or parallel:
+                # Nothing else needs this Dataset beyond the snapshot, so close it early
+                dataset.close()
+                dataset = None
+
+            if metadata_only:
+                upload['datafile'].close()
+
+        # For all the selected checker objects without a cached report, run
+        # their run() method on the dataset, as processed by NETCDF4
+        for index, checker in enumerate(info['checkers']):
+            if index in futures:
+                continue
+
+            if entries[index] is not None:
+                app.logger.info("Using cached report for Checker %s (%s)", checker.name, checker.version)
+                continue
+
+            app.logger.info("Running Checker %s (%s)", checker.name, checker.version)
+
+            start = time.time()
+            results = checker.run(snapshot if checker.METADATA_ONLY else dataset)
+            add_entry(index, checker, results, start, time.time())
+
+        if uncached_checkers:
+            app.logger.info(
+                "Unit cache: %(hits)d hits, %(misses)d misses, %(size)d of %(max_size)d units", get_unit_cache_info()
             )
 
-            options = {
-                'page-size': 'Letter',
-                'margin-top': '0.5in',
-                'margin-right': '0.5in',
-                'margin-bottom': '0.5in',
-                'margin-left': '0.5in',
-                'enable-local-file-access': None,
-                'quiet': ''
+        # Then merge in the results from the worker processes, in order
+        for index, future in futures.items():
+            try:
+                add_entry(index, info['checkers'][index], *future.result())
+            except WorkerCrashedError as err:
+                return abort(500, f"Error processing file {upload['filename']}, reason: {str(err)}.")
+    finally:
+        for future in futures.values():
+            future.cancel()
+
+        # ensure the upload and NetCDF4 Dataset are closed once we're done here
+        if upload is not None:
+            upload['datafile'].close()
+
+        if dataset is not None:
+            dataset.close()
+
+    return {
+        'filename': upload['filename'] if upload is not None else entries[0]['filename'],
+        'hash': info['hash'],
+        'size': entries[0]['size'],
+        'model': entries[0]['model'],
+        'results': [entry['results'] for entry in entries],
+    }
+
+
+def run_job(info, entries):
+    """
+    Runs the checks of a job submitted to /jobs, within an application context
+    of its own (the worker threads of the job queue are outside of any request).
+
+    @param info dict returned by parse_check_request()
+    @param entries list returned by get_cached_entries()
+    @return the report returned by run_checks()
+    """
+    with app.app_context():
+        return run_checks(info, entries)
+
+
+def render_report(response_type, selected_checkers, report):
+    """
+    Formulates the response payload for the results of a check.
+
+    @param response_type one of "json", "json-compact", "html" or "pdf"
+    @param selected_checkers dict of the selected checker versions/parameters,
+                             keyed by e.g. "ACDD-version"
+    @param report dict of the 'filename', 'hash', 'size' and data 'model' of
+                  the checked file, and the 'results' of each CheckSuite
+    @return the response for the report
+    """
+    if response_type == 'json':
+        response = jsonify(
+            {
+                'mcc_version': mcc_version,
+                'selected_checkers': selected_checkers,
+                'fn': report['filename'],
+                'md5': report['hash'],
+                'size': report['size'],
+                'model': report['model'],
+                'results': report['results'],
             }
+        )
+    elif response_type == 'json-compact':
+        # The attributes of each Blueprint and group are given once, rather
+        # than within every result
+        response = jsonify(
+            {
+                'format_version': COMPACT_FORMAT_VERSION,
+                'mcc_version': mcc_version,
+                'selected_checkers': selected_checkers,
+                'fn': report['filename'],
+                'md5': report['hash'],
+                'size': report['size'],
+                'model': report['model'],
+                **compact_results(report['results']),
+            }
+        )
+    elif response_type == 'html':
+        response = render_template(
+            'results.html',
+            selected_checkers=selected_checkers,
+            results=report['results'],
+            fn=report['filename'],
+            hash=report['hash'],
+            size=report['size'],
+            model=report['model'],
+            homepage_url=app.config['HomepageURL'],
+            mcc_version=str(mcc_version)
+        )
+    elif response_type == 'pdf':
+        print_styles_css_path = join('static', 'css', 'print-styles.css')
+
+        html = render_template(
+            'results_pdf.html',
+            selected_checkers=selected_checkers,
+            results=report['results'],
+            fn=report['filename'],
+            hash=report['hash'],
+            size=report['size'],
+            model=report['model'],
+            mcc_version=str(mcc_version),
+            homepage_url=app.config['HomepageURL'],
+            print_styles_css_path=print_styles_css_path
+        )
 
-            pdf = pdfkit.from_string(html, False, options=options)
+        options = {
+            'page-size': 'Letter',
+            'margin-top': '0.5in',
+            'margin-right': '0.5in',
+            'margin-bottom': '0.5in',
+            'margin-left': '0.5in',
+            'enable-local-file-access': None,
+            'quiet': ''
+        }
 
-            response = make_response(pdf)
-            response.headers["Content-Disposition"] = f'attachment;filename={ds["filename"]}_metadata_compliance_report.pdf'
-            response.mimetype = 'application/pdf'
-        else:
-            return abort(
-                400, 'Invalid value for "response". Accepted response types are "html", "json", and "pdf".'
-            )
+        pdf = pdfkit.from_string(html, False, options=options)
+
+        response = make_response(pdf)
+        response.headers["Content-Disposition"] = f'attachment;filename={report["filename"]}_metadata_compliance_report.pdf'
+        response.mimetype = 'application/pdf'
+    else:
+        return abort(
+            400, 'Invalid value for "response". Accepted response types are "html", "json", "json-compact", and "pdf".'
+        )
 
     return response
 
@@ -272,7 +634,8 @@ def about_api():
     return render_template(
         'about_api.html',
         max_size=format_byte_size(app.config['MAX_CONTENT_LENGTH'],),
-        homepage_url=app.config['HomepageURL']
+        homepage_url=app.config['HomepageURL'],
+        standard_name_tables=list(STANDARD_NAME_TABLES)
     )
 
 
@@ -0,0 +1,306 @@
+"""
+==============
+suite_utils.py
+==============
+
+Runs CheckSuites in a pool of checker worker processes.
+
+Suites that read variable data (i.e. CF) spend most of their time within
+netCDF-C/HDF5, which only lets one thread of a process in at once, so the
+checks of concurrent requests (and of the suites within one request) would
+otherwise take turns. They are run by a pool of long-lived worker processes
+instead, which are started along with the pool. Each worker opens the uploaded
+file itself, runs the suite against it and sends its results back, while the
+metadata-only suites run within the MCC process against a snapshot of the file.
+
+Workers are replaced after running a set number of suites, or once their
+memory usage grows beyond a ceiling, so that leaks from long-lived use of the
+netCDF-C/HDF5 libraries stay bounded. A worker that crashes, or takes longer
+than the pool's timeout to run a suite, only fails the suite that it was
+running.
+
+MCC runs within threaded processes, and workers are started from whichever
+thread needs one, so they are never forked from the MCC process itself; a
+fork taken while another thread holds e.g. the HDF5 or logging lock would
+deadlock. Workers are forked by a forkserver process instead (or spawned,
+where there is no forkserver).
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from netCDF4 import Dataset
+
+logger = logging.getLogger(__name__)
+
+# Context that worker processes are started from (see above)
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+mp_context = multiprocessing.get_context(START_METHOD)
+
+
+class WorkerCrashedError(RuntimeError):
+    """Raised when a worker process exits (or stops responding) while running a suite."""
+
+
+class SuiteWorker(object):
+    """A worker process that runs the suites sent to it, one at a time."""
+    def __init__(self, max_tasks=None, max_memory=None):
+        """
+        @param max_tasks number of suites to run before the worker retires
+                         (None for no limit)
+        @param max_memory memory usage (resident set size, in bytes) beyond
+                          which the worker retires (None for no limit)
+        """
+        self.connection, worker_connection = mp_context.Pipe()
+        self.process = mp_context.Process(
+            target=serve, args=(worker_connection, max_tasks, max_memory), name='mcc-suite-worker', daemon=True
+        )
+        self.process.start()
+        worker_connection.close()
+        self.retired = False
+
+    def run(self, suite, source, filename, timeout=None):
+        """
+        Runs a suite within the worker process.
+
+        @param suite the CheckSuite to run
+        @param source the location of the file, or its contents, from get_source()
+        @param filename name of the file the data came from
+        @param timeout number of seconds to wait for the result (None for no limit)
+        @return the result of run_suite()
+        @raises WorkerCrashedError if the worker exits before it is done, or
+                does not respond within the timeout
+        """
+        try:
+            self.connection.send((suite, source, filename))
+
+            if not self.connection.poll(timeout):
+                self.retired = True
+                self.process.kill()
+                self.process.join(1)
+
+                raise WorkerCrashedError(
+                    f'The checker process did not respond within {timeout} seconds while running '
+                    f'{getattr(suite, "name", "a suite")}'
+                )
+
+            succeeded, result, self.retired = self.connection.recv()
+        except (EOFError, OSError):
+            self.retired = True
+            self.process.join(1)
+
+            raise WorkerCrashedError(
+                f'The checker process exited unexpectedly (exit code {self.process.exitcode}) while running '
+                f'{getattr(suite, "name", "a suite")}'
+            ) from None
+
+        if not succeeded:
+            raise result
+
+        return result
+
+    def close(self):
+        self.connection.close()
+        self.process.join(1)
+
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class SuitePool(object):
+    """
+    Pool of SuiteWorker processes, which suites are submitted to from any
+    thread. Each worker runs one suite at a time, and retired (or crashed)
+    workers are replaced straight away. Should a replacement fail to start,
+    its slot is left empty, and the worker is started by the next suite to
+    take the slot instead.
+    """
+    def __init__(self, processes, max_tasks=None, max_memory=None, timeout=None):
+        """
+        @param processes number of worker processes in the pool
+        @param max_tasks number of suites each worker runs before it is replaced
+                         (None for no limit)
+        @param max_memory memory usage (resident set size, in bytes) beyond
+                          which a worker is replaced (None for no limit)
+        @param timeout number of seconds a worker may take to run a suite
+                       before it is killed and replaced (None for no limit)
+        """
+        self.max_tasks = max_tasks
+        self.max_memory = max_memory
+        self.timeout = timeout
+        self.idle = queue.Queue()
+        # Threads that wait on the workers, one per worker
+        self.executor = ThreadPoolExecutor(max_workers=processes, thread_name_prefix='mcc-suite')
+
+        # Idle workers, or None for slots whose worker has yet to be started
+        for _ in range(processes):
+            self.idle.put(SuiteWorker(max_tasks, max_memory))
+
+    def submit(self, suite, source, filename):
+        """
+        Queues a suite to run on the next idle worker.
+
+        @param suite the CheckSuite to run (compiled suites are sent to the
+                     worker by reference, see CheckSuite.compiled())
+        @param source the location of the file, or its contents, from get_source()
+        @param filename name of the file the data came from
+        @return a Future of the result of run_suite()
+        """
+        return self.executor.submit(self._run, suite, source, filename)
+
+    def _run(self, suite, source, filename):
+        worker = self.idle.get()
+
+        if worker is None:
+            try:
+                worker = SuiteWorker(self.max_tasks, self.max_memory)
+            except Exception:
+                # Leave the slot for the next suite to try again
+                self.idle.put(None)
+                raise
+
+        try:
+            return worker.run(suite, source, filename, self.timeout)
+        finally:
+            if worker.retired:
+                worker = self._replace(worker)
+
+            self.idle.put(worker)
+
+    def _replace(self, worker):
+        """
+        Replaces a retired (or crashed) worker with a new one.
+
+        @param worker the SuiteWorker to replace
+        @return the new SuiteWorker, or None if it could not be started
+        """
+        logger.info("Replacing checker process %s", worker.process.pid)
+
+        try:
+            worker.close()
+        except Exception:
+            logger.exception("Failed to close checker process %s", worker.process.pid)
+
+        try:
+            return SuiteWorker(self.max_tasks, self.max_memory)
+        except Exception:
+            logger.exception("Failed to start a checker process, it will be started by the next suite instead")
+            return None
+
+
+# Pool shared by all requests, created when first needed
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(processes, max_tasks=None, max_memory=None, timeout=None):
+    """
+    Gets the pool of checker worker processes, creating it if need be.
+
+    @param processes number of worker processes in the pool
+    @param max_tasks number of suites each worker runs before it is replaced
+    @param max_memory memory usage (in bytes) beyond which a worker is replaced
+    @param timeout number of seconds a worker may take to run a suite
+    @return a SuitePool
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = SuitePool(processes, max_tasks, max_memory, timeout)
+
+    return _pool
+
+
+def get_source(datafile):
+    """
+    Gets what a worker process needs to open a file from temporary storage.
+
+    @param datafile TemporaryStorage object containing the file data, which
+                    must be kept open until the workers have opened the file
+    @return the location of the file on disk, or its contents if it is held
+            in memory
+    """
+    if datafile.in_memory:
+        return bytes(datafile.getbuffer())
+
+    return datafile.name
+
+
+def get_memory_usage():
+    """Returns the resident set size of this process, in bytes."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # Not Linux, fall back to the peak resident set size (in bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def serve(connection, max_tasks, max_memory):
+    """
+    Main loop of a SuiteWorker process: runs the suites it receives until it
+    retires, or the pool closes its connection.
+
+    @param connection end of the Pipe to receive suites from, and send their
+                      results back through, as (succeeded, result or
+                      exception, retired) tuples
+    @param max_tasks number of suites to run before retiring
+    @param max_memory memory usage (in bytes) beyond which to retire
+    """
+    tasks = 0
+    retired = False
+
+    while not retired:
+        try:
+            suite, source, filename = connection.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+
+        tasks += 1
+
+        try:
+            response = (True, run_suite(suite, source, filename))
+        except Exception as err:
+            response = (False, err)
+
+        retired = bool(max_tasks and tasks >= max_tasks) or bool(max_memory and get_memory_usage() > max_memory)
+
+        try:
+            connection.send(response + (retired,))
+        except Exception as err:
+            # e.g. the exception could not be pickled
+            connection.send((False, RuntimeError(str(err)), retired))
+
+    connection.close()
+
+
+def run_suite(suite, source, filename):
+    """
+    Runs a CheckSuite against a file within a worker process.
+
+    @param suite the CheckSuite to run
+    @param source the location of the file, or its contents, from get_source()
+    @param filename name of the file the data came from
+    @return three-tuple of (the results of the suite, the time (since the
+            epoch) it started running, the time it finished running)
+    """
+    start = time.time()
+
+    if isinstance(source, bytes):
+        dataset = Dataset(filename, 'r', memory=source)
+    else:
+        dataset = Dataset(source, 'r')
+
+    try:
+        results = suite.run(dataset)
+    finally:
+        dataset.close()
+
+    return results, start, time.time()
@@ -0,0 +1,84 @@
+"""
+========================
+benchmark_compression.py
+========================
+
+Compares the throughput of the streaming decompressor for each of the
+supported compression formats (see compression_utils.CODECS), using the
+granules within tests/data.
+
+Each granule is compressed in memory with every codec, then decompressed the
+same way uploads are: fed through a StreamDecompressor one chunk at a time.
+
+Run from the root of the repository with:
+
+    python -m tests.benchmark_compression [--repeat N] [granule ...]
+"""
+
+import argparse
+import os
+import time
+
+from mcc.web.compression_utils import CODECS, get_decompressor
+from mcc.web.file_utils import CHUNK_SIZE
+from tests.test_compression_utils import COMPRESSORS
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+
+DEFAULT_GRANULES = (
+    'ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc',
+    'S6A_P4_2__LR_RED__NR_022_215_20210622T065556_20210622T085149_F02.nc',
+    'windsat_remss_ovw_l3_20040102_v7.0.1.nc.gz.nc4',
+)
+
+
+def decompress(format_name, data):
+    """Decompresses data in CHUNK_SIZE pieces, returning the decompressed size"""
+    decompressor = get_decompressor(None, None, format_name=format_name)
+    size = 0
+
+    for start in range(0, len(data), CHUNK_SIZE):
+        for buf in decompressor.decompress(data[start:start + CHUNK_SIZE]):
+            size += len(buf)
+
+    for buf in decompressor.flush():
+        size += len(buf)
+
+    return size
+
+
+def benchmark(granule, repeat):
+    """Prints the compression ratio and decompression throughput of each codec for a granule"""
+    with open(os.path.join(DATA_DIR, granule), 'rb') as infile:
+        original = infile.read()
+
+    print(f'{granule} ({len(original) / 1e6:.2f} MB)')
+
+    for format_name in CODECS:
+        data = COMPRESSORS[format_name](original)
+        timings = []
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            assert decompress(format_name, data) == len(original)
+            timings.append(time.perf_counter() - start)
+
+        best = min(timings)
+        print(
+            f'  {format_name:6} ratio {len(original) / len(data):6.2f}  '
+            f'{len(data) / best / 1e6:8.1f} MB/s in  {len(original) / best / 1e6:8.1f} MB/s out'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the decompression throughput of each supported codec')
+    parser.add_argument('granules', nargs='*', default=DEFAULT_GRANULES, help='Granules within tests/data to use')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs to take the best time of')
+    args = parser.parse_args()
+
+    for granule in args.granules:
+        benchmark(granule, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+=======================
+test_batch_checkers.py
+=======================
+
+Unit tests for testing many values at once with Checker.run_batch(), and the
+sharing of Checker instances between the Blueprints checked against a dataset.
+"""
+
+import pytest
+from netCDF4 import Dataset
+
+from mcc.checker.base import Blueprint, Checker, Group, get_checker
+from mcc.checker.checkers import CheckExistence, CheckStandardName, CheckUDUnits
+from mcc.checker.snapshot import DatasetSnapshot
+
+UNITS = ('m', 'm', 'K', 'not a unit', None, 'm', 'not a unit')
+
+
+class BatchChecker(Checker):
+    """Checker that records the batches of values it is given"""
+    CHECKER_NAME = 'batch checker'
+    DEPENDS_ON = (CheckExistence,)
+    batches = []
+
+    def run_global(self, blueprint, value):
+        return self.success(f'has value {value}')
+
+    def run_batch(self, blueprint, values):
+        BatchChecker.batches.append((blueprint.name, values))
+
+        return super().run_batch(blueprint, values)
+
+
+class ScalarChecker(BatchChecker):
+    """Checker that tests each variable on its own"""
+    CHECKER_NAME = 'scalar checker'
+
+    def run_varattr(self, blueprint, variable, value):
+        result = self.run_global(blueprint, value)
+        setattr(result, 'variable', variable)
+        return result
+
+
+@pytest.fixture
+def dataset():
+    """
+    Fixture that returns a snapshot of an in-memory dataset, with a variable
+    for each of UNITS
+    """
+    with Dataset('batch.nc', 'w', diskless=True) as dataset:
+        dataset.createDimension('time', 1)
+
+        for index, units in enumerate(UNITS):
+            variable = dataset.createVariable(f'var{index}', 'f4', ('time',))
+            variable.long_name = f'Variable {index}'
+
+            if units is not None:
+                variable.units = units
+
+        snapshot = DatasetSnapshot(dataset)
+
+    yield snapshot
+
+    BatchChecker.batches = []
+
+
+def summarize(results):
+    """Reduces the results of a Group to their variables and descriptions, in order"""
+    if isinstance(results, dict):
+        return [item for result in results['results'] for item in summarize(result)]
+
+    return [(results.variable, str(results), results.value)]
+
+
+@pytest.mark.parametrize('variable_major', (True, False))
+def test_run_batch(dataset, variable_major, monkeypatch):
+    """Test that Checkers are given the values of every variable in one batch, unless they override run_varattr()"""
+    monkeypatch.setattr(Group, 'VARIABLE_MAJOR', variable_major)
+
+    group = Group('Attributes', scope='varattrs', version='test')
+    group.add_checker(CheckExistence)
+    group.add_blueprint({'name': 'units'}, BatchChecker)
+    group.add_blueprint({'name': 'long_name'}, ScalarChecker)
+
+    results = summarize(group.run(dataset))
+
+    # Values that do not exist are skipped, rather than tested
+    assert BatchChecker.batches == [('units', [units for units in UNITS if units is not None])]
+    assert ('var4', 'batch checker was skipped because "var4:units" failed the check for existence', None) in results
+    assert ('var0', 'batch checker passed because "var0:units" has value m', 'm') in results
+    assert ('var6', 'scalar checker passed because "var6:long_name" has value Variable 6', 'Variable 6') in results
+
+
+@pytest.mark.parametrize('checker', (CheckUDUnits, CheckStandardName))
+def test_run_distinct(dataset, checker):
+    """Test that Checkers that only test distinct values give the same results as testing each one"""
+    blueprint = Blueprint({'name': 'units', 'scope': 'varattrs'})
+    values = list(UNITS) + ['sea_surface_temperature', 'sea_surface_temprature']
+
+    instance = checker(dataset)
+    instance.blueprint = blueprint
+
+    expected = []
+
+    for value in values:
+        instance.current_value = value
+        expected.append(instance.run_global(blueprint, value))
+
+    results = instance.run_batch(blueprint, values)
+
+    assert [result.message for result in results] == [result.message for result in expected]
+    assert [result.value for result in results] == values
+    assert [result.passed for result in results] == [result.passed for result in expected]
+
+
+def test_get_checker(dataset):
+    """Test that there is one instance of each Checker class per snapshot"""
+    checker = get_checker(CheckUDUnits, dataset)
+
+    assert checker.dataset is dataset
+    assert get_checker(CheckUDUnits, dataset) is checker
+    assert get_checker(CheckExistence, dataset) is not checker
+
+    other = DatasetSnapshot.__new__(DatasetSnapshot)
+    other.checkers = {}
+    assert get_checker(CheckUDUnits, other) is not checker
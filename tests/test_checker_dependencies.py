@@ -0,0 +1,112 @@
+"""
+=============================
+test_checker_dependencies.py
+=============================
+
+Unit tests for skipping Checkers whose dependencies (Checker.DEPENDS_ON) fail.
+"""
+
+import pytest
+from netCDF4 import Dataset
+
+from mcc.checker.base import Checker, Group
+from mcc.checker.checkers import CheckExistence, CheckUDUnits
+from mcc.checker.snapshot import DatasetSnapshot
+
+
+class CountingChecker(Checker):
+    """Checker that depends on CheckExistence, and counts the values it checks"""
+    CHECKER_NAME = 'counting checker'
+    DEPENDS_ON = (CheckExistence,)
+    checked = []
+
+    def run_global(self, blueprint, value):
+        CountingChecker.checked.append(value)
+
+        return self.success('was checked')
+
+
+@pytest.fixture
+def dataset():
+    """
+    Fixture that returns a snapshot of an in-memory dataset, with some
+    attributes missing
+    """
+    with Dataset('dependencies.nc', 'w', diskless=True) as dataset:
+        dataset.title = 'Test dataset'
+        dataset.createDimension('time', 1)
+
+        for name, units in (('time', 'seconds since 1970-01-01'), ('sst', None), ('wind', 'null')):
+            variable = dataset.createVariable(name, 'f4', ('time',))
+
+            if units is not None:
+                variable.units = units
+
+        snapshot = DatasetSnapshot(dataset)
+
+    yield snapshot
+
+    CountingChecker.checked = []
+
+
+def summarize(results):
+    """Reduces the results of a Group to (variable, checker, passed) tuples, in order"""
+    if isinstance(results, dict):
+        return [item for result in results['results'] for item in summarize(result)]
+
+    return [(getattr(results, 'variable', None), results.checker_name, results.passed)]
+
+
+@pytest.mark.parametrize('variable_major', (True, False))
+def test_skip_dependents(dataset, variable_major, monkeypatch):
+    """Test that Checkers are skipped for the values that a Checker they depend on fails"""
+    monkeypatch.setattr(Group, 'VARIABLE_MAJOR', variable_major)
+
+    group = Group('Attributes', scope='varattrs', version='test')
+    group.add_checkers(CheckExistence, CountingChecker)
+    group.add_blueprint({'name': 'units'}, CheckUDUnits)
+    group.add_blueprint({'name': 'long_name'})
+
+    results = summarize(group.run(dataset))
+
+    # Only the units of "time" exist and are useful
+    assert CountingChecker.checked == ['seconds since 1970-01-01']
+    assert sorted(results, key=str) == sorted([
+        ('time', 'check for existence', True),
+        ('time', 'counting checker', True),
+        ('time', 'check for valid UD Unit', True),
+        ('sst', 'check for existence', False),
+        ('sst', 'counting checker', None),
+        ('sst', 'check for valid UD Unit', None),
+        ('wind', 'check for existence', False),
+        ('wind', 'counting checker', None),
+        ('wind', 'check for valid UD Unit', None),
+    ] + [
+        (variable, checker, passed)
+        for variable in ('time', 'sst', 'wind')
+        for checker, passed in (('check for existence', False), ('counting checker', None))
+    ], key=str)
+
+
+def test_skipped_result(dataset):
+    """Test how a skipped Result is reported, and counted"""
+    group = Group('Attributes', scope='globals', version='test')
+    group.add_checkers(CheckExistence, CheckUDUnits)
+    group.add_blueprint({'name': 'units'})
+
+    results = group.run(dataset)
+    skipped = results['results'][0]['results'][-1]
+
+    assert results['passed'] == 0
+    assert results['total'] == 2
+    assert skipped.passed is None
+    assert str(skipped) == 'check for valid UD Unit was skipped because "units" failed the check for existence'
+
+
+def test_prerequisites():
+    """Test that Checkers only depend on the Checkers before them within a Blueprint"""
+    group = Group('Attributes', scope='globals', version='test')
+    group.add_blueprint({'name': 'units'}, CheckExistence, CheckUDUnits, CountingChecker)
+    group.add_blueprint({'name': 'title'}, CheckUDUnits, CheckExistence)
+
+    assert [blueprint.prerequisites for blueprint in group.freeze().blueprints] == [[(), (0,), (0,)], [(), ()]]
@@ -0,0 +1,184 @@
+"""
+====================
+test_compact_json.py
+====================
+
+Unit tests for the compact JSON report format (json-compact), which gives the
+attributes of each Blueprint and group of results once.
+"""
+
+import os
+import shutil
+import tempfile
+
+import pytest
+from compliance_checker import cfutil
+from compliance_checker.cf import cf_1_6, util
+from netCDF4 import Dataset
+
+TEST_FILE = 'ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc'
+
+# Selected checker keys, short names and versions of the suites to check with
+SUITES = (
+    ('ACDD-version', 'ACDD', '1.3'),
+    ('GDS2-parameter', 'GDS2', 'L2P'),
+    ('CF-version', 'CF', '1.6'),
+)
+
+
+@pytest.fixture(scope="session")
+def data_dir():
+    """
+    Fixture that returns the absolute path of the test data directory
+    """
+    test_dir = os.path.dirname(os.path.realpath(__file__))
+    yield os.path.join(test_dir, 'data')
+
+
+@pytest.fixture(scope="module")
+def server():
+    """
+    Fixture that returns the server module, configured with a temporary
+    directory for its job database.
+
+    The web modules import the checker package from the top level, as MCC
+    does under mod_wsgi (see checker.wsgi), so they are only imported for
+    these tests, and the compliance checker modules that this copy of the
+    checker package patches (see cf_shim.py) are restored afterwards.
+    """
+    test_dir = os.path.dirname(os.path.realpath(__file__))
+    temp_dir = tempfile.mkdtemp(dir=test_dir)
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.syspath_prepend(os.path.join(os.path.dirname(test_dir), 'mcc'))
+
+        for module in (cfutil, util, cf_1_6):
+            monkeypatch.setattr(module, 'Unit', module.Unit)
+
+        monkeypatch.setenv('MaxFileSize', '4295000000')
+        monkeypatch.setenv('HomepageURL', 'http://localhost')
+        monkeypatch.setenv('Venue', 'OPS')
+        monkeypatch.setenv('JobLocation', os.path.join(temp_dir, 'jobs.sqlite'))
+
+        from web import server
+
+        yield server
+
+    shutil.rmtree(temp_dir)
+
+
+@pytest.fixture(scope="module")
+def json_utils(server):
+    """
+    Fixture that returns the json_utils module used by the server
+    """
+    from web import json_utils
+
+    yield json_utils
+
+
+@pytest.fixture(scope="module")
+def report(server, data_dir):
+    """
+    Fixture that returns the selected checkers and report of checking the test
+    file with each suite
+    """
+    selected_checkers = {}
+    results = []
+
+    with Dataset(os.path.join(data_dir, TEST_FILE)) as dataset:
+        for key, short_name, version in SUITES:
+            selected_checkers[key] = version
+            results.append(server.CHECKERS[short_name].compiled(version).run(dataset))
+
+    report = {'filename': TEST_FILE, 'hash': '0' * 32, 'size': '8.32 MB', 'model': 'NETCDF3_CLASSIC',
+              'results': results}
+
+    yield selected_checkers, report
+
+
+def render(server, response_type, selected_checkers, report):
+    """Renders a report as the given type of JSON response, and parses it"""
+    with server.app.test_request_context():
+        return server.render_report(response_type, selected_checkers, report).get_json()
+
+
+def expand(result, blueprints, groups, group_fields):
+    """Reverses compact_results() for a single (compacted) result"""
+    if 'blueprint' in result:
+        expanded = dict(blueprints[result['blueprint']])
+        expanded.update((key, value) for key, value in result.items() if key != 'blueprint')
+
+        return expanded
+
+    expanded = dict(groups[result['group']])
+    expanded.update((key, result[key]) for key in group_fields if key in result)
+
+    if 'results' in result:
+        expanded['results'] = [expand(item, blueprints, groups, group_fields) for item in result['results']]
+
+    return expanded
+
+
+def without_references(result):
+    """Drops the attributes of a result that the compact format leaves out"""
+    result = {key: value for key, value in result.items() if key not in ('parent', 'hash')}
+
+    if 'results' in result:
+        result['results'] = [without_references(item) for item in result['results']]
+
+    return result
+
+
+def get_ids(result, key):
+    """Gets the IDs of the given kind (blueprint or group) referred to within a compacted result"""
+    ids = [result[key]] if key in result else []
+
+    for item in result.get('results', []):
+        ids.extend(get_ids(item, key))
+
+    return ids
+
+
+def test_format_version(server, json_utils, report):
+    """Test that compact reports are given with their format version"""
+    selected_checkers, check_report = report
+    response = render(server, 'json-compact', selected_checkers, check_report)
+
+    assert json_utils.COMPACT_FORMAT_VERSION == 2
+    assert response['format_version'] == 2
+    assert response['selected_checkers'] == selected_checkers
+    assert response['fn'] == TEST_FILE
+
+    assert 'format_version' not in render(server, 'json', selected_checkers, check_report)
+
+
+def test_ids_resolve(json_utils, report):
+    """Test that every ID of a compacted result refers to a Blueprint or group"""
+    compact = json_utils.compact_results(report[1]['results'])
+
+    blueprint_ids = [id_ for result in compact['results'] for id_ in get_ids(result, 'blueprint')]
+    group_ids = [id_ for result in compact['results'] for id_ in get_ids(result, 'group')]
+
+    assert blueprint_ids and group_ids
+    assert set(blueprint_ids) == set(compact['blueprints'])
+    assert set(group_ids) == set(compact['groups'])
+
+    # The same attributes get the same ID in every report
+    assert json_utils.compact_results(report[1]['results']) == compact
+
+
+def test_expand(server, json_utils, report):
+    """Test that expanding a compact report gives the same results as the json report, for every suite"""
+    selected_checkers, check_report = report
+    full = render(server, 'json', selected_checkers, check_report)
+    compact = render(server, 'json-compact', selected_checkers, check_report)
+
+    assert len(compact['results']) == len(full['results']) == len(SUITES)
+
+    for suite_results, full_results in zip(compact['results'], full['results']):
+        expanded = expand(suite_results, compact['blueprints'], compact['groups'], json_utils.GROUP_FIELDS)
+
+        assert expanded['passed'] == full_results['passed']
+        assert expanded['total'] == full_results['total']
+        assert expanded == without_references(full_results)
@@ -0,0 +1,92 @@
+"""
+=======================
+test_compiled_suites.py
+=======================
+
+Unit tests for the CheckSuites compiled once per process by CheckSuite.compiled().
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from netCDF4 import Dataset
+from werkzeug.exceptions import BadRequest
+
+from mcc.checker.acdd import ACDD
+from mcc.checker.base import Blueprint, Group
+from mcc.checker.gds2 import GDS2
+from mcc.web.form_utils import get_tests
+
+
+@pytest.fixture(scope="session")
+def data_dir():
+    """
+    Fixture that returns the absolute path of the test data directory
+    """
+    test_dir = os.path.dirname(os.path.realpath(__file__))
+    yield os.path.join(test_dir, 'data')
+
+
+def summarize(results):
+    """Reduces the results of a CheckSuite to (name, passed, total, results) tuples, ignoring the random hashes"""
+    if isinstance(results, dict):
+        return (
+            results.get('name'), results['passed'], results['total'],
+            [summarize(result) for result in results['results']]
+        )
+
+    return str(results)
+
+
+def test_compiled_suites():
+    """Test that suites are compiled once per version and frozen"""
+    suite = ACDD.compiled('1.3')
+
+    assert ACDD.compiled('1.3') is suite
+    assert ACDD.compiled('1.1') is not suite
+    assert GDS2.compiled('L2P') is not GDS2.compiled('L4')
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert set(executor.map(lambda _: GDS2.compiled('L3'), range(8))) == {GDS2.compiled('L3')}
+
+    assert isinstance(suite.blueprints, tuple)
+
+    with pytest.raises(AttributeError):
+        suite.add_checker(None)
+
+    # Invalid versions are rejected every time, rather than cached
+    for _ in range(2):
+        with pytest.raises(BadRequest):
+            ACDD.compiled('0.1')
+
+    checkers = get_tests({'ACDD': 'on', 'ACDD-version': '1.3', 'GDS2': 'on', 'GDS2-parameter': 'L2P'},
+                         {'ACDD': ACDD, 'GDS2': GDS2})
+    assert checkers == [suite, GDS2.compiled('L2P')]
+
+
+def test_blueprint_copies_attributes():
+    """Test that the dicts Blueprints are created from are left as they were"""
+    attributes = {'name': 'title', 'description': 'A short description of the dataset.'}
+
+    blueprint = Blueprint(attributes, priority='required', description='Overridden')
+    assert blueprint.description == 'Overridden'
+    assert blueprint.priority == 'required'
+    assert attributes == {'name': 'title', 'description': 'A short description of the dataset.'}
+
+    blueprints = [{'name': 'id'}, {'name': 'naming_authority'}]
+    group = Group('Recommended', scope='globals')
+    group.add_blueprints(blueprints)
+    assert blueprints == [{'name': 'id'}, {'name': 'naming_authority'}]
+
+
+def test_compiled_suite_runs(data_dir):
+    """Test that running a compiled suite gives the same results as a newly set up one, every time"""
+    file = os.path.join(data_dir, 'ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc')
+
+    with Dataset(file) as dataset:
+        for checker_class, version in ((ACDD, '1.3'), (GDS2, 'L2P')):
+            expected = summarize(checker_class().setup(version).run(dataset))
+
+            for _ in range(2):
+                assert summarize(checker_class.compiled(version).run(dataset)) == expected
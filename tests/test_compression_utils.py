@@ -0,0 +1,369 @@
+"""
+=========================
+test_compression_utils.py
+=========================
+
+Unit tests for the streaming decompressors within compression_utils.py.
+
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import random
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+import zstandard
+
+from mcc.web.compression_utils import (CODECS,
+                                       Bz2Decompressor,
+                                       CompressionRatioError,
+                                       DecompressedSizeError,
+                                       DecompressionError,
+                                       GzipDecompressor,
+                                       OUTPUT_CHUNK_SIZE,
+                                       ParallelBz2Decompressor,
+                                       ParallelGzipDecompressor,
+                                       XzDecompressor,
+                                       ZipDecompressor,
+                                       ZstdDecompressor,
+                                       get_decompressor,
+                                       get_executor)
+
+
+@pytest.fixture(scope="session")
+def data_dir():
+    """
+    Fixture that returns the absolute path of the test data directory
+    """
+    test_dir = os.path.dirname(os.path.realpath(__file__))
+    yield os.path.join(test_dir, 'data')
+
+
+@pytest.fixture(scope="module")
+def executor():
+    """
+    Fixture that returns a process pool for parallel decompression
+    """
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+def parallel_decompressor(decompressor_class, max_size, executor, batch_size, max_ratio=None):
+    """Gets a parallel decompressor that splits its input every batch_size bytes"""
+    decompressor = decompressor_class(max_size, executor, max_pending=2, max_ratio=max_ratio)
+    decompressor.BATCH_SIZE = batch_size
+
+    return decompressor
+
+
+def decompress_in_chunks(decompressor, data, chunk_size):
+    """Feeds data to the decompressor chunk_size bytes at a time, returning the decompressed result"""
+    output = []
+
+    for start in range(0, len(data), chunk_size):
+        output.extend(decompressor.decompress(data[start:start + chunk_size]))
+
+    output.extend(decompressor.flush())
+
+    assert all(len(buf) <= OUTPUT_CHUNK_SIZE for buf in output)
+
+    return b''.join(output)
+
+
+def test_decompress_granules(data_dir):
+    """Test that the compressed test granules decompress identically regardless of how they are fed in"""
+    base_name = 'ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc'
+
+    with gzip.open(os.path.join(data_dir, base_name + '.gz')) as infile:
+        expected = infile.read()
+
+    for extension in ('.gz', '.bz2'):
+        with open(os.path.join(data_dir, base_name + extension), 'rb') as infile:
+            data = infile.read()
+
+        for chunk_size in (4096, 65536, len(data)):
+            decompressor = get_decompressor(base_name + extension, max_size=len(expected))
+            assert decompress_in_chunks(decompressor, data, chunk_size) == expected
+
+
+class UnseekableStream(io.BytesIO):
+    """In-memory stream that cannot seek, like an HTTP response"""
+    def seekable(self):
+        return False
+
+    def seek(self, *args):
+        raise io.UnsupportedOperation('seek')
+
+    def tell(self):
+        raise io.UnsupportedOperation('tell')
+
+
+def zip_compress(data, compress_type=zipfile.ZIP_DEFLATED, members=1, seekable=False):
+    """Compresses data into a zip archive, as written to a non-seekable stream (with data descriptors) by default"""
+    archive = io.BytesIO() if seekable else UnseekableStream()
+
+    with zipfile.ZipFile(archive, 'w', compression=compress_type) as zip_file:
+        for index in range(members):
+            zip_file.writestr(f'member{index}.nc', data)
+
+    return archive.getvalue()
+
+
+# Functions to compress test data with each of the codecs
+COMPRESSORS = {
+    'gzip': gzip.compress,
+    'bzip2': bz2.compress,
+    'zstd': zstandard.ZstdCompressor().compress,
+    'xz': lzma.compress,
+    'zip': zip_compress,
+}
+
+
+def test_decompress_codecs(data_dir):
+    """Test that each codec decompresses a granule identically regardless of how it is fed in"""
+    with open(os.path.join(data_dir, 'ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc'), 'rb') as infile:
+        expected = infile.read()
+
+    assert set(CODECS) == set(COMPRESSORS)
+
+    for format_name, compress in COMPRESSORS.items():
+        data = compress(expected)
+
+        for chunk_size in (4096, 65536, len(data)):
+            decompressor = get_decompressor(None, max_size=len(expected), format_name=format_name)
+            assert decompressor.FORMAT == format_name
+            assert decompress_in_chunks(decompressor, data, chunk_size) == expected
+
+        if format_name == 'zip':
+            # With the sizes and CRC-32 in the local file header instead
+            data = zip_compress(expected, seekable=True)
+            assert decompress_in_chunks(ZipDecompressor(len(expected)), data, 65536) == expected
+
+        for extension in CODECS[format_name].EXTENSIONS:
+            assert isinstance(get_decompressor('granule.nc' + extension.upper(), 100), CODECS[format_name])
+
+    # zip archives that store their member uncompressed, which are checked against their CRC-32
+    data = zip_compress(expected, compress_type=zipfile.ZIP_STORED, seekable=True)
+    assert decompress_in_chunks(ZipDecompressor(len(expected)), data, 65536) == expected
+
+    data = bytearray(data)
+    data[len(data) // 2] ^= 0xFF
+
+    with pytest.raises(DecompressionError):
+        decompress_in_chunks(ZipDecompressor(len(expected)), bytes(data), 65536)
+
+
+def test_decompress_multiple_members():
+    """Test concatenated members/streams, including null padding and trailing garbage"""
+    data = gzip.compress(b'first') + b'\0\0\0' + gzip.compress(b' second') + b'trailing garbage'
+    assert decompress_in_chunks(GzipDecompressor(100), data, 3) == b'first second'
+
+    data = bz2.compress(b'first') + bz2.compress(b' second')
+    assert decompress_in_chunks(Bz2Decompressor(100), data, 3) == b'first second'
+
+    data = lzma.compress(b'first') + b'\0\0\0\0' + lzma.compress(b' second')
+    assert decompress_in_chunks(XzDecompressor(100), data, 3) == b'first second'
+
+    compressor = zstandard.ZstdCompressor()
+    data = compressor.compress(b'first') + compressor.compress(b' second')
+    assert decompress_in_chunks(ZstdDecompressor(100), data, 3) == b'first second'
+
+    # Only single member zip archives are supported
+    with pytest.raises(DecompressionError):
+        decompress_in_chunks(ZipDecompressor(100), zip_compress(b'member', members=2), 3)
+
+
+def test_decompress_invalid():
+    """Test that invalid or truncated data raises DecompressionError"""
+    with pytest.raises(DecompressionError):
+        decompress_in_chunks(GzipDecompressor(100), b'not gzip data', 4)
+
+    with pytest.raises(DecompressionError):
+        decompress_in_chunks(Bz2Decompressor(100), bz2.compress(b'truncated')[:-4], 4)
+
+    for format_name, compress in COMPRESSORS.items():
+        decompressor_class = CODECS[format_name]
+
+        with pytest.raises(DecompressionError):
+            decompress_in_chunks(decompressor_class(100), b'not compressed data', 4)
+
+        data = compress(os.urandom(1000))
+
+        with pytest.raises(DecompressionError):
+            decompress_in_chunks(decompressor_class(1000), data[:len(data) // 2], 4)
+
+    assert get_decompressor('granule.nc', 100) is None
+
+
+def test_decompress_bomb():
+    """Test that decompression stops as soon as the size limit is exceeded"""
+    max_size = 4 * OUTPUT_CHUNK_SIZE
+    decompressor = Bz2Decompressor(max_size)
+
+    with pytest.raises(DecompressedSizeError):
+        decompress_in_chunks(decompressor, bz2.compress(b'\0' * 100 * OUTPUT_CHUNK_SIZE), 65536)
+
+    assert decompressor.decompressed_size <= max_size + OUTPUT_CHUNK_SIZE
+
+    for format_name, compress in COMPRESSORS.items():
+        decompressor = CODECS[format_name](max_size)
+        output_size = 0
+
+        with pytest.raises(DecompressedSizeError):
+            for buf in decompressor.decompress(compress(b'\0' * 100 * OUTPUT_CHUNK_SIZE)):
+                output_size += len(buf)
+
+        # Nothing beyond the size limit was ever produced
+        assert output_size <= max_size
+
+
+def test_decompress_ratio(executor):
+    """Test that decompression stops early once the compression ratio is too high, or the output too large"""
+    data = bz2.compress(b'\0' * 100 * OUTPUT_CHUNK_SIZE)
+
+    decompressors = [
+        Bz2Decompressor(None, max_ratio=1000),
+        parallel_decompressor(ParallelBz2Decompressor, None, executor, batch_size=1024, max_ratio=1000),
+    ]
+
+    for decompressor in decompressors:
+        decompressor.RATIO_CHECK_SIZE = 4 * OUTPUT_CHUNK_SIZE
+
+        with pytest.raises(CompressionRatioError) as exc_info:
+            decompress_in_chunks(decompressor, data, 64)
+
+        assert decompressor.decompressed_size < 10 * OUTPUT_CHUNK_SIZE
+        assert f'processing {decompressor.compressed_size} of an unknown number of compressed bytes' \
+            in str(exc_info.value)
+
+    # A ratio of about 70:1, which would pass should the bit positions of the
+    # parallel bzip2 decompressor be taken as bytes (i.e. 9:1)
+    rng = random.Random(0)
+    data = bz2.compress(b''.join(bytes([rng.randrange(256)]) * rng.randrange(1, 400) for _ in range(40000)))
+
+    decompressors = [
+        Bz2Decompressor(None, max_ratio=30),
+        parallel_decompressor(ParallelBz2Decompressor, None, executor, batch_size=64 * 1024, max_ratio=30),
+    ]
+
+    for decompressor in decompressors:
+        decompressor.RATIO_CHECK_SIZE = OUTPUT_CHUNK_SIZE
+
+        with pytest.raises(CompressionRatioError):
+            decompress_in_chunks(decompressor, data, 64 * 1024)
+
+        assert decompressor.compressed_size <= len(data)
+        assert decompressor.decompressed_size > 30 * decompressor.compressed_size
+
+    # Within the ratio limit, but the whole stream would decompress to more than max_size
+    data = gzip.compress(b''.join(os.urandom(64) + b'\0' * 960 for _ in range(16 * 1024)))
+    max_size = 8 * OUTPUT_CHUNK_SIZE
+    decompressor = GzipDecompressor(max_size, max_ratio=1000, expected_input_size=len(data))
+    decompressor.RATIO_CHECK_SIZE = OUTPUT_CHUNK_SIZE
+
+    with pytest.raises(DecompressedSizeError) as exc_info:
+        decompress_in_chunks(decompressor, data, 4096)
+
+    assert 'projected to exceed' in str(exc_info.value)
+    assert f'processing {decompressor.compressed_size} of {len(data)} compressed bytes' in str(exc_info.value)
+    assert decompressor.decompressed_size < max_size // 2
+
+    # Neither applies until enough data has been decompressed to go by
+    data = bz2.compress(b'\0' * 2 * OUTPUT_CHUNK_SIZE)
+    decompressor = Bz2Decompressor(None, max_ratio=1000, expected_input_size=len(data))
+    assert len(decompress_in_chunks(decompressor, data, 64)) == 2 * OUTPUT_CHUNK_SIZE
+
+
+def test_parallel_decompress_granule(data_dir, executor):
+    """Test that parallel decompression of a multi-block bzip2 file matches serial decompression"""
+    base_name = 'ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc'
+
+    with open(os.path.join(data_dir, base_name + '.bz2'), 'rb') as infile:
+        data = infile.read()
+
+    expected = bz2.decompress(data)
+
+    for batch_size in (65536, len(data)):
+        decompressor = parallel_decompressor(ParallelBz2Decompressor, len(expected), executor, batch_size)
+        assert decompress_in_chunks(decompressor, data, 65536) == expected
+        assert decompressor.serial is None
+
+
+def test_parallel_decompress_multiple_members(executor):
+    """Test parallel decompression of several bzip2 streams and gzip members"""
+    streams = [os.urandom(300000), b'second' * 100000]
+    data = bz2.compress(streams[0], 1) + b'\0\0' + bz2.compress(streams[1], 1) + b'garbage'
+    decompressor = parallel_decompressor(ParallelBz2Decompressor, None, executor, 4096)
+    assert decompress_in_chunks(decompressor, data, 4096) == b''.join(streams)
+
+    members = [os.urandom(10000), b'second' * 10000, b'third']
+    data = b''.join(gzip.compress(member) for member in members)
+    decompressor = parallel_decompressor(ParallelGzipDecompressor, None, executor, 4096)
+    assert decompress_in_chunks(decompressor, data, 4096) == b''.join(members)
+
+
+def test_parallel_decompress_false_boundary(executor):
+    """Test that magic numbers within the compressed data do not break parallel decompression"""
+    # Stored (uncompressed) deflate blocks contain the gzip magic number as-is
+    content = b'\x1f\x8b\x08\x00' * 1000
+    data = gzip.compress(content, compresslevel=0) + gzip.compress(b'end')
+    decompressor = parallel_decompressor(ParallelGzipDecompressor, None, executor, 1000)
+
+    assert decompress_in_chunks(decompressor, data, 1000) == content + b'end'
+    assert decompressor.false_boundaries
+
+
+def test_parallel_decompress_single_member(executor):
+    """Test that a single gzip member too large to split is decompressed serially"""
+    content = os.urandom(100000)
+    decompressor = parallel_decompressor(ParallelGzipDecompressor, None, executor, 4096)
+    decompressor.MAX_UNSPLIT_SIZE = 10000
+
+    assert decompress_in_chunks(decompressor, gzip.compress(content), 4096) == content
+    assert isinstance(decompressor.serial, GzipDecompressor)
+
+
+def test_shared_executor():
+    """Test that the shared process pool never forks its workers from the (threaded) MCC process itself"""
+    executor = get_executor(2)
+
+    assert get_executor(4) is executor
+    assert executor._mp_context.get_start_method() in ('forkserver', 'spawn')
+
+    content = os.urandom(300000)
+    decompressor = parallel_decompressor(ParallelBz2Decompressor, None, executor, 4096)
+
+    assert decompress_in_chunks(decompressor, bz2.compress(content, 1), 4096) == content
+
+
+def test_parallel_decompress_invalid(executor):
+    """Test that invalid, truncated or oversized data is rejected by parallel decompression"""
+    with pytest.raises(DecompressionError):
+        decompressor = parallel_decompressor(ParallelGzipDecompressor, None, executor, 4)
+        decompress_in_chunks(decompressor, b'not gzip data', 4)
+
+    data = bz2.compress(os.urandom(300000), 1)
+
+    with pytest.raises(DecompressionError):
+        decompressor = parallel_decompressor(ParallelBz2Decompressor, None, executor, 4096)
+        decompress_in_chunks(decompressor, data[:-100], 4096)
+
+    corrupted = bytearray(data)
+    corrupted[len(data) // 2] ^= 0xff
+
+    with pytest.raises(DecompressionError):
+        decompressor = parallel_decompressor(ParallelBz2Decompressor, None, executor, 4096)
+        decompress_in_chunks(decompressor, bytes(corrupted), 4096)
+
+    max_size = 4 * OUTPUT_CHUNK_SIZE
+    decompressor = parallel_decompressor(ParallelBz2Decompressor, max_size, executor, 4096)
+
+    with pytest.raises(DecompressedSizeError):
+        decompress_in_chunks(decompressor, bz2.compress(b'\0' * 100 * OUTPUT_CHUNK_SIZE), 4096)
+
+    assert decompressor.decompressed_size <= max_size
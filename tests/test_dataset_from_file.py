@@ -8,11 +8,16 @@ Unit tests for the file_utils.get_dataset_from_file() function.
 
 """
 
+import bz2
+import gzip
+import hashlib
+import io
 import os
 import shutil
 import tempfile
 from unittest.mock import MagicMock
 
+import flask
 import netCDF4
 import pytest
 import werkzeug.exceptions
@@ -20,6 +25,14 @@ import werkzeug.exceptions
 import mcc.web.file_utils as file_utils
 
 
+VALID_TEST_CASES = [
+    ('ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc', 'b15b610e31c96e6593cc4df1f28b078a', '8.32 MB'),  # nominal
+    ('ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc.bz2', '1411e11020e54579636ddbf7afc4be93', '2.81 MB'),  # bz2 compression
+    ('ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc.gz', 'b55a9ab03692df37c843d72b010b8251', '3.06 MB'),  # gzip compression
+    ('ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc.invalid_zip.gz', 'ec46238f3c1ace7867625aa8b08df1ea', '3.06 MB')  # zip compression, misnamed
+]
+
+
 @pytest.fixture(scope="session")
 def test_dir():
     """
@@ -49,13 +62,7 @@ def test_dataset_from_file(test_dir):
     """Test creation of a NetCDF4 Dataset from an uploaded file, including compressed files"""
     test_data_dir = os.path.join(test_dir, 'data')
 
-    valid_test_cases = [
-        ('ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc', 'b15b610e31c96e6593cc4df1f28b078a', '8.32 MB'),  # nominal
-        ('ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc.bz2', '1411e11020e54579636ddbf7afc4be93', '2.81 MB'),  # bz2 compression
-        ('ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc.gz', 'b55a9ab03692df37c843d72b010b8251', '3.06 MB')  # gzip compression
-    ]
-
-    for test_file, expected_hash, expected_size in valid_test_cases:
+    for test_file, expected_hash, expected_size in VALID_TEST_CASES:
         test_file_path = os.path.join(test_data_dir, test_file)
 
         with open(test_file_path, 'rb') as infile:
@@ -85,7 +92,6 @@ def test_dataset_from_file(test_dir):
     # For each of the invalid test files, ensure that we raise an exception
     # and that there are no temporary files remaining on disk afterward
     invalid_test_files = [
-        'ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc.invalid_zip.gz',  # unsupported compression
         'invalid_archive.h5',  # unsupported format for NetCDF4
         'unsupported_archive.nc3'  # unsupported file extension
     ]
@@ -106,3 +112,184 @@ def teardown_function(function):
     if os.path.exists(function.local_temp_dir):
         shutil.rmtree(function.local_temp_dir)
 
+
+def test_dataset_from_memory(test_dir):
+    """Test that files under the in-memory size threshold are opened without any temporary files"""
+    file_utils.app.config['InMemoryFileSize'] = 10000000
+
+    for test_file, expected_hash, expected_size in VALID_TEST_CASES:
+        test_file_path = os.path.join(test_dir, 'data', test_file)
+
+        with open(test_file_path, 'rb') as infile:
+            infile.filename = test_file
+            result = file_utils.get_dataset_from_file(infile)
+
+        assert result['hash'] == expected_hash
+        assert result['size'] == expected_size
+        assert result['dataset'].data_model == 'NETCDF3_CLASSIC'
+
+        result['dataset'].close()
+
+        assert len(os.listdir(test_dataset_from_memory.local_temp_dir)) == 0
+
+
+def test_dataset_from_streamed_upload(test_dir):
+    """Test that uploads received by UploadRequest are hashed while streamed to disk"""
+    test_file = 'ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc.gz'
+    test_file_path = os.path.join(test_dir, 'data', test_file)
+
+    app = flask.Flask(__name__)
+    app.request_class = file_utils.UploadRequest
+    app.config['TempFileLocation'] = test_dataset_from_streamed_upload.local_temp_dir
+
+    @app.route('/check', methods=['POST'])
+    def check():
+        uploaded_file = flask.request.files['file-upload']
+
+        # The upload should have been written directly into a spool, no copy required
+        assert isinstance(uploaded_file.stream, file_utils.UploadSpool)
+        assert file_utils.spool_upload(uploaded_file) is uploaded_file.stream
+
+        result = file_utils.get_dataset_from_file(uploaded_file)
+        result['dataset'].close()
+
+        return {'hash': result['hash'], 'size': result['size']}
+
+    with open(test_file_path, 'rb') as infile:
+        response = app.test_client().post(
+            '/check', data={'file-upload': (infile, test_file), 'response': 'json'}
+        )
+
+    assert response.json == {'hash': 'b55a9ab03692df37c843d72b010b8251', 'size': '3.06 MB'}
+    assert len(os.listdir(test_dataset_from_streamed_upload.local_temp_dir)) == 0
+
+
+def test_dataset_from_misnamed_file(test_dir):
+    """Test that uploads are decompressed according to their content rather than their file name"""
+    test_data_dir = os.path.join(test_dir, 'data')
+
+    for test_file, expected_hash, expected_size in VALID_TEST_CASES[1:]:
+        with open(os.path.join(test_data_dir, test_file), 'rb') as infile:
+            misnamed_file = io.BytesIO(infile.read())
+
+        misnamed_file.filename = 'granule.nc'
+        result = file_utils.get_dataset_from_file(misnamed_file)
+
+        assert result['hash'] == expected_hash
+        assert result['size'] == expected_size
+        assert result['dataset'].data_model == 'NETCDF3_CLASSIC'
+
+        result['dataset'].close()
+
+    assert len(os.listdir(test_dataset_from_misnamed_file.local_temp_dir)) == 0
+
+
+def test_early_rejection():
+    """Test that uploads in an unknown format are rejected without reading them in full"""
+    invalid_uploads = [
+        b'this is not netCDF data' * 1000000,
+        # A gzip compressed text file
+        gzip.compress(b'this is not netCDF data' * 100000) + os.urandom(10000000),
+    ]
+
+    for data in invalid_uploads:
+        invalid_file = io.BytesIO(data)
+        invalid_file.filename = 'granule.nc.gz'
+
+        with pytest.raises(werkzeug.exceptions.InternalServerError) as exc_info:
+            file_utils.get_dataset_from_file(invalid_file)
+
+        assert 'not in an accepted data format' in exc_info.value.description
+        assert invalid_file.tell() < len(data) // 2
+
+    assert len(os.listdir(test_early_rejection.local_temp_dir)) == 0
+
+
+def test_decompression_bomb():
+    """Test that uploads expanding beyond the maximum compression ratio are rejected early"""
+    file_utils.app.config['MaxCompressionRatio'] = 1000
+    data = bz2.compress(b'CDF\x01' + b'\0' * 200000000)
+
+    bomb_file = io.BytesIO(data)
+    bomb_file.filename = 'granule.nc.bz2'
+
+    with pytest.raises(werkzeug.exceptions.BadRequest) as exc_info:
+        file_utils.get_dataset_from_file(bomb_file)
+
+    assert 'maximum compression ratio of 1000:1' in exc_info.value.description
+    assert f'after processing {len(data)} of an unknown number of compressed bytes' in exc_info.value.description
+    assert len(os.listdir(test_decompression_bomb.local_temp_dir)) == 0
+
+
+def test_dataset_from_header(test_dir):
+    """Test that only the header of compressed classic format files is decompressed for metadata-only checks"""
+    file_utils.app.config['MetadataOnlyIngest'] = True
+
+    with netCDF4.Dataset(os.path.join(test_dir, 'data', VALID_TEST_CASES[0][0])) as expected:
+        for test_file, expected_hash, expected_size in VALID_TEST_CASES[1:]:
+            for metadata_only in (True, False):
+                with open(os.path.join(test_dir, 'data', test_file), 'rb') as infile:
+                    infile.filename = test_file
+                    upload = file_utils.get_upload_from_file(infile)
+
+                assert upload['hash'] == expected_hash
+                assert upload['size'] == expected_size
+                assert upload['datafile'].header_only
+
+                header_size = upload['datafile'].seek(0, os.SEEK_END)
+                assert header_size < os.path.getsize(expected.filepath()) // 2
+
+                if not metadata_only:
+                    # As with jobs, the upload (and the rest of it that was set
+                    # aside) outlives the request it was uploaded with
+                    request_datafile = upload['datafile']
+                    upload['datafile'] = request_datafile.detach()
+                    request_datafile.close()
+
+                with file_utils.open_upload_dataset(upload, metadata_only=metadata_only) as dataset:
+                    assert dataset.data_model == expected.data_model
+                    assert dataset.__dict__ == expected.__dict__
+                    assert list(dataset.dimensions) == list(expected.dimensions)
+                    assert [variable.dtype for variable in dataset.variables.values()] == \
+                        [variable.dtype for variable in expected.variables.values()]
+
+                    if not metadata_only:
+                        # The rest of the file was decompressed for reading its data
+                        for name, variable in expected.variables.items():
+                            assert (dataset[name][:] == variable[:]).all()
+
+                assert len(os.listdir(test_dataset_from_header.local_temp_dir)) == 0
+
+
+
+def test_parallel_decompression_of_streamed_upload():
+    """Test that uploads received by UploadRequest are decompressed in full by many processes"""
+    # Incompressible data, so the compressed upload spans several batches
+    data = b'CDF\x01' + os.urandom(3 * file_utils.ParallelDecompressor.BATCH_SIZE)
+    compressed = bz2.compress(data)
+    assert len(compressed) > file_utils.ParallelDecompressor.BATCH_SIZE
+
+    file_utils.app.config['DecompressProcesses'] = 4
+
+    app = flask.Flask(__name__)
+    app.request_class = file_utils.UploadRequest
+    app.config['TempFileLocation'] = test_parallel_decompression_of_streamed_upload.local_temp_dir
+
+    @app.route('/check', methods=['POST'])
+    def check():
+        with file_utils.spool_upload(flask.request.files['file-upload']) as spool:
+            assert isinstance(spool.decompressor, file_utils.ParallelDecompressor)
+            stored = spool.read()
+
+            return {'hash': spool.hexdigest(), 'stored_hash': hashlib.md5(stored).hexdigest(),
+                    'stored_size': len(stored), 'format': spool.format}
+
+    response = app.test_client().post(
+        '/check', data={'file-upload': (io.BytesIO(compressed), 'granule.nc.bz2'), 'response': 'json'}
+    )
+
+    assert response.json == {
+        'hash': hashlib.md5(compressed).hexdigest(), 'stored_hash': hashlib.md5(data).hexdigest(),
+        'stored_size': len(data), 'format': file_utils.NETCDF3
+    }
+    assert len(os.listdir(test_parallel_decompression_of_streamed_upload.local_temp_dir)) == 0
@@ -0,0 +1,112 @@
+"""
+====================
+test_format_utils.py
+====================
+
+Unit tests for recognizing netCDF classic format files within format_utils.py.
+"""
+
+import os
+
+import numpy
+import pytest
+from netCDF4 import Dataset
+
+from mcc.web.format_utils import (DATASET_FORMATS,
+                                  UnknownFormatError,
+                                  classic_header_size,
+                                  is_classic_format,
+                                  sniff_format)
+
+
+@pytest.fixture(scope="session")
+def data_dir():
+    """
+    Fixture that returns the absolute path of the test data directory
+    """
+    test_dir = os.path.dirname(os.path.realpath(__file__))
+    yield os.path.join(test_dir, 'data')
+
+
+@pytest.mark.parametrize('data_model', ['NETCDF3_CLASSIC', 'NETCDF3_64BIT_OFFSET', 'NETCDF3_64BIT_DATA'])
+def test_classic_header_size(data_model):
+    """Test that the end of the header is found for each of the classic format variants"""
+    dataset = Dataset('header.nc', 'w', format=data_model, memory=1)
+    dataset.title = 'Header test'
+    dataset.createDimension('time', None)
+    dataset.createDimension('lat', 3)
+    variable = dataset.createVariable('lat', 'f4', ('lat',))
+    variable.units = 'degrees_north'
+    variable[:] = [1, 2, 3]
+    variable = dataset.createVariable('wind', 'i2', ('time', 'lat'))
+    variable.scale_factor = 0.01
+    variable[0, :] = [4, 5, 6]
+    data = bytes(dataset.close())
+
+    assert is_classic_format(data)
+    header_size = classic_header_size(data)
+
+    # The data of the first variable follows directly after the header
+    assert data[header_size:header_size + 12] == numpy.array([1, 2, 3], dtype='>f4').tobytes()
+
+    # Whatever is missing from the header, more data is needed
+    for size in (0, 3, 4, header_size // 2, header_size - 1):
+        assert classic_header_size(data[:size]) is None
+
+    assert classic_header_size(data[:header_size]) == header_size
+
+
+def test_not_classic_format(data_dir):
+    """Test that other formats are not mistaken for classic format files"""
+    with open(os.path.join(data_dir, 'tdset.h5'), 'rb') as infile:
+        data = infile.read(1024)
+
+    assert not is_classic_format(data)
+
+    with pytest.raises(ValueError):
+        classic_header_size(data)
+
+    with pytest.raises(ValueError):
+        classic_header_size(b'CDF\x01' + b'\x00' * 4 + b'\x00\x00\x00\x0B\x00\x00\x00\x01')
+
+
+@pytest.mark.parametrize('test_file, expected_format', [
+    ('ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc', 'netCDF-3'),
+    ('ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc.bz2', 'bzip2'),
+    ('ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc.gz', 'gzip'),
+    ('ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc.invalid_zip.gz', 'zip'),
+    ('windsat_remss_ovw_l3_20040102_v7.0.1.nc.gz.nc4', 'HDF5'),
+    ('tdset.h5', 'HDF5'),
+])
+def test_sniff_format(data_dir, test_file, expected_format):
+    """Test that the format of each test file is told from its first few bytes"""
+    with open(os.path.join(data_dir, test_file), 'rb') as infile:
+        data = infile.read(1024)
+
+    assert sniff_format(data[:8]) == expected_format
+    assert sniff_format(data) == expected_format
+
+
+def test_sniff_unknown_format(data_dir):
+    """Test that unknown formats are rejected once enough data has been seen"""
+    for test_file in ('invalid_archive.h5', 'unsupported_archive.nc3'):
+        with open(os.path.join(data_dir, test_file), 'rb') as infile:
+            data = infile.read()
+
+        # There could yet be an HDF5 signature after a user block
+        assert sniff_format(data[:100]) is None
+
+        with pytest.raises(UnknownFormatError):
+            sniff_format(data, complete=True)
+
+    with pytest.raises(UnknownFormatError):
+        sniff_format(b'not a dataset' * 10000)
+
+    # HDF5 files may start with a user block
+    assert sniff_format(b'\x00' * 1024 + b'\x89HDF\r\n\x1a\n') == 'HDF5'
+    assert sniff_format(b'CDF') is None
+    assert sniff_format(b'CDF\x02\x00\x00\x00\x00') == 'netCDF-3'
+
+    # Only the given formats are accepted, such as after decompressing
+    with pytest.raises(UnknownFormatError):
+        sniff_format(b'\x1f\x8b\x08\x00\x00\x00\x00\x00', formats=DATASET_FORMATS)
@@ -0,0 +1,108 @@
+"""
+===============
+test_iso8601.py
+===============
+
+Unit tests for the validation of ISO-8601 dates and durations within iso8601.py.
+"""
+
+import pytest
+from isodate import parse_date, parse_datetime, parse_duration
+
+from mcc.checker.base import Blueprint
+from mcc.checker.checkers import CheckISODatestuff, CheckISODuration
+from mcc.checker.iso8601 import (DATE, DATE_REGEX, DATETIME, DATETIME_REGEX, DURATION_REGEX, get_datetime_kind,
+                                 is_duration, parse_datetime_kind, parse_is_duration)
+
+DATETIMES = (
+    '2021-01-01T00:09:00Z',
+    '20210101T000900Z',
+    '2021-01-01T00:09:00.123456+05:30',
+    '2021-01-01T00:09:00,5-0800',
+    '2021-01-01T00:09+05',
+    '2020-02-29T23:59:59',
+)
+
+DATES = ('2021-01-01', '20210101', '2020-02-29')
+
+# Forms that are only validated by isodate, whether valid or not
+OTHERS = (
+    '2021-02-30T00:00:00Z',
+    '2021-02-29',
+    '2021-13-01',
+    '2021-01-01T24:00:00Z',
+    '2021-01-01T00:09:60Z',
+    '2021-001',
+    '2021-W01-1',
+    '2021-01',
+    '2021',
+    '2021-01-01 00:09:00',
+    '2021-01-01t00:09:00z',
+    '2021-0101T00:00:00',
+    'yesterday',
+    '',
+)
+
+DURATIONS = ('P1D', 'PT12H', 'P1Y2M3DT4H5M6S', 'P1W', 'PT1.5S', 'PT0,25S')
+
+OTHER_DURATIONS = ('P', 'PT', '-P1D', 'P1.5D', 'P0001-02-03T04:05:06', 'P1DT', '1D', 'P1H', 'PT1D', '')
+
+
+@pytest.mark.parametrize('value', DATETIMES + DATES + OTHERS)
+def test_datetime_kind(value):
+    """Test that dates are validated just as isodate would validate them"""
+    assert get_datetime_kind(value) == parse_datetime_kind(value)
+
+
+def test_datetime_fast_path():
+    """Test that the common forms of dates are recognized without isodate"""
+    for value in DATETIMES:
+        assert DATETIME_REGEX.fullmatch(value)
+        assert get_datetime_kind(value) == DATETIME
+        parse_datetime(value)
+
+    for value in DATES:
+        assert DATE_REGEX.fullmatch(value)
+        assert get_datetime_kind(value) == DATE
+        parse_date(value)
+
+    # Apart from days that are not in February, which are left to isodate
+    assert not any(DATETIME_REGEX.fullmatch(value) or DATE_REGEX.fullmatch(value) for value in OTHERS[2:])
+
+
+@pytest.mark.parametrize('value', DURATIONS + OTHER_DURATIONS)
+def test_is_duration(value):
+    """Test that durations are validated just as isodate would validate them"""
+    assert is_duration(value) == parse_is_duration(value)
+
+
+def test_duration_fast_path():
+    """Test that the common forms of durations are recognized without isodate"""
+    for value in DURATIONS:
+        assert DURATION_REGEX.fullmatch(value)
+        assert is_duration(value)
+        parse_duration(value)
+
+    assert not any(DURATION_REGEX.fullmatch(value) for value in OTHER_DURATIONS)
+
+
+def test_checker_results():
+    """Test the messages of the checkers, for a batch of values"""
+    checker = CheckISODatestuff(None)
+    results = checker.run_batch(Blueprint({'name': 'date_created'}), ['2021-01-01T00:09:00Z', '2021-01-01', 'x', 'x'])
+
+    assert [(result.passed, result.message) for result in results] == [
+        (True, 'has a valid ISO-8601 datetime'),
+        (True, 'has a valid ISO-8601 date (but not datetime)'),
+        (False, 'is not a valid date or datetime'),
+        (False, 'is not a valid date or datetime'),
+    ]
+
+    checker = CheckISODuration(None)
+    results = checker.run_batch(Blueprint({'name': 'time_coverage_duration'}), ['P1D', 'P', 5])
+
+    assert [(result.passed, result.message) for result in results] == [
+        (True, 'is a valid duration'),
+        (False, 'is not a valid duration'),
+        (False, 'is not a valid duration'),
+    ]
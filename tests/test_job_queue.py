@@ -0,0 +1,106 @@
+"""
+=================
+test_job_queue.py
+=================
+
+Unit tests for the background JobQueue within job_utils.py.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import pytest
+from werkzeug.exceptions import NotFound, ServiceUnavailable
+
+from mcc.web.job_utils import JobQueue
+
+
+@pytest.fixture
+def job_path():
+    """
+    Fixture that returns the location of a new job database
+    """
+    job_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.realpath(__file__)))
+    yield os.path.join(job_dir, 'jobs.sqlite')
+    shutil.rmtree(job_dir)
+
+
+def wait_for(queue, job_id):
+    """Waits for a job to finish, returning its details"""
+    for _ in range(100):
+        job = queue.get(job_id)
+
+        if job['status'] in (JobQueue.COMPLETE, JobQueue.FAILED):
+            return job
+
+        time.sleep(0.05)
+
+    raise TimeoutError(f'Job {job_id} did not finish')
+
+
+def test_job_queue(job_path):
+    """Test that jobs run in the background, and their status and reports are shared between processes"""
+    queue = JobQueue(job_path, workers=1, queue_size=1, retention=60)
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking_job(value):
+        started.set()
+        release.wait(5)
+        return {'results': [value]}
+
+    job_id = queue.submit(blocking_job, 'first', selected_checkers={'ACDD-version': '1.3'})
+    started.wait(5)
+
+    job = queue.get(job_id)
+    assert job['status'] == JobQueue.RUNNING
+    assert job['selected_checkers'] == {'ACDD-version': '1.3'}
+    assert queue.get_report(job_id) is None
+
+    # One job may wait while the first runs, but no more than that
+    waiting_id = queue.submit(lambda: {'results': ['second']})
+    assert queue.get(waiting_id)['status'] == JobQueue.QUEUED
+
+    with pytest.raises(ServiceUnavailable):
+        queue.submit(lambda: None)
+
+    release.set()
+
+    assert wait_for(queue, job_id)['status'] == JobQueue.COMPLETE
+    assert wait_for(queue, waiting_id)['status'] == JobQueue.COMPLETE
+
+    # Another process shares the same database
+    other_queue = JobQueue(job_path, workers=1, queue_size=1, retention=60)
+    assert other_queue.get_report(job_id) == {'results': ['first']}
+    assert other_queue.get('missing') is None
+
+
+def test_job_queue_failures(job_path):
+    """Test that failed and interrupted jobs are reported as failed"""
+    queue = JobQueue(job_path, workers=1, queue_size=1, retention=60)
+
+    def failing_job():
+        raise NotFound('No report is available')
+
+    job = wait_for(queue, queue.submit(failing_job))
+    assert job['status'] == JobQueue.FAILED
+    assert job['error'] == 'No report is available'
+
+    job = wait_for(queue, queue.submit(lambda: 1 / 0))
+    assert job['status'] == JobQueue.FAILED
+    assert 'division by zero' in job['error']
+
+    # A job left running by a process that no longer exists
+    process = os.popen('echo $$')
+    dead_pid = int(process.read())
+    process.close()
+
+    queue._connect().execute(
+        'INSERT INTO jobs (id, status, pid, selected_checkers, created, updated) VALUES (?, ?, ?, ?, ?, ?)',
+        ('interrupted', JobQueue.RUNNING, dead_pid, '{}', time.time(), time.time())
+    )
+
+    assert queue.get('interrupted')['status'] == JobQueue.FAILED
@@ -0,0 +1,107 @@
+"""
+====================
+test_report_cache.py
+====================
+
+Unit tests for the SQLite-backed ReportCache within cache_utils.py.
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+
+import pytest
+from netCDF4 import Dataset
+
+from mcc.checker.acdd import ACDD
+from mcc.web.cache_utils import ReportCache
+
+FILE_HASH = 'b15b610e3ad2ec4de4d11f8ba8ca3de2'
+
+
+@pytest.fixture(scope="session")
+def data_dir():
+    """
+    Fixture that returns the absolute path of the test data directory
+    """
+    test_dir = os.path.dirname(os.path.realpath(__file__))
+    yield os.path.join(test_dir, 'data')
+
+
+@pytest.fixture
+def cache_path():
+    """
+    Fixture that returns the location of a new cache database
+    """
+    cache_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.realpath(__file__)))
+    yield os.path.join(cache_dir, 'cache.sqlite')
+    shutil.rmtree(cache_dir)
+
+
+@pytest.fixture(scope="module")
+def acdd_entry(data_dir):
+    """
+    Fixture that returns a cache entry with the results of an ACDD 1.3 check
+    """
+    file = os.path.join(data_dir, 'ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc')
+
+    with Dataset(file) as dataset:
+        yield {
+            'results': ACDD().setup('1.3').run(dataset),
+            'filename': os.path.basename(file),
+            'size': '3.06 MB',
+            'model': dataset.data_model,
+        }
+
+
+def test_report_cache(cache_path, acdd_entry):
+    """Test that reports are cached per file, checker version and MCC version, across cache instances"""
+    cache = ReportCache(cache_path, 10000000, '1.5.0')
+    checker = ACDD().setup('1.3')
+
+    assert cache.get(FILE_HASH, checker) is None
+
+    cache.put(FILE_HASH, checker, acdd_entry)
+    entry = cache.get(FILE_HASH.upper(), checker)
+
+    assert entry['model'] == acdd_entry['model']
+    assert entry['results']['passed'] == acdd_entry['results']['passed']
+    assert entry['results']['total'] == acdd_entry['results']['total']
+    assert [(group['name'], group['passed']) for group in entry['results']['results']] == \
+        [(group['name'], group['passed']) for group in acdd_entry['results']['results']]
+
+    # Another process shares the same database
+    assert ReportCache(cache_path, 10000000, '1.5.0').get(FILE_HASH, checker) is not None
+
+    # But reports never carry over between checker or MCC versions
+    assert cache.get(FILE_HASH, ACDD().setup('1.1')) is None
+    assert ReportCache(cache_path, 10000000, '1.6.0').get(FILE_HASH, checker) is None
+
+    # Nor between versions of the standard name table
+    assert cache.get(FILE_HASH, ACDD().setup('1.3', '26')) is None
+
+
+def test_report_cache_eviction(cache_path, acdd_entry):
+    """Test that the least recently used reports are evicted once the cache is full"""
+    checker = ACDD().setup('1.3')
+    cache = ReportCache(cache_path, 1, '1.5.0')
+
+    # Too large to ever be cached
+    cache.put(FILE_HASH, checker, acdd_entry)
+    assert cache.get(FILE_HASH, checker) is None
+
+    # Room for exactly three small reports
+    cache.max_size = 3 * len(pickle.dumps({'results': None}, pickle.HIGHEST_PROTOCOL))
+    hashes = [f'{index:032x}' for index in range(3)]
+
+    for file_hash in hashes:
+        cache.put(file_hash, checker, {'results': None})
+
+    # Using the first report makes the second the least recently used
+    assert cache.get(hashes[0], checker) is not None
+
+    cache.put(FILE_HASH, checker, {'results': None})
+
+    assert cache.get(hashes[1], checker) is None
+    assert all(cache.get(file_hash, checker) is not None for file_hash in (hashes[0], hashes[2], FILE_HASH))
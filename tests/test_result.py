@@ -0,0 +1,118 @@
+"""
+==============
+test_result.py
+==============
+
+Unit tests for the Result class within base.py.
+"""
+
+import json
+import os
+import pickle
+
+import pytest
+from netCDF4 import Dataset
+
+from mcc.checker.acdd import ACDD
+from mcc.checker.base import Blueprint, Group, Result, get_result_id
+from mcc.checker.gds2 import GDS2
+
+
+@pytest.fixture(scope="session")
+def data_dir():
+    """
+    Fixture that returns the absolute path of the test data directory
+    """
+    test_dir = os.path.dirname(os.path.realpath(__file__))
+    yield os.path.join(test_dir, 'data')
+
+
+@pytest.fixture
+def blueprint():
+    """
+    Fixture that returns a Blueprint of a varattrs Group
+    """
+    group = Group('Variable Attributes', scope='varattrs', priority='required')
+    group.add_blueprint({'name': 'units', 'description': 'The units of the variable', 'possible_values': ['m', 's']})
+
+    yield group.blueprints[0]
+
+
+def test_result_attributes(blueprint):
+    """Test that a Result looks up the attributes of its Blueprint, without copying them"""
+    result = Result(False, 'km', blueprint, checker_name='Existence', message='exists')
+    result.variable = 'height'
+
+    assert result.name == 'units'
+    assert result.scope == 'varattrs'
+    assert result.possible_values is blueprint.possible_values
+    assert str(result) == 'Existence failed because "height:units" exists'
+    assert not hasattr(result, '__dict__')
+
+    # Blacklisted attributes of the Blueprint are not carried over
+    assert not hasattr(result, 'checkers')
+
+    with pytest.raises(AttributeError):
+        result.not_an_attribute
+
+    # Additional attributes are held by the Result itself
+    result.note = 'see also'
+    assert result.note == 'see also'
+    assert not hasattr(blueprint, 'note')
+
+
+def test_result_as_dict(blueprint):
+    """Test that a Result serializes to the attributes of both the Result and its Blueprint"""
+    result = Result(True, 'm', blueprint, checker_name='Existence', message='exists')
+
+    assert 'variable' not in result.as_dict()
+
+    result.variable = 'height'
+    expected = {'passed': True, 'value': 'm'}
+    expected.update((key, value) for key, value in vars(blueprint).items() if key not in Result.BLACKLIST)
+    expected.update(checker_name='Existence', message='exists', variable='height')
+
+    assert result.as_dict() == expected
+    assert list(result.as_dict()) == list(expected)
+
+    encoded = json.loads(json.dumps(result.as_dict(), default=str))
+    assert encoded['description'] == 'The units of the variable'
+    assert encoded['variable'] == 'height'
+
+    copy = pickle.loads(pickle.dumps(result))
+    assert str(copy) == str(result)
+    assert copy.as_dict().keys() == result.as_dict().keys()
+
+
+def test_blueprint_results_share_blueprint():
+    """Test that the Results of a Blueprint refer to the same Blueprint"""
+    blueprint = Blueprint({'name': 'units', 'scope': 'varattrs'})
+    results = [Result(True, None, blueprint, variable=name) for name in ('time', 'lat', 'lon')]
+
+    assert all(result.blueprint is blueprint for result in results)
+    assert [result.variable for result in results] == ['time', 'lat', 'lon']
+
+
+def get_ids(results):
+    """Lists the IDs of every group within the results of a CheckSuite, in order"""
+    if isinstance(results, dict):
+        return [results['hash']] + [item for result in results['results'] for item in get_ids(result)]
+
+    return []
+
+
+def test_result_ids(data_dir):
+    """Test that the IDs of groups of results are unique, and the same from one run to the next"""
+    # The same in every process, whatever its hash() seed
+    assert get_result_id(('ACDD', '1.3', 0, 'Global Attributes')) == 150510717184483
+
+    with Dataset(os.path.join(data_dir, 'ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc')) as dataset:
+        for suite, args in ((ACDD, ('1.3',)), (GDS2, ('L2P',))):
+            ids = get_ids(suite.compiled(*args).run(dataset))
+
+            assert len(ids) == len(set(ids))
+            assert all(0 <= result_id < 2 ** 53 for result_id in ids)
+            assert get_ids(suite().setup(*args).run(dataset)) == ids
+
+        # Results of a different version have different IDs
+        assert not set(get_ids(ACDD.compiled('1.1').run(dataset))) & set(get_ids(ACDD.compiled('1.3').run(dataset)))
@@ -0,0 +1,87 @@
+"""
+================
+test_snapshot.py
+================
+
+Unit tests for the DatasetSnapshot within snapshot.py.
+"""
+
+import os
+
+import pytest
+from netCDF4 import Dataset
+
+from mcc.checker.acdd import ACDD
+from mcc.checker.gds2 import GDS2
+from mcc.checker.snapshot import DatasetSnapshot, take_snapshot
+
+TEST_FILES = (
+    'ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc',
+    'S6A_P4_2__LR_RED__NR_022_215_20210622T065556_20210622T085149_F02.nc',
+)
+
+
+@pytest.fixture(scope="session")
+def data_dir():
+    """
+    Fixture that returns the absolute path of the test data directory
+    """
+    test_dir = os.path.dirname(os.path.realpath(__file__))
+    yield os.path.join(test_dir, 'data')
+
+
+def assert_same_group(snapshot, group):
+    assert snapshot.ncattrs() == group.ncattrs()
+    assert snapshot.dimensions == {name: len(dimension) for name, dimension in group.dimensions.items()}
+    assert list(snapshot.variables) == list(group.variables)
+
+    for name, variable in group.variables.items():
+        variable_snapshot = snapshot.variables[name]
+
+        assert variable_snapshot.datatype == variable.datatype
+        assert variable_snapshot.dimensions == variable.dimensions
+        assert variable_snapshot.shape == variable.shape
+        assert variable_snapshot.description == '; '.join(f'{k}: "{v}"' for k, v in variable.__dict__.items())
+
+        for attribute in variable.ncattrs():
+            assert getattr(variable_snapshot, attribute) is not None
+            assert str(getattr(variable_snapshot, attribute)) == str(getattr(variable, attribute))
+
+    assert list(snapshot.groups) == list(group.groups)
+
+    for name, subgroup in group.groups.items():
+        assert_same_group(snapshot.groups[name], subgroup)
+
+
+@pytest.mark.parametrize('test_file', TEST_FILES)
+def test_snapshot(data_dir, test_file):
+    """Test that a snapshot holds the same metadata as the dataset it was taken of"""
+    with Dataset(os.path.join(data_dir, test_file)) as dataset:
+        snapshot = DatasetSnapshot(dataset)
+
+        assert take_snapshot(snapshot) is snapshot
+        assert snapshot.data_model == dataset.data_model
+        assert_same_group(snapshot, dataset)
+
+    assert getattr(snapshot, 'not_an_attribute', None) is None
+
+    with pytest.raises(AttributeError):
+        snapshot.not_an_attribute
+
+
+@pytest.mark.parametrize('test_file', TEST_FILES)
+def test_run_against_snapshot(data_dir, test_file):
+    """Test that suites give the same results against a snapshot, even once the dataset is closed"""
+    with Dataset(os.path.join(data_dir, test_file)) as dataset:
+        snapshot = DatasetSnapshot(dataset)
+        expected = [ACDD.compiled('1.3').run(dataset), GDS2.compiled('L2P').run(dataset)]
+
+    results = [ACDD.compiled('1.3').run(snapshot), GDS2.compiled('L2P').run(snapshot)]
+
+    def summarize(results):
+        if isinstance(results, dict):
+            return results['passed'], results['total'], [summarize(result) for result in results['results']]
+
+        return str(results)
+
+    assert [summarize(result) for result in results] == [summarize(result) for result in expected]
@@ -0,0 +1,177 @@
+"""
+======================
+test_standard_names.py
+======================
+
+Unit tests for the indexed CF standard name table within standard_names.py.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from difflib import get_close_matches
+
+import pytest
+from werkzeug.exceptions import BadRequest
+
+from mcc.checker.acdd import ACDD
+from mcc.checker.base import Group
+from mcc.checker.standard_names import (DEFAULT_STANDARD_NAME_TABLE, STANDARD_NAME_TABLES, StandardNameTable,
+                                        find_standard_name_tables, get_standard_name_table)
+
+
+@pytest.fixture(scope="session")
+def table():
+    """
+    Fixture that returns the standard name table used by CheckStandardName
+    """
+    yield get_standard_name_table()
+
+
+@pytest.fixture(scope="session")
+def names():
+    """
+    Fixture that returns the standard names of the table, in the order of its
+    JSON file
+    """
+    with open(STANDARD_NAME_TABLES[DEFAULT_STANDARD_NAME_TABLE] + '.json') as infile:
+        yield list(json.load(infile)['data'].keys())
+
+
+@pytest.fixture
+def temp_dir():
+    """
+    Fixture that returns a new temporary directory
+    """
+    temp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.realpath(__file__)))
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def test_lookup(table, names):
+    """Test that names are looked up within the table"""
+    assert table.version == '77'
+    assert len(table) == len(names)
+    assert 'sea_surface_temperature' in table
+    assert 'sea_surface_temp' not in table
+    assert 'Sea_Surface_Temperature' not in table
+
+
+@pytest.mark.parametrize('name', (
+    'sea_surface_temp',
+    'sea_surface_temprature',
+    'sst',
+    'analysed_sst',
+    'wind speed',
+    'latitude ',
+    'time_offset',
+    'eastward_wind_at_10m',
+    'x',
+    '',
+    'Ω',
+))
+def test_suggestions(table, names, name):
+    """Test that suggestions are those of difflib.get_close_matches()"""
+    expected = get_close_matches(name, names, 1)
+
+    assert table.suggest(name) == (expected[0] if expected else None)
+
+
+def test_suggestion_ties():
+    """Test that names that are as close as each other are suggested as by difflib"""
+    names = ['abd', 'abc', 'abe', 'xyz']
+    table = StandardNameTable('test', names)
+
+    assert table.suggest('ab') == get_close_matches('ab', names, 1)[0] == 'abe'
+    assert table.suggest('xy') == 'xyz'
+    assert table.suggest('q') is None
+
+
+def test_shared_table(table):
+    """Test that checkers share one table per version, which remembers suggestions"""
+    assert get_standard_name_table() is table
+    assert get_standard_name_table(DEFAULT_STANDARD_NAME_TABLE) is table
+    assert get_standard_name_table('26') is not table
+
+    before = table.suggest.cache_info()
+    table.suggest('not_a_standard_name_at_all')
+    table.suggest('not_a_standard_name_at_all')
+    after = table.suggest.cache_info()
+
+    assert after.hits == before.hits + 1
+
+
+def test_registry():
+    """Test that every version of the table within the data directory is available, the latest by default"""
+    assert list(STANDARD_NAME_TABLES) == ['26', '77']
+    assert DEFAULT_STANDARD_NAME_TABLE == '77'
+    assert get_standard_name_table('26').version == '26'
+
+    with pytest.raises(KeyError):
+        get_standard_name_table('1')
+
+
+def test_binary_table(temp_dir):
+    """Test that a table is the same once written to and memory-mapped from its binary form"""
+    for version, path in STANDARD_NAME_TABLES.items():
+        original = StandardNameTable.from_json(path + '.json')
+        filename = os.path.join(temp_dir, f'CF-Standard-Names-Table-{version}.bin')
+        original.write(filename)
+
+        table = StandardNameTable.from_binary(filename)
+
+        assert (table.version, table.last_modified) == (original.version, original.last_modified)
+        assert table.names == original.names
+        assert table.aliases == original.aliases
+        assert table.canonical_units == original.canonical_units
+        assert table.alphabet == original.alphabet
+        assert (table.char_counts == original.char_counts).all()
+        assert table.suggest('sea_surface_temp') == original.suggest('sea_surface_temp')
+
+        # The binary forms shipped with MCC are up to date with their JSON
+        with open(filename, 'rb') as new, open(path + '.bin', 'rb') as shipped:
+            assert new.read() == shipped.read()
+
+    assert find_standard_name_tables(temp_dir) == {
+        version: os.path.join(temp_dir, f'CF-Standard-Names-Table-{version}') for version in STANDARD_NAME_TABLES
+    }
+
+    with open(os.path.join(temp_dir, 'invalid.bin'), 'wb') as outfile:
+        outfile.write(b'not a table')
+
+    with pytest.raises(ValueError):
+        StandardNameTable.from_binary(os.path.join(temp_dir, 'invalid.bin'))
+
+
+def test_small_table(temp_dir):
+    """Test the binary form of a table without aliases or units"""
+    filename = os.path.join(temp_dir, 'small.bin')
+    StandardNameTable('1', ['b', 'a']).write(filename)
+    table = StandardNameTable.from_binary(filename)
+
+    assert table.names == ['a', 'b']
+    assert table.aliases == {}
+    assert table.canonical_units == {'a': None, 'b': None}
+
+
+def test_select_table():
+    """Test that ACDD checks standard names against the selected version of the table"""
+    acdd = ACDD().setup('1.3', '26')
+    default = ACDD().setup('1.3')
+
+    def find_blueprints(group):
+        for blueprint in group.blueprints:
+            if isinstance(blueprint, Group):
+                yield from find_blueprints(blueprint)
+            elif blueprint.name == 'standard_name':
+                yield blueprint
+
+    blueprints = {suite: list(find_blueprints(suite)) for suite in (acdd, default)}
+
+    assert [blueprint.standard_name_table for blueprint in blueprints[acdd]] == ['26']
+    assert not hasattr(blueprints[default][0], 'standard_name_table')
+    assert (acdd.cache_version, default.cache_version) == ('1.3 (standard names v26)', '1.3')
+
+    with pytest.raises(BadRequest):
+        ACDD().setup('1.3', '1')
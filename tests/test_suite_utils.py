@@ -0,0 +1,172 @@
+"""
+===================
+test_suite_utils.py
+===================
+
+Unit tests for running CheckSuites within worker processes (suite_utils.py).
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import pytest
+
+import mcc.web.suite_utils as suite_utils
+from mcc.checker.acdd import ACDD
+from mcc.checker.cf_shim import CF
+from mcc.web.file_utils import TemporaryStorage
+from mcc.web.suite_utils import SuitePool, WorkerCrashedError, get_source, mp_context, run_suite
+
+TEST_FILE = 'ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc'
+
+
+@pytest.fixture(scope="session")
+def data_dir():
+    """
+    Fixture that returns the absolute path of the test data directory
+    """
+    test_dir = os.path.dirname(os.path.realpath(__file__))
+    yield os.path.join(test_dir, 'data')
+
+
+@pytest.fixture
+def temp_dir():
+    """
+    Fixture that returns a new directory for temporary files
+    """
+    temp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.realpath(__file__)))
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+class ProcessSuite(object):
+    """Stand-in for a CheckSuite, that reports the ID of the process running it"""
+    name = 'Process'
+
+    def __init__(self, exit_code=None, sleep=None):
+        self.exit_code = exit_code
+        self.sleep = sleep
+
+    def run(self, dataset):
+        if self.exit_code is not None:
+            os._exit(self.exit_code)
+
+        if self.sleep is not None:
+            time.sleep(self.sleep)
+
+        return os.getpid()
+
+
+def summarize(results):
+    """Reduces the results of a CheckSuite to their names and scores"""
+    if isinstance(results, dict):
+        return (
+            results.get('name'), results['passed'], results['total'],
+            [summarize(result) for result in results.get('results', [])]
+        )
+
+    return str(results)
+
+
+def test_pickle_compiled_suite():
+    """Test that compiled suites are pickled by reference, and others by value"""
+    suite = ACDD.compiled('1.3')
+    data = pickle.dumps(suite)
+
+    assert len(data) < 1000
+    assert pickle.loads(data) is suite
+
+    suite = ACDD().setup('1.3')
+    assert len(pickle.loads(pickle.dumps(suite)).blueprints) == len(suite.blueprints)
+
+
+@pytest.mark.parametrize('max_memory_size', (0, 100000000))
+def test_run_suite(data_dir, temp_dir, max_memory_size):
+    """Test that suites give the same results within a worker process, from a file on disk or in memory"""
+    suites = (ACDD.compiled('1.3'), CF.compiled('1.6'))
+
+    with TemporaryStorage(temp_dir, max_memory_size=max_memory_size) as datafile:
+        with open(os.path.join(data_dir, TEST_FILE), 'rb') as infile:
+            datafile.write(infile.read())
+
+        datafile.flush()
+        source = get_source(datafile)
+        assert isinstance(source, bytes) == datafile.in_memory
+
+        pool = SuitePool(2)
+        futures = [pool.submit(suite, source, TEST_FILE) for suite in suites]
+        results = [future.result() for future in futures]
+
+        # The same as within this process
+        expected = [summarize(run_suite(suite, source, TEST_FILE)[0]) for suite in suites]
+
+    for (suite_results, start, end), expected_results in zip(results, expected):
+        assert start <= end
+        assert summarize(suite_results) == expected_results
+
+
+def test_suite_pool(data_dir):
+    """Test that workers are replaced after their limit of suites, or once they crash"""
+    source = os.path.join(data_dir, TEST_FILE)
+    pool = SuitePool(1, max_tasks=2)
+
+    pids = [pool.submit(ProcessSuite(), source, TEST_FILE).result()[0] for _ in range(4)]
+    assert pids[0] == pids[1] != pids[2] == pids[3]
+    assert os.getpid() not in pids
+
+    with pytest.raises(WorkerCrashedError, match='exit code 3'):
+        pool.submit(ProcessSuite(exit_code=3), source, TEST_FILE).result()
+
+    assert pool.submit(ProcessSuite(), source, TEST_FILE).result()[0] not in pids
+
+    # Errors within the worker are raised as they are
+    with pytest.raises(FileNotFoundError):
+        pool.submit(ProcessSuite(), source + '.missing', TEST_FILE).result()
+
+    # A worker using too much memory is replaced after every suite
+    pool = SuitePool(1, max_memory=1)
+    pids = [pool.submit(ProcessSuite(), source, TEST_FILE).result()[0] for _ in range(2)]
+    assert pids[0] != pids[1]
+
+
+def test_suite_pool_timeout(data_dir):
+    """Test that workers that take too long to run a suite are killed and replaced"""
+    source = os.path.join(data_dir, TEST_FILE)
+    pool = SuitePool(1, timeout=2)
+
+    pid = pool.submit(ProcessSuite(), source, TEST_FILE).result()[0]
+
+    with pytest.raises(WorkerCrashedError, match='did not respond within 2 seconds'):
+        pool.submit(ProcessSuite(sleep=60), source, TEST_FILE).result()
+
+    assert pool.submit(ProcessSuite(), source, TEST_FILE).result()[0] != pid
+
+
+def test_start_method():
+    """Test that workers are never forked from the (threaded) MCC process itself"""
+    assert mp_context.get_start_method() in ('forkserver', 'spawn')
+
+
+def test_suite_pool_failed_start(data_dir, monkeypatch):
+    """Test that a worker that fails to start is started again by the next suite, rather than lost from the pool"""
+    source = os.path.join(data_dir, TEST_FILE)
+    pool = SuitePool(1, max_tasks=1)
+
+    def fail_to_start(*args):
+        raise OSError(24, 'Too many open files')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(suite_utils, 'SuiteWorker', fail_to_start)
+
+        # The suite still gets its own result, even though its replacement failed
+        pid = pool.submit(ProcessSuite(), source, TEST_FILE).result(timeout=60)[0]
+
+        with pytest.raises(OSError, match='Too many open files'):
+            pool.submit(ProcessSuite(), source, TEST_FILE).result(timeout=60)
+
+    pids = [pool.submit(ProcessSuite(), source, TEST_FILE).result(timeout=60)[0] for _ in range(2)]
+    assert pid not in pids
+    assert pids[0] != pids[1]
@@ -0,0 +1,80 @@
+"""
+=============
+test_types.py
+=============
+
+Unit tests for the table of valid types of CheckTypes, and classifying the
+types of many values at once.
+"""
+
+import numpy as np
+import pytest
+
+from mcc.checker.base import Blueprint, Checker
+from mcc.checker.checkers import CheckTypes
+
+TYPE_STRINGS = tuple(CheckTypes.TYPE_MAP)
+
+
+@pytest.mark.parametrize('have_type', [
+    np.int8, np.int16, np.int32, np.int64, np.uint8, np.float32, np.float64, np.str_, np.bytes_,
+    np.dtype('int8'), np.dtype('int32'), np.dtype('float32'), np.dtype('float64'), np.dtype('S'),
+    str, bytes, int, float, bool,
+])
+def test_type_table(have_type):
+    """Test that the table of valid types agrees with np.issubdtype()"""
+    for type_string in TYPE_STRINGS:
+        assert (type(have_type), have_type, type_string) in CheckTypes.TYPE_TABLE
+
+        expected = CheckTypes.equal_types(have_type, CheckTypes.TYPE_MAP[type_string])
+        assert CheckTypes.lookup_types(have_type, type_string) == expected
+
+
+def test_lookup_missing_type():
+    """Test that types missing from the table are compared, then added to it"""
+    have_type = np.dtype('S4')
+    assert (type(have_type), have_type, 'string') not in CheckTypes.TYPE_TABLE
+
+    assert CheckTypes.lookup_types(have_type, 'string') == (False, '|S4', 'string')
+    assert (type(have_type), have_type, 'string') in CheckTypes.TYPE_TABLE
+
+
+def test_classify_types():
+    """Test that types are classified against one or many type strings"""
+    have_types = [np.float32, np.int16, np.dtype('float32'), str, np.float32]
+
+    assert CheckTypes.classify_types(have_types, 'float') == [
+        (True, 'has type float'),
+        (False, 'has type short when we want type float'),
+        (True, 'has type float'),
+        (False, 'has type string when we want type float'),
+        (True, 'has type float'),
+    ]
+    assert CheckTypes.classify_types(have_types, ('byte', 'short')) == [
+        (False, 'has type float not in byte, short'),
+        (True, 'has type short'),
+        (False, 'has type float not in byte, short'),
+        (False, 'has type string not in byte, short'),
+        (False, 'has type float not in byte, short'),
+    ]
+
+
+def test_run_batch():
+    """Test that a batch of values gets the same Results as testing each in turn"""
+    blueprint = Blueprint({'name': 'valid_min', 'scope': 'varattrs', 'type': ('byte', 'short', 'float')})
+    values = [np.int16(0), None, np.float64(-1.5), np.float32(2.5), 'zero', np.int16(3)]
+
+    batched = CheckTypes(None)
+    batched.blueprint = blueprint
+    single = CheckTypes(None)
+    single.blueprint = blueprint
+
+    results = batched.run_batch(blueprint, values)
+    # Checker.run_batch() tests each value in turn with run_global()
+    expected = Checker.run_batch(single, blueprint, values)
+
+    assert [(result.passed, result.message) for result in results] == \
+        [(result.passed, result.message) for result in expected]
+    assert [result.passed for result in results] == [True, False, False, True, False, True]
+    assert all(result.value is None for result in results)
+
@@ -0,0 +1,76 @@
+"""
+=============
+test_units.py
+=============
+
+Unit tests for the process-wide cache of parsed units within units.py.
+"""
+
+import numpy as np
+import pytest
+from cf_units import Unit
+
+from mcc.checker.units import get_unit_cache_info, parse_unit
+
+
+def test_parse_unit():
+    """Test that units are only parsed once, and are the same as cf_units would parse"""
+    before = get_unit_cache_info()
+    unit = parse_unit('seconds since 1981-01-01')
+
+    assert unit == Unit('seconds since 1981-01-01')
+    assert parse_unit('seconds since 1981-01-01') is unit
+    assert parse_unit('days since 1981-01-01', calendar='360_day').calendar == '360_day'
+
+    after = get_unit_cache_info()
+    assert after['hits'] - before['hits'] >= 1
+    assert after['misses'] - before['misses'] <= 2
+    assert 0 < after['size'] <= after['max_size']
+
+
+def test_parse_invalid_unit(caplog):
+    """Test that units that fail to parse are remembered, and only logged once"""
+    before = get_unit_cache_info()
+
+    for _ in range(3):
+        with pytest.raises(ValueError) as err:
+            parse_unit('not_a_unit_at_all')
+
+        assert 'not_a_unit_at_all' in str(err.value)
+
+    after = get_unit_cache_info()
+    assert after['misses'] == before['misses'] + 1
+    assert after['hits'] == before['hits'] + 2
+    assert len([record for record in caplog.records if 'not_a_unit_at_all' in record.getMessage()]) == 1
+
+    # Each raise gets an exception of its own
+    errors = []
+
+    for _ in range(2):
+        try:
+            parse_unit('not_a_unit_at_all')
+        except ValueError as error:
+            errors.append(error)
+
+    assert errors[0] is not errors[1]
+
+
+def test_parse_unhashable_unit():
+    """Test that values that can't be cached are still parsed"""
+    with pytest.raises((ValueError, TypeError)):
+        parse_unit(np.array(['m', 's']))
+
+
+def test_cf_shares_cache():
+    """Test that the compliance checker parses units through the cache"""
+    from compliance_checker import cfutil
+    from compliance_checker.cf import cf_1_6, util
+
+    import mcc.checker.cf_shim  # noqa: F401
+
+    assert cfutil.Unit is util.Unit is cf_1_6.Unit is parse_unit
+
+    before = get_unit_cache_info()
+    assert util.units_convertible('degrees_north', 'degrees')
+    assert util.units_convertible('degrees', 'degrees_north')
+    assert get_unit_cache_info()['hits'] >= before['hits'] + 2
@@ -0,0 +1,66 @@
+"""
+=======================
+test_variable_major.py
+=======================
+
+Unit tests for the variable-major running of varattrs Blueprints in base.py.
+"""
+
+import os
+
+import pytest
+from netCDF4 import Dataset
+
+from mcc.checker.acdd import ACDD
+from mcc.checker.base import Group
+from mcc.checker.gds2 import GDS2
+from mcc.checker.snapshot import DatasetSnapshot
+
+
+@pytest.fixture(scope="session")
+def data_dir():
+    """
+    Fixture that returns the absolute path of the test data directory
+    """
+    test_dir = os.path.dirname(os.path.realpath(__file__))
+    yield os.path.join(test_dir, 'data')
+
+
+def flatten(results):
+    """Lists every Result within the results of a CheckSuite, in order, as (variable, str(result), value) tuples"""
+    if isinstance(results, dict):
+        return [item for result in results['results'] for item in flatten(result)]
+
+    return [(getattr(results, 'variable', None), str(results), repr(results.value))]
+
+
+@pytest.mark.parametrize('test_file', (
+    'ascat_20210101_000900_metopa_73696_eps_o_coa_3202_ovw.l2.nc',
+    'S6A_P4_2__LR_RED__NR_022_215_20210622T065556_20210622T085149_F02.nc',
+))
+def test_variable_major(data_dir, test_file, monkeypatch):
+    """Test that running varattrs Blueprints variable-major gives the same results in the same order"""
+    with Dataset(os.path.join(data_dir, test_file)) as dataset:
+        snapshot = DatasetSnapshot(dataset)
+
+    suites = (ACDD.compiled('1.3'), GDS2.compiled('L2P'))
+    variable_major = [flatten(suite.run(snapshot)) for suite in suites]
+
+    monkeypatch.setattr(Group, 'VARIABLE_MAJOR', False)
+    blueprint_major = [flatten(suite.run(snapshot)) for suite in suites]
+
+    assert variable_major == blueprint_major
+    assert any(variable for results in variable_major for variable, _, _ in results)
+
+
+def test_runs_variable_major():
+    """Test which Blueprints are run variable-major"""
+    group = Group('Variable Attributes', scope='varattrs')
+    group.add_blueprints([{'name': 'units'}, {'name': 'long_name'}, {'name': 'units', 'variables': ('time',)}])
+
+    assert [blueprint.runs_variable_major for blueprint in group.blueprints] == [True, True, False]
+
+    global_group = Group('Global Attributes', scope='globals')
+    global_group.add_blueprint({'name': 'title'})
+
+    assert not global_group.blueprints[0].runs_variable_major